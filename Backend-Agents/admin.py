@@ -1,27 +1,125 @@
-from fastapi import APIRouter
-from db import chats_collection, users_collection
+from datetime import datetime
+from fastapi import APIRouter, Query
+from db import chats_collection, chat_rollups_collection
+from semantic_cache import answer_cache, research_cache
+from search_cache import search_cache
+from agents import (
+    safety_guard, chat_writer, research_flight, answer_flight, prefetcher, LLM_CLIENTS
+)
+from admission import admission
+from chat_stats import VERDICTS, day_range
 
 admin_router = APIRouter()
 
+MAX_PAGE_SIZE = 500
+
+
 @admin_router.get("/admin/blocked")
-def get_blocked_queries():
-    blocked = []
-
-    cursor = chats_collection.find(
-        {"verdict": "BLOCKED"},
-        {"_id": 0}
-    ).sort("createdAt", -1)
-
-    for chat in cursor:
-        user = users_collection.find_one(
-            {"userId": chat["userId"]},
-            {"_id": 0, "email": 1}
-        )
-
-        blocked.append({
-            "email": user["email"] if user else "Unknown",
-            "query": chat["query"],
-            "createdAt": chat.get("createdAt")
+def get_blocked_queries(
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    skip: int = Query(0, ge=0),
+    start: datetime = None,
+    end: datetime = None,
+):
+    match = {"verdict": "BLOCKED"}
+    if start or end:
+        match["createdAt"] = {}
+        if start:
+            match["createdAt"]["$gte"] = start
+        if end:
+            match["createdAt"]["$lte"] = end
+
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"createdAt": -1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$lookup": {
+            "from": "users",
+            "localField": "userId",
+            "foreignField": "userId",
+            "as": "user",
+        }},
+        {"$project": {
+            "_id": 0,
+            "email": {"$ifNull": [{"$arrayElemAt": ["$user.email", 0]}, "Unknown"]},
+            "query": 1,
+            "createdAt": 1,
+        }},
+    ]
+
+    return list(chats_collection.aggregate(pipeline))
+
+
+@admin_router.get("/admin/stats")
+def get_stats(
+    start: datetime = None,
+    end: datetime = None,
+    top_users: int = Query(20, ge=1, le=200),
+):
+    """Dashboard numbers, read only from the chat_rollups documents."""
+    days = day_range(start, end)
+
+    per_day = []
+    confidence = {}
+    totals = {v: 0 for v in VERDICTS}
+    for d in chat_rollups_collection.find({"kind": "day", **days}).sort("day", 1):
+        counts = d.get("counts", {})
+        per_day.append({
+            "day": d["day"],
+            "total": d.get("total", 0),
+            **{v: counts.get(v, 0) for v in VERDICTS},
         })
+        for v in VERDICTS:
+            totals[v] += counts.get(v, 0)
+        for bucket, n in d.get("confidence", {}).items():
+            confidence[bucket] = confidence.get(bucket, 0) + n
+
+    per_user = list(chat_rollups_collection.aggregate([
+        {"$match": {"kind": "user_day", **days}},
+        {"$group": {
+            "_id": "$userId",
+            "total": {"$sum": "$total"},
+            **{v: {"$sum": {"$ifNull": [f"$counts.{v}", 0]}} for v in VERDICTS},
+        }},
+        {"$sort": {"total": -1}},
+        {"$limit": top_users},
+        {"$lookup": {
+            "from": "users",
+            "localField": "_id",
+            "foreignField": "userId",
+            "as": "user",
+        }},
+        {"$project": {
+            "_id": 0,
+            "userId": "$_id",
+            "email": {"$ifNull": [{"$arrayElemAt": ["$user.email", 0]}, "Unknown"]},
+            "total": 1,
+            **{v: 1 for v in VERDICTS},
+        }},
+    ]))
+
+    return {
+        "totals": totals,
+        "per_day": per_day,
+        "per_user": per_user,
+        "confidence": dict(sorted(confidence.items(), key=lambda kv: int(kv[0]))),
+    }
+
 
-    return blocked
+@admin_router.get("/admin/cache")
+def get_cache_stats():
+    return {
+        "answers": answer_cache.stats(),
+        "research": research_cache.stats(),
+        "search": search_cache.stats(),
+        "guard": safety_guard.stats(),
+        "chat_writer": chat_writer.stats(),
+        "coalescing": {
+            "research": research_flight.stats(),
+            "answer": answer_flight.stats(),
+        },
+        "admission": admission.stats(),
+        "prefetch": prefetcher.stats(),
+        "llm": {name: client.stats() for name, client in LLM_CLIENTS.items()},
+    }
@@ -0,0 +1,135 @@
+"""
+Admission control for /ask and /ask/stream.
+
+A request is admitted when
+  1. its user still has a token in their bucket (ASK_USER_RATE per second,
+     bursts of ASK_USER_BURST), otherwise it is rejected with 429;
+  2. one of ASK_MAX_CONCURRENCY slots frees up within ASK_QUEUE_TIMEOUT,
+     waiting behind at most ASK_QUEUE_MAX others, otherwise it gets 503.
+
+Admitted requests are given a degradation tier from the load at that
+moment ((running + waiting) / ASK_MAX_CONCURRENCY):
+  full           everything
+  no_fact_check  >= DEGRADE_NO_FACT_CHECK_AT: the fact checker is skipped
+  lite           >= DEGRADE_LITE_AT, or after an upstream rate limit:
+                 cached research or none, one explainer call, no crew
+"""
+import asyncio
+import os
+import time
+
+from llm_client import status_code
+from ttl_cache import TTLCache
+
+ASK_MAX_CONCURRENCY = int(os.getenv("ASK_MAX_CONCURRENCY", "8"))
+ASK_QUEUE_MAX = int(os.getenv("ASK_QUEUE_MAX", "32"))
+ASK_QUEUE_TIMEOUT = float(os.getenv("ASK_QUEUE_TIMEOUT", "10"))
+ASK_USER_RATE = float(os.getenv("ASK_USER_RATE", "0.5"))
+ASK_USER_BURST = float(os.getenv("ASK_USER_BURST", "5"))
+DEGRADE_NO_FACT_CHECK_AT = float(os.getenv("DEGRADE_NO_FACT_CHECK_AT", "0.75"))
+DEGRADE_LITE_AT = float(os.getenv("DEGRADE_LITE_AT", "1.5"))
+RATE_LIMIT_COOLDOWN = float(os.getenv("RATE_LIMIT_COOLDOWN", "30"))
+
+TIERS = ("full", "no_fact_check", "lite")
+
+
+class Rejected(Exception):
+    def __init__(self, status: int, message: str, retry_after: float):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+def is_rate_limit(error: Exception) -> bool:
+    """
+    Provider quota errors (Gemini ResourceExhausted / HTTP 429), by exception
+    type or status code of the error or the one it wraps, never by message text.
+    """
+    if any(
+        type(e).__name__ in ("ResourceExhausted", "RateLimitError", "TooManyRequests")
+        for e in (error, error.__cause__) if e is not None
+    ):
+        return True
+    return status_code(error) == 429
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency: int = ASK_MAX_CONCURRENCY, queue_max: int = ASK_QUEUE_MAX):
+        self.max_concurrency = max_concurrency
+        self.queue_max = queue_max
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._buckets = TTLCache(100000, ttl=max(ASK_USER_BURST / ASK_USER_RATE, 60))
+        self._pressure_until = 0.0
+        self.active = 0
+        self.waiting = 0
+        self.admitted = {tier: 0 for tier in TIERS}
+        self.rate_limited = 0
+        self.queue_full = 0
+        self.timed_out = 0
+        self.upstream_limited = 0
+
+    def _take_token(self, user_id):
+        now = time.monotonic()
+        tokens, last = self._buckets.get(user_id) or (ASK_USER_BURST, now)
+        tokens = min(ASK_USER_BURST, tokens + (now - last) * ASK_USER_RATE)
+        if tokens < 1:
+            self.rate_limited += 1
+            raise Rejected(429, "Too many questions, slow down a little.", (1 - tokens) / ASK_USER_RATE)
+        self._buckets.put(user_id, (tokens - 1, now))
+
+    def tier(self) -> str:
+        if time.monotonic() < self._pressure_until:
+            return "lite"
+        load = (self.active + self.waiting) / self.max_concurrency
+        if load >= DEGRADE_LITE_AT:
+            return "lite"
+        if load >= DEGRADE_NO_FACT_CHECK_AT:
+            return "no_fact_check"
+        return "full"
+
+    async def acquire(self, user_id) -> str:
+        """Wait for a slot and return the request's tier; raises Rejected. Pair with release()."""
+        self._take_token(str(user_id))
+
+        if self._slots.locked() and self.waiting >= self.queue_max:
+            self.queue_full += 1
+            raise Rejected(503, "The assistant is busy, please retry shortly.", ASK_QUEUE_TIMEOUT)
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), ASK_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise Rejected(503, "The assistant is busy, please retry shortly.", ASK_QUEUE_TIMEOUT)
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        tier = self.tier()
+        self.admitted[tier] += 1
+        return tier
+
+    def release(self):
+        self.active -= 1
+        self._slots.release()
+
+    def note_rate_limit(self):
+        """The LLM provider pushed back: serve lite answers for a while."""
+        self.upstream_limited += 1
+        self._pressure_until = time.monotonic() + RATE_LIMIT_COOLDOWN
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "tier": self.tier(),
+            "admitted": dict(self.admitted),
+            "rate_limited": self.rate_limited,
+            "queue_full": self.queue_full,
+            "timed_out": self.timed_out,
+            "upstream_limited": self.upstream_limited,
+        }
+
+
+admission = AdmissionController()
@@ -1,125 +1,216 @@
-import re
-import numpy as np
+import os
+import json
+import asyncio
+import hashlib
+import time
+import math
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
 from dotenv import load_dotenv
 from fastapi import APIRouter
-from crewai import Crew, Agent, Task
-from crewai_tools import SerperDevTool
-from langchain_google_genai import ChatGoogleGenerativeAI
-from sentence_transformers import SentenceTransformer
+from fastapi.responses import JSONResponse, StreamingResponse
+from providers import make_llm, make_crew_llm, make_search_tool, make_embedder
 from models import AskRequest
-from chat_store import store_chat
-from db import chats_collection
+from chat_writer import ChatWriter
+import vector_index
+from semantic_cache import (
+    answer_cache, research_cache, normalize_topic, ANSWER_CACHE_SCOPE, GLOBAL_SCOPE
+)
+from single_flight import SingleFlight
+from admission import admission, Rejected, is_rate_limit
+from llm_client import ResilientLLM, LLM_FALLBACK_MODEL
+from routing import (
+    AMBIGUOUS, FOLLOWUP, ROUTING_TIEBREAK,
+    classify_followup, cosine, is_followup, needs_fact_check, extract_confidence,
+)
+from guard import Guard, GUARD_MAX_BATCH
+from metrics import stage, observe, annotate, register_cache
+from crew_pool import CrewPool
+from context_builder import build_context
+from memory import user_memory, DEFAULT_PREFERENCES
+from search_cache import search_cache
+from prefetch import Prefetcher
+from warmup import Lazy, ensure
 load_dotenv()
 ask_router = APIRouter()
 
-embed_model = SentenceTransformer("all-MiniLM-L6-v2")
-research_llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    temperature=0,
-    max_output_tokens=350,
-)
+# CREW_DEADLINE bounds how long a request waits for its crew, not the run:
+# a thread cannot be cancelled, so a crew that misses it keeps going (and
+# spending tokens) until its own LLM timeouts end it. Crews run on their own
+# CREW_WORKERS threads, which caps those abandoned runs and keeps them off
+# the default executor that embeddings use.
+CREW_DEADLINE = float(os.getenv("CREW_DEADLINE", "60"))
+CREW_WORKERS = int(os.getenv("CREW_WORKERS", "8"))
+
+# Built on first use or by the start-up warm-up (see warmup.py), so
+# importing this module does not load models or open clients.
+embed_model = Lazy("embedder", lambda: make_embedder("all-MiniLM-L6-v2"))
 
-explain_llm = ChatGoogleGenerativeAI(
+explain_llm = Lazy("explain_llm", lambda: make_llm(
+    "explain",
     model="gemini-2.5-flash-lite",
     temperature=0.2,
     max_output_tokens=350,
-)
+))
 
-fact_llm = ChatGoogleGenerativeAI(
+fact_llm = Lazy("fact_llm", lambda: make_llm(
+    "fact",
     model="gemini-2.5-flash",
     temperature=0,
     max_output_tokens=250,
-)
+))
 
-guard_llm = ChatGoogleGenerativeAI(
+guard_llm = Lazy("guard_llm", lambda: make_llm(
+    "guard",
     model="gemini-2.5-flash",
     temperature=0,
     max_output_tokens=5,
-)
+))
 
-search_tool = SerperDevTool()
+guard_batch_llm = Lazy("guard_batch_llm", lambda: make_llm(
+    "guard",
+    model="gemini-2.5-flash",
+    temperature=0,
+    max_output_tokens=8 * GUARD_MAX_BATCH,
+))
+
+# The crew agents' models (CrewAI clients, see providers.make_crew_llm)
+research_crew_llm = Lazy("research_crew_llm", lambda: make_crew_llm(
+    "research", "gemini-2.5-flash", temperature=0, max_output_tokens=350
+))
+explain_crew_llm = Lazy("explain_crew_llm", lambda: make_crew_llm(
+    "explain", "gemini-2.5-flash-lite", temperature=0.2, max_output_tokens=350
+))
+fact_crew_llm = Lazy("fact_crew_llm", lambda: make_crew_llm(
+    "fact", "gemini-2.5-flash", temperature=0, max_output_tokens=250
+))
+
+
+
+def _fallback(name: str, stage: str, max_output_tokens: int) -> Lazy:
+    """Cheaper model tier a client switches to while its circuit breaker is open."""
+    return Lazy(f"{name}_fallback_llm", lambda: make_llm(
+        stage,
+        model=LLM_FALLBACK_MODEL,
+        temperature=0,
+        max_output_tokens=max_output_tokens,
+    ))
+
+
+# Direct calls go through these (deadlines, retries, hedging, fallback; see
+# llm_client.py). CrewAI drives its own clients, so crew models only get
+# per-request timeouts and retries (providers.make_crew_llm) and the
+# requests waiting on them CREW_DEADLINE.
+explain_client = ResilientLLM("explain", explain_llm, _fallback("explain", "explain", 350))
+fact_client = ResilientLLM("fact", fact_llm, _fallback("fact", "fact", 250))
+guard_client = ResilientLLM("guard", guard_llm, _fallback("guard", "guard", 5))
+guard_batch_client = ResilientLLM("guard", guard_batch_llm, _fallback("guard_batch", "guard", 8 * GUARD_MAX_BATCH))
+LLM_CLIENTS = {
+    "explain": explain_client,
+    "fact": fact_client,
+    "guard": guard_client,
+    "guard_batch": guard_batch_client,
+}
+
+safety_guard = Guard(guard_client, guard_batch_client)
+
+search_tool = Lazy("search_tool", make_search_tool)
+
+chat_writer = ChatWriter(embed_model)
+
+register_cache("answers", answer_cache.stats)
+register_cache("research", research_cache.stats)
+register_cache("guard", safety_guard.stats)
+register_cache("user_memory", user_memory.stats)
+register_cache("search", search_cache.stats)
+
+research_flight = SingleFlight("research")
+answer_flight = SingleFlight("answer")
+
+
+def _answer_group(fact_check: bool, *prompt_inputs) -> tuple:
+    """
+    Requests that may share an explain run: only those whose prompt is filled
+    with the same RAG text, history, preferences and research, so no caller
+    is answered from another user's context.
+    """
+    digest = hashlib.sha1("\0".join(prompt_inputs).encode()).hexdigest()
+    return (fact_check, digest)
 
 
-def llm_safety_check(query: str) -> bool:
-    prompt = (
-        "Decide whether the following user request is SAFE or UNSAFE.\n"
-        "Unsafe includes illegal activity, violence, hacking, exploitation, hate, sexual content, "
-        "or actionable medical/legal advice.\n"
-        "Respond with ONLY one word: SAFE or UNSAFE.\n"
-        f"Request: {query}"
-    )
-    verdict = guard_llm.invoke(prompt).content.strip().upper()
-    return verdict == "SAFE"
+async def llm_safety_check_async(query: str) -> bool:
+    """Cached / pre-classified / micro-batched guard used by /ask."""
+    with stage("guard"):
+        return await safety_guard.check(query)
 
-def cosine_sim(a, b):
-    return np.dot(a,b) / (np.linalg.norm(a)*np.linalg.norm(b))
 
-def retrieve_rag(user_id: str, query: str, k=3):
-    """Find most relevant past chats"""
-    q_emb = embed_model.encode(query)
+async def _embed(text: str, stage_name: str):
+    with stage(stage_name):
+        return await asyncio.to_thread(embed_model.encode, text)
 
-    docs = list(
-        chats_collection.find({
-            "userId": str(user_id),
-            "embedding": {"$exists": True},
-            "verdict": "ALLOWED"
-        })
-    )
 
-    scored = []
-    for d in docs:
-        score = cosine_sim(q_emb, d["embedding"])
-        scored.append((score, d))
+async def _load_index(user_id):
+    with stage("rag_fetch"):
+        return await vector_index.load_async(user_id)
 
-    scored.sort(reverse=True, key=lambda x: x[0])
 
-    return [d for _, d in scored[:k]]
+# [timestamp of the previous task end] for the crew run of this request
+_crew_clock = ContextVar("crew_clock", default=None)
 
-def is_followup(q: str) -> bool:
-    q = (q or "").lower().strip()
-    if len(q.split()) <= 4:
-        return True
-    follow_markers = [
-        "elaborate", "explain more", "more details", "tell me more",
-        "what do you mean", "expand", "continue",
-        "why", "how so", "give example", "examples",
-        "it", "that", "this", "above"
-    ]
-    return any(m in q for m in follow_markers)
 
+def _lap(name: str):
+    """Task callback timing a crew task from the end of the previous one."""
+    def done(_output):
+        clock = _crew_clock.get()
+        if clock is None:
+            return
+        now = time.perf_counter()
+        observe(f"task.{name}", now - clock[0])
+        clock[0] = now
+    return done
 
-def needs_fact_check(topic: str) -> bool:
-    t = (topic or "").lower()
-    risky = [
-        "medical", "medicine", "diagnos", "treat", "symptom", "dose",
-        "legal", "law", "contract", "lawsuit",
-        "invest", "stock", "crypto", "trading",
-        "politic", "election",
-        "hack", "exploit", "bypass", "malware", "ddos"
-    ]
-    return any(k in t for k in risky)
 
+_crew_executor = ThreadPoolExecutor(CREW_WORKERS, thread_name_prefix="crew")
+_crews_running = 0
 
-def extract_confidence(text: str):
-    if not text:
-        return None
 
-    patterns = [
-        r'(\d{1,3})\s*/\s*100',
-        r'(\d{1,3})\s*%',
-        r'confidence\s*score\s*[:\-]?\s*(\d{1,3})',
-        r'confidence\s*[:\-]?\s*(\d{1,3})',
-        r'===\s*confidence\s*===\s*(\d{1,3})',
-    ]
-    for p in patterns:
-        m = re.search(p, text, re.IGNORECASE)
-        if m:
-            val = int(m.group(1))
-            if 0 <= val <= 100:
-                return val
-    return None
+def _crew_done(future):
+    global _crews_running
+    _crews_running -= 1
+    # Retrieve the error of a run nobody waits for any more, so it is not logged as lost
+    if not future.cancelled():
+        future.exception()
+
+
+async def close_crews():
+    """Let abandoned crew runs finish before the interpreter shuts down under them."""
+    await asyncio.to_thread(_crew_executor.shutdown)
 
 
+async def _kickoff(pool: CrewPool, inputs: dict):
+    """
+    Run a pooled crew on the crew executor, giving up on it after
+    CREW_DEADLINE. Raises TimeoutError at once while every crew worker is
+    busy, so the caller falls back instead of queueing behind abandoned
+    runs. Crews that fail or time out mid-run are not put back.
+    """
+    global _crews_running
+    if _crews_running >= CREW_WORKERS:
+        annotate(crew_workers_busy=True)
+        raise asyncio.TimeoutError("all crew workers are busy")
+    crew = pool.acquire()
+    _crew_clock.set([time.perf_counter()])
+    # The context copy carries _crew_clock into the worker thread
+    run = asyncio.get_running_loop().run_in_executor(
+        _crew_executor, copy_context().run, crew.kickoff, inputs
+    )
+    _crews_running += 1
+    run.add_done_callback(_crew_done)
+    with stage("crew"):
+        crew_output = await asyncio.wait_for(asyncio.shield(run), CREW_DEADLINE)
+    pool.release(crew)
+    return crew_output
+
 def _get_task_text(task_out) -> str:
     """CrewAI versions differ; pull best available text."""
     if task_out is None:
@@ -151,224 +242,782 @@ def format_history(history) -> str:
     return "\n".join(lines)
 
 
-@ask_router.post("/ask")
-def ask_ai(req: AskRequest):
+def _followup_prompt(rag_text, history_text, topic, preferences) -> str:
+    return (
+        "You are continuing a conversation.\n\n"
 
+        "=== USER PREFERENCES ===\n"
+        f"{preferences}\n\n"
 
-    if not llm_safety_check(req.topic):
-        store_chat(user_id=req.userId, query=req.topic, verdict="BLOCKED")
-        return {
-            "error": (
-                "❌ I can’t help with that request. "
-                "I can help with safe and legal alternatives if you want."
-            )
-        }
+        "=== RELEVANT PAST MEMORY ===\n"
+        f"{rag_text}\n\n"
 
-    try:
-        rag_docs = retrieve_rag(req.userId, req.topic)
-
-        rag_text = "\n\n".join([
-            f"Past Q: {d['query']}\nPast A: {d['response']}"
-            for d in rag_docs
-        ])
-        history_text = format_history(req.history)
-        followup = is_followup(req.topic) and bool(history_text)
-        do_fact_check = needs_fact_check(req.topic) and not followup  
-
-        researcher = Agent(
-            llm=research_llm,
-            role="Research Assistant",
-            goal="Find accurate information fast with sources.",
-            backstory="Return only the most relevant facts with links.",
-            tools=[search_tool],   
-            verbose=False,
-        )
+        "=== RECENT CHAT ===\n"
+        f"{history_text}\n\n"
 
-        explainer = Agent(
-            llm=explain_llm,
-            role="Explanation Assistant",
-            goal="Explain clearly and practically using conversation context.",
-            backstory="Be concise and helpful. Use prior conversation when available.",
-            verbose=False,
-        )
+        f"User now asks: {topic}\n\n"
 
-        fact_checker = Agent(
-            llm=fact_llm,
-            role="Fact Checker",
-            goal="Verify claims using ONLY provided sources and evidence.",
-            backstory=(
-                "You do not browse the web. You only verify claims using the sources "
-                "and evidence given in the research section."
-            ),
-            verbose=False,
-        )
+        "Rules:\n"
+        "- Use memory if relevant\n"
+        "- Assume pronouns refer to last AI answer\n"
+        "- Expand helpfully\n"
+        "- Be concise\n"
+    )
 
 
-        task2_followup = Task(
-            description=(
-                "You are continuing a conversation.\n\n"
+def _research_prompt(topic) -> str:
+    return (
+        f"Research '{topic}' using web search.\n\n"
+        "Return EXACTLY 3 items in the format below. Be concise.\n\n"
+        "Format for each item:\n"
+        "- Fact: <one clear factual statement, <= 18 words>\n"
+        "  Evidence: <1 short paraphrased line OR a short quote <= 20 words>\n"
+        "  Source: <one URL>\n\n"
+        "Rules:\n"
+        "- Use authoritative sources (official docs, universities, reputable orgs).\n"
+        "- Evidence must clearly support the Fact.\n"
+        "- Do NOT add extra sections.\n"
+    )
 
-                "=== RELEVANT PAST MEMORY ===\n"
-                f"{rag_text}\n\n"
 
-                "=== RECENT CHAT ===\n"
-                f"{history_text}\n\n"
+def _explain_prompt(rag_text, history_text, topic, preferences) -> str:
+    return (
+        "You are continuing an ongoing conversation.\n\n"
 
-                f"User now asks: {req.topic}\n\n"
+        "=== USER PREFERENCES ===\n"
+        f"{preferences}\n\n"
 
-                "Rules:\n"
-                "- Use memory if relevant\n"
-                "- Assume pronouns refer to last AI answer\n"
-                "- Expand helpfully\n"
-                "- Be concise\n"
-            ),
-            expected_output="Context-aware follow-up answer.",
-            agent=explainer,
-        )
+        "=== RELEVANT PAST USER MEMORY (RAG) ===\n"
+        f"{rag_text}\n\n"
 
+        "=== RECENT CHAT HISTORY ===\n"
+        f"{history_text}\n\n"
 
-        if followup:
-            crew = Crew(
-                agents=[explainer],
-                tasks=[task2_followup],
-                respect_context_window=True,
-                verbose=False,
-            )
+        "Now answer the user's latest question:\n"
+        f"{topic}\n\n"
 
-            crew_output = crew.kickoff()
-            final_answer = _get_task_text(crew_output.tasks_output[0])
-            confidence = None
+        "Rules:\n"
+        "- Use RAG memory if it is relevant\n"
+        "- Otherwise ignore it\n"
+        "- Prefer personalized answers using past context\n"
+        "- Pitch the answer at the user's audience and explanation style\n"
+        "- No new facts beyond research results\n"
+        "- Clear and practical explanation\n"
+    )
 
-            store_chat(
-                user_id=req.userId,
-                query=req.topic,
-                verdict="ALLOWED",
-                response=final_answer,
-                confidence=confidence
-            )
 
-            return {
-                "topic": req.topic,
-                "answer": final_answer,
-                "confidence": confidence,
-                "followup_used_history": True
-            }
+FACT_CHECK_PROMPT = (
+    "You will receive:\n"
+    "1) Research items (Fact + Evidence + Source)\n"
+    "2) An explanation written from that research\n\n"
+    "Your job:\n"
+    "- Copy the full explanation exactly as-is.\n"
+    "- Identify the TOP 3 major claims in the explanation.\n"
+    "- For each claim, decide whether it is:\n"
+    "  ✅ Supported (clearly backed by provided Evidence)\n"
+    "  ⚠️ Weak (partially supported / too vague / missing support)\n"
+    "  ❌ Not Supported (not backed by provided Evidence)\n\n"
+    "IMPORTANT RULES:\n"
+    "- Do NOT browse the web.\n"
+    "- Use ONLY the provided Evidence/Source items.\n"
+    "- If the claim needs external verification beyond the given sources, mark ⚠️ Weak.\n\n"
+    "Output EXACTLY in this format:\n"
+    "=== Explanation ===\n"
+    "<paste full explanation>\n\n"
+    "=== Fact Check ===\n"
+    "1) Claim: ...\n"
+    "   Verdict: Supported/Weak/Not Supported\n"
+    "   Evidence Used: <paste the matching Evidence line>\n"
+    "2) ...\n"
+    "3) ...\n\n"
+    "=== Confidence ===\n"
+    "<single number 0-100>\n"
+    "Reason (1 line): <why that score>\n"
+)
 
-        task1 = Task(
-            description=(
-                f"Research '{req.topic}' using web search.\n\n"
-                "Return EXACTLY 3 items in the format below. Be concise.\n\n"
-                "Format for each item:\n"
-                "- Fact: <one clear factual statement, <= 18 words>\n"
-                "  Evidence: <1 short paraphrased line OR a short quote <= 20 words>\n"
-                "  Source: <one URL>\n\n"
-                "Rules:\n"
-                "- Use authoritative sources (official docs, universities, reputable orgs).\n"
-                "- Evidence must clearly support the Fact.\n"
-                "- Do NOT add extra sections.\n"
-            ),
-            expected_output="Exactly 3 fact items, each with Fact, Evidence, and Source URL.",
+
+def _with_context(prompt, **sections) -> str:
+    """Append prior task outputs the way a Crew passes them as context."""
+    parts = [prompt]
+    for title, text in sections.items():
+        parts.append(f"=== {title.upper()} ===\n{text}")
+    return "\n\n".join(parts)
+
+
+# Agent role -> stage label of its LLM calls in llm_tokens_total / llm_call_seconds
+CREW_STAGES = {
+    "Research Assistant": "research",
+    "Explanation Assistant": "explain",
+    "Fact Checker": "fact",
+}
+
+
+def _make_researcher():
+    from crewai import Agent
+    return Agent(
+        llm=research_crew_llm.get(),
+        role="Research Assistant",
+        goal="Find accurate information fast with sources.",
+        backstory="Return only the most relevant facts with links.",
+        tools=[search_tool.get()],
+        # search_cache.py caches searches with a TTL; a pooled crew's tool
+        # cache would keep serving them after it expires
+        cache=False,
+        verbose=False,
+    )
+
+
+def _make_explainer():
+    from crewai import Agent
+    return Agent(
+        llm=explain_crew_llm.get(),
+        role="Explanation Assistant",
+        goal="Explain clearly and practically using conversation context.",
+        backstory="Be concise and helpful. Use prior conversation when available.",
+        verbose=False,
+    )
+
+
+def _make_fact_checker():
+    from crewai import Agent
+    return Agent(
+        llm=fact_crew_llm.get(),
+        role="Fact Checker",
+        goal="Verify claims using ONLY provided sources and evidence.",
+        backstory=(
+            "You do not browse the web. You only verify claims using the sources "
+            "and evidence given in the research section."
+        ),
+        verbose=False,
+    )
+
+
+RESEARCH_OUTPUT = "Exactly 3 fact items, each with Fact, Evidence, and Source URL."
+FACT_CHECK_OUTPUT = "Explanation + Fact Check (3 claims) + Confidence as a single number."
+
+# Task templates; kickoff(inputs=...) fills the placeholders per request
+RESEARCH_TEMPLATE = _research_prompt("{topic}")
+EXPLAIN_TEMPLATE = _explain_prompt("{rag_text}", "{history_text}", "{topic}", "{preferences}")
+
+
+def _build_crew(fact_check: bool):
+    """
+    One reusable explain (+ fact check) crew shape. The researcher runs in
+    its own crew (see _research), so that its facts can come from the
+    research cache or a coalesced in-flight run; they arrive as the
+    {research} input.
+    """
+    from crewai import Crew, Task
+    from llm_metrics import track_crew_llm_calls
+    track_crew_llm_calls(CREW_STAGES)
+
+    tasks, agents = [], []
+
+    explainer = _make_explainer()
+    tasks.append(Task(
+        description=_with_context(EXPLAIN_TEMPLATE, research="{research}"),
+        expected_output="A helpful, context-aware answer.",
+        agent=explainer,
+        callback=_lap("explain"),
+    ))
+    agents.append(explainer)
+
+    if fact_check:
+        fact_checker = _make_fact_checker()
+        tasks.append(Task(
+            description=_with_context(FACT_CHECK_PROMPT, research="{research}"),
+            expected_output=FACT_CHECK_OUTPUT,
+            agent=fact_checker,
+            callback=_lap("fact_check"),
+        ))
+        agents.append(fact_checker)
+
+    return Crew(
+        agents=agents,
+        tasks=tasks,
+        respect_context_window=True,
+        verbose=False,
+    )
+
+
+def _build_research_crew():
+    from crewai import Crew, Task
+    from llm_metrics import track_crew_llm_calls
+    track_crew_llm_calls(CREW_STAGES)
+
+    researcher = _make_researcher()
+    return Crew(
+        agents=[researcher],
+        tasks=[Task(
+            description=RESEARCH_TEMPLATE,
+            expected_output=RESEARCH_OUTPUT,
             agent=researcher,
-        )
+            callback=_lap("research"),
+        )],
+        cache=False,
+        respect_context_window=True,
+        verbose=False,
+    )
+
+
+crew_pools = {
+    fact: CrewPool(lambda fact=fact: _build_crew(fact))
+    for fact in (False, True)
+}
+research_pool = CrewPool(_build_research_crew)
+
 
-        task2 = Task(
-            description=(
-                "You are continuing an ongoing conversation.\n\n"
+def _prebuild_crews():
+    """One idle crew per shape, so the first /ask does not pay for crewai."""
+    for pool in (*crew_pools.values(), research_pool):
+        pool.release(pool.acquire())
+    return True
 
-                "=== RELEVANT PAST USER MEMORY (RAG) ===\n"
-                f"{rag_text}\n\n"
 
-                "=== RECENT CHAT HISTORY ===\n"
-                f"{history_text}\n\n"
+crews = Lazy("crews", _prebuild_crews)
 
-                "Now answer the user's latest question:\n"
-                f"{req.topic}\n\n"
+# What each path of /ask needs built before it runs (see _ensure_for)
+PREPARE_STACK = (embed_model, guard_llm, guard_batch_llm)
+DIRECT_STACK = (explain_llm,)
 
-                "Rules:\n"
-                "- Use RAG memory if it is relevant\n"
-                "- Otherwise ignore it\n"
-                "- Prefer personalized answers using past context\n"
-                "- No new facts beyond research results\n"
-                "- Clear and practical explanation\n"
-            ),
-            expected_output="A helpful, context-aware answer.",
-            agent=explainer,
+
+BLOCKED_MESSAGE = (
+    "❌ I can’t help with that request. "
+    "I can help with safe and legal alternatives if you want."
+)
+
+
+def _chunk_text(chunk) -> str:
+    content = getattr(chunk, "content", "")
+    if isinstance(content, list):
+        return "".join(
+            p.get("text", "") if isinstance(p, dict) else str(p)
+            for p in content
         )
+    return content or ""
 
 
-        tasks = [task1, task2]
-        agents = [researcher, explainer]
-
-        if do_fact_check:
-            task3 = Task(
-                description=(
-                    "You will receive:\n"
-                    "1) Research items (Fact + Evidence + Source)\n"
-                    "2) An explanation written from that research\n\n"
-                    "Your job:\n"
-                    "- Copy the full explanation exactly as-is.\n"
-                    "- Identify the TOP 3 major claims in the explanation.\n"
-                    "- For each claim, decide whether it is:\n"
-                    "  ✅ Supported (clearly backed by provided Evidence)\n"
-                    "  ⚠️ Weak (partially supported / too vague / missing support)\n"
-                    "  ❌ Not Supported (not backed by provided Evidence)\n\n"
-                    "IMPORTANT RULES:\n"
-                    "- Do NOT browse the web.\n"
-                    "- Use ONLY the provided Evidence/Source items.\n"
-                    "- If the claim needs external verification beyond the given sources, mark ⚠️ Weak.\n\n"
-                    "Output EXACTLY in this format:\n"
-                    "=== Explanation ===\n"
-                    "<paste full explanation>\n\n"
-                    "=== Fact Check ===\n"
-                    "1) Claim: ...\n"
-                    "   Verdict: Supported/Weak/Not Supported\n"
-                    "   Evidence Used: <paste the matching Evidence line>\n"
-                    "2) ...\n"
-                    "3) ...\n\n"
-                    "=== Confidence ===\n"
-                    "<single number 0-100>\n"
-                    "Reason (1 line): <why that score>\n"
-                ),
-                expected_output="Explanation + Fact Check (3 claims) + Confidence as a single number.",
-                agent=fact_checker,
-            )
-            tasks.append(task3)
-            agents.append(fact_checker)
-
-        crew = Crew(
-            agents=agents,
-            tasks=tasks,
-            respect_context_window=True,
-            verbose=False,
+async def _answer_direct(prompt: str) -> str:
+    """One explain_llm completion without the agent loop (follow-ups, lite tier)."""
+    return _chunk_text(await explain_client.ainvoke(prompt)).strip()
+
+
+# Speculative follow-up answers (PREFETCH=1, see prefetch.py)
+prefetcher = Prefetcher(_answer_direct)
+register_cache("prefetch", prefetcher.stats)
+
+
+def _prefetch_followups(req: AskRequest, rag_text, history_text, preferences, answer: str):
+    """Answer the likely next follow-ups in the background, in the context the client will send."""
+    next_history = "\n".join(filter(None, [history_text, f"USER: {req.topic}", f"AI: {answer}"]))
+    prefetcher.schedule(
+        req.userId, answer,
+        lambda question: _followup_prompt(rag_text, next_history, question, preferences),
+    )
+
+
+async def _discard(*tasks):
+    """Cancel speculative work and swallow whatever it ended with."""
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _followup_by_similarity(req: AskRequest, topic_emb) -> bool:
+    """Settle a short, ambiguous query by how close it is to the last turn."""
+    last = next((t.content for t in reversed(req.history or []) if t.content.strip()), "")
+    context_emb = await _embed(last[:1000], "embed_route_context")
+    return is_followup(req.topic, cosine(topic_emb, context_emb))
+
+
+async def _ensure_for(followup: bool, tier: str, *full_stack) -> str:
+    """
+    Build what the chosen path needs and return the tier to answer in.
+    Follow-ups and the lite tier only need the direct explain model; when
+    the full tier's components cannot be built the request drops to lite.
+    """
+    with stage("warmup"):
+        await ensure(*DIRECT_STACK)
+        if followup or tier == "lite":
+            return tier
+        try:
+            await ensure(*full_stack)
+        except Exception as e:
+            print("❌ crews unavailable, answering lite:", e)
+            annotate(crews_unavailable=True)
+            return "lite"
+    return tier
+
+
+async def _prepare(req: AskRequest):
+    """Run the guard, answer cache and RAG fetch for a request.
+
+    Returns (early_response, ctx). early_response is the final payload for
+    blocked or cached requests; otherwise ctx carries what the answering
+    stages need, including the still-running RAG index fetch.
+    """
+    # No-op once warm; otherwise loads what is missing without blocking the loop
+    with stage("warmup"):
+        await ensure(*PREPARE_STACK)
+
+    history_text = format_history(req.history)
+    route = classify_followup(req.topic) if history_text else None
+    followup = route == FOLLOWUP
+
+    # The guard call, the query embedding and the RAG index fetch run
+    # concurrently; the speculative ones are dropped if the request ends early.
+    guard_task = asyncio.create_task(llm_safety_check_async(req.topic))
+    embed_task = asyncio.create_task(_embed(normalize_topic(req.topic), "embed_query"))
+    index_task = asyncio.create_task(_load_index(req.userId))
+
+    try:
+        topic_emb = await embed_task
+        if route == AMBIGUOUS and ROUTING_TIEBREAK:
+            followup = await _followup_by_similarity(req, topic_emb)
+        annotate(user=req.userId, followup=followup, route=route)
+
+        # A near-duplicate of an allowed question may still be a blocked
+        # rewording, so a cache hit waits for its own guard verdict.
+        cached = None
+        if not followup:
+            with stage("answer_cache"):
+                cached = answer_cache.get(req.userId, topic_emb)
+
+        safe = await guard_task
+    except BaseException:
+        await _discard(guard_task, embed_task, index_task)
+        raise
+
+    if not safe:
+        annotate(blocked=True)
+        await _discard(index_task)
+        await chat_writer.submit(user_id=req.userId, query=req.topic, verdict="BLOCKED")
+        return {"error": BLOCKED_MESSAGE}, None
+
+    if cached is not None:
+        annotate(answer_cached=True)
+        await _discard(index_task)
+        user_memory.record_topic(req.userId, req.topic)
+        await chat_writer.submit(
+            user_id=req.userId,
+            query=req.topic,
+            verdict="ALLOWED",
+            response=cached["answer"],
+            confidence=cached["confidence"],
+            embedding=cached["embedding"]
         )
+        return {
+            "topic": req.topic,
+            "answer": cached["answer"],
+            "confidence": cached["confidence"],
+            "followup_used_history": False,
+            "cached": True
+        }, None
+
+    if not followup:
+        user_memory.record_topic(req.userId, req.topic)
+
+    return None, {
+        "followup": followup,
+        "topic_emb": topic_emb,
+        "index_task": index_task,
+    }
 
-        crew_output = crew.kickoff()
 
-        explainer_out = _get_task_text(crew_output.tasks_output[1])
-        factcheck_out = _get_task_text(crew_output.tasks_output[2]) if len(crew_output.tasks_output) > 2 else ""
+RAG_CANDIDATES = 8
 
-        final_answer = explainer_out
-        confidence = extract_confidence(factcheck_out) if factcheck_out else None
 
-        embedding = embed_model.encode(final_answer).tolist()
+def _preferences_text(memory, topic) -> str:
+    prefs = memory["preferences"]
+    lines = [
+        f"Audience: {prefs['audience']}",
+        f"Explanation style: {prefs['explanation_style']}",
+    ]
+    current = topic.strip().lower()
+    recent, seen = [], {current}
+    for t in memory["recent_topics"]:
+        if t.lower() not in seen:
+            seen.add(t.lower())
+            recent.append(t)
+    if recent:
+        lines.append("Recently asked about: " + "; ".join(recent))
+    return "\n".join(lines)
+
 
-        store_chat(
+DEFAULT_PREFERENCES_TEXT = _preferences_text({"preferences": DEFAULT_PREFERENCES, "recent_topics": []}, "")
+
+
+async def _context_for(req: AskRequest, ctx):
+    """
+    (rag_text, history_text, preferences) for the prompt; RAG and history
+    are bounded by the context budget.
+    """
+    memory, index = await asyncio.gather(user_memory.get(req.userId), ctx["index_task"])
+    with stage("rag_search"):
+        scored = vector_index.search(
+            req.userId, ctx["topic_emb"], k=RAG_CANDIDATES, index=index, with_scores=True
+        )
+    with stage("context_build"):
+        rag_text, history_text = build_context(req.userId, req.topic, req.history, scored)
+    preferences = _preferences_text(memory, req.topic)
+    # Nothing user-specific went into the prompt, so the answer may be shared
+    ctx["shareable"] = not rag_text and not history_text and preferences == DEFAULT_PREFERENCES_TEXT
+    return rag_text, history_text, preferences
+
+
+async def _finish(req: AskRequest, ctx, final_answer, confidence, cache=True):
+    """Persist an answered request and publish it to the answer cache."""
+    if ctx["followup"]:
+        await chat_writer.submit(
             user_id=req.userId,
             query=req.topic,
             verdict="ALLOWED",
             response=final_answer,
-            confidence=confidence,
-            embedding=embedding
+            confidence=confidence
         )
+        return
 
-        return {
+    # The answer is embedded with the rest of the writer's batch; it only
+    # becomes a cache entry once it has been stored.
+    topic_emb = ctx["topic_emb"]
+
+    def publish(embedding):
+        if not cache or (ANSWER_CACHE_SCOPE != "user" and not ctx.get("shareable")):
+            return
+        answer_cache.put(req.userId, topic_emb, {
+            "answer": final_answer,
+            "confidence": confidence,
+            "embedding": embedding
+        })
+
+    await chat_writer.submit(
+        user_id=req.userId,
+        query=req.topic,
+        verdict="ALLOWED",
+        response=final_answer,
+        confidence=confidence,
+        embed_text=final_answer,
+        on_stored=publish
+    )
+
+
+NO_RESEARCH = "(No research is available right now; answer from general knowledge and say so briefly.)"
+BUSY_MESSAGE = "The assistant is busy, please retry shortly."
+
+
+def _rejected(e: Rejected) -> JSONResponse:
+    return JSONResponse(
+        status_code=e.status,
+        content={"error": e.message},
+        headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+    )
+
+
+async def _answer_lite(req: AskRequest, ctx, rag_text, history_text, preferences) -> str:
+    """Lite tier: cached research or none, then a single explainer call."""
+    with stage("research_cache"):
+        research = research_cache.get(req.userId, ctx["topic_emb"])
+    annotate(research_cached=bool(research))
+    with stage("lite"):
+        return await _answer_direct(_with_context(
+            _explain_prompt(rag_text, history_text, req.topic, preferences),
+            research=research or NO_RESEARCH,
+        ))
+
+
+@ask_router.post("/ask")
+async def ask_ai(req: AskRequest):
+    try:
+        tier = await admission.acquire(req.userId)
+    except Rejected as e:
+        return _rejected(e)
+    if tier != "full":
+        prefetcher.shed()
+    try:
+        return await _ask(req, tier)
+    finally:
+        admission.release()
+
+
+async def _ask(req: AskRequest, tier: str):
+    ctx = None
+    try:
+        # Guard failures get the same handling as the answering stages
+        early, ctx = await _prepare(req)
+        if early is not None:
+            return early
+
+        if ctx["followup"]:
+            prefetched = prefetcher.take(req.userId, req.topic, req.history)
+            annotate(prefetched=prefetched is not None)
+            if prefetched is not None:
+                await _discard(ctx["index_task"])
+                await _finish(req, ctx, prefetched, None)
+                return {
+                    "topic": req.topic,
+                    "answer": prefetched,
+                    "confidence": None,
+                    "followup_used_history": True,
+                    "prefetched": True
+                }
+
+        rag_text, history_text, preferences = await _context_for(req, ctx)
+        followup = ctx["followup"]
+        tier = await _ensure_for(followup, tier, crews)
+        do_fact_check = needs_fact_check(req.topic) and not followup and tier == "full"
+
+        annotate(fact_check=do_fact_check, tier=tier)
+
+        if followup:
+            with stage("followup"):
+                final_answer = await _answer_direct(
+                    _followup_prompt(rag_text, history_text, req.topic, preferences)
+                )
+            confidence = None
+
+            await _finish(req, ctx, final_answer, confidence)
+
+            return {
+                "topic": req.topic,
+                "answer": final_answer,
+                "confidence": confidence,
+                "followup_used_history": True
+            }
+
+        if tier == "lite":
+            final_answer = await _answer_lite(req, ctx, rag_text, history_text, preferences)
+
+            # Lite answers are not cached, so they do not outlive the load spike
+            await _finish(req, ctx, final_answer, None, cache=False)
+
+            return {
+                "topic": req.topic,
+                "answer": final_answer,
+                "confidence": None,
+                "followup_used_history": False,
+                "degraded": tier
+            }
+
+        async def explain():
+            crew_output = await _kickoff(crew_pools[do_fact_check], {
+                "rag_text": rag_text,
+                "history_text": history_text,
+                "topic": req.topic,
+                "preferences": preferences,
+                "research": research,
+            })
+            outputs = crew_output.tasks_output
+            explainer_out = _get_task_text(outputs[0])
+            factcheck_out = _get_task_text(outputs[1]) if len(outputs) > 1 else ""
+            return explainer_out, (extract_confidence(factcheck_out) if factcheck_out else None)
+
+        try:
+            research = await _research(req, ctx["topic_emb"])
+            # A burst of the same question shares one explain run; every
+            # requester still gets its own stored chat in _finish.
+            final_answer, confidence = await answer_flight.do(
+                _answer_group(do_fact_check, rag_text, history_text, preferences, research),
+                normalize_topic(req.topic), ctx["topic_emb"], explain,
+            )
+        except asyncio.TimeoutError:
+            # A crew missed CREW_DEADLINE (it runs on in the crew executor):
+            # answer like the lite tier, at the cost of one more explain call
+            # bounded by explain_client's own deadline, instead of failing
+            annotate(crew_deadline=True)
+            tier = "deadline"
+            final_answer = await _answer_lite(req, ctx, rag_text, history_text, preferences)
+            confidence = None
+
+        await _finish(req, ctx, final_answer, confidence, cache=tier != "deadline")
+        if tier != "deadline":
+            _prefetch_followups(req, rag_text, history_text, preferences, final_answer)
+
+        response = {
             "topic": req.topic,
             "answer": final_answer,
             "confidence": confidence,
             "followup_used_history": False
         }
+        if tier != "full":
+            response["degraded"] = tier
+        return response
 
     except Exception as e:
-        store_chat(user_id=req.userId, query=req.topic, verdict="ERROR")
+        # _prepare cleans up its own tasks when it fails
+        if ctx is not None:
+            await _discard(ctx["index_task"])
+        if is_rate_limit(e):
+            # Shed instead of failing: the next requests go out as lite answers
+            admission.note_rate_limit()
+            return JSONResponse(
+                status_code=503,
+                content={"error": BUSY_MESSAGE},
+                headers={"Retry-After": "5"},
+            )
+        await chat_writer.submit(user_id=req.userId, query=req.topic, verdict="ERROR")
         print("❌ ERROR:", e)
         return {"error": "Internal server error"}
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _research(req: AskRequest, topic_emb) -> str:
+    """
+    Fact/Evidence/Source items for the topic: from the research cache, from
+    an in-flight run for the same topic, or from a new researcher task.
+    """
+    with stage("research_cache"):
+        cached = research_cache.get(req.userId, topic_emb)
+    annotate(research_cached=bool(cached))
+    if cached:
+        return cached
+
+    async def research():
+        crew_output = await _kickoff(research_pool, {"topic": req.topic})
+        text = _get_task_text(crew_output.tasks_output[0])
+        research_cache.put(req.userId, topic_emb, text)
+        return text
+
+    # Research only holds web facts, so it is shared across all users
+    return await research_flight.do(GLOBAL_SCOPE, normalize_topic(req.topic), topic_emb, research)
+
+
+async def _ask_events(req: AskRequest):
+    """
+    SSE stream for /ask/stream:
+    token* -> answer -> factcheck? -> done, or a single error event.
+    """
+    # Admission happens inside the generator so the slot is always released
+    try:
+        tier = await admission.acquire(req.userId)
+    except Rejected as e:
+        yield _sse("error", {"error": e.message, "retry_after": math.ceil(e.retry_after)})
+        return
+    if tier != "full":
+        prefetcher.shed()
+    try:
+        async for event in _stream(req, tier):
+            yield event
+    finally:
+        admission.release()
+
+
+async def _stream(req: AskRequest, tier: str):
+    try:
+        early, ctx = await _prepare(req)
+    except Exception as e:
+        if is_rate_limit(e):
+            admission.note_rate_limit()
+            yield _sse("error", {"error": BUSY_MESSAGE, "retry_after": 5})
+            return
+        await chat_writer.submit(user_id=req.userId, query=req.topic, verdict="ERROR")
+        print("❌ ERROR:", e)
+        yield _sse("error", {"error": "Internal server error"})
+        return
+
+    if early is not None:
+        yield _sse("error" if "error" in early else "answer", early)
+        yield _sse("done", {"confidence": early.get("confidence")})
+        return
+
+    try:
+        if ctx["followup"]:
+            prefetched = prefetcher.take(req.userId, req.topic, req.history)
+            annotate(prefetched=prefetched is not None)
+            if prefetched is not None:
+                await _discard(ctx["index_task"])
+                yield _sse("token", {"text": prefetched})
+                yield _sse("answer", {
+                    "topic": req.topic,
+                    "answer": prefetched,
+                    "followup_used_history": True,
+                    "prefetched": True
+                })
+                await _finish(req, ctx, prefetched, None)
+                yield _sse("done", {"confidence": None})
+                return
+
+        rag_text, history_text, preferences = await _context_for(req, ctx)
+        followup = ctx["followup"]
+        full_stack = (crews, fact_llm) if needs_fact_check(req.topic) and tier == "full" else (crews,)
+        tier = await _ensure_for(followup, tier, *full_stack)
+
+        research = ""
+        if followup:
+            prompt = _followup_prompt(rag_text, history_text, req.topic, preferences)
+        elif tier == "lite":
+            with stage("research_cache"):
+                research = research_cache.get(req.userId, ctx["topic_emb"]) or ""
+            prompt = _with_context(
+                _explain_prompt(rag_text, history_text, req.topic, preferences),
+                research=research or NO_RESEARCH,
+            )
+        else:
+            try:
+                research = await _research(req, ctx["topic_emb"])
+            except asyncio.TimeoutError:
+                annotate(crew_deadline=True)
+                tier = "deadline"
+            prompt = _with_context(
+                _explain_prompt(rag_text, history_text, req.topic, preferences),
+                research=research or NO_RESEARCH,
+            )
+
+        parts = []
+        first_token = time.perf_counter()
+        async for chunk in explain_client.astream(prompt):
+            if first_token is not None:
+                observe("stream.first_token", time.perf_counter() - first_token)
+                first_token = None
+            text = _chunk_text(chunk)
+            if text:
+                parts.append(text)
+                yield _sse("token", {"text": text})
+
+        final_answer = "".join(parts)
+        answer = {
+            "topic": req.topic,
+            "answer": final_answer,
+            "followup_used_history": followup
+        }
+        if tier != "full" and not followup:
+            answer["degraded"] = tier
+        yield _sse("answer", answer)
+
+        confidence = None
+        if needs_fact_check(req.topic) and not followup and tier == "full":
+            with stage("task.fact_check"):
+                factcheck = await fact_client.ainvoke(_with_context(
+                    FACT_CHECK_PROMPT,
+                    research=research,
+                    explanation=final_answer,
+                ))
+            factcheck_out = _chunk_text(factcheck)
+            confidence = extract_confidence(factcheck_out)
+            yield _sse("factcheck", {"confidence": confidence, "report": factcheck_out})
+
+        await _finish(req, ctx, final_answer, confidence, cache=tier not in ("lite", "deadline"))
+        if not followup and tier in ("full", "no_fact_check"):
+            _prefetch_followups(req, rag_text, history_text, preferences, final_answer)
+        yield _sse("done", {"confidence": confidence})
+
+    except Exception as e:
+        await _discard(ctx["index_task"])
+        if is_rate_limit(e):
+            admission.note_rate_limit()
+            yield _sse("error", {"error": BUSY_MESSAGE, "retry_after": 5})
+            return
+        await chat_writer.submit(user_id=req.userId, query=req.topic, verdict="ERROR")
+        print("❌ ERROR:", e)
+        yield _sse("error", {"error": "Internal server error"})
+
+
+@ask_router.post("/ask/stream")
+async def ask_ai_stream(req: AskRequest):
+    return StreamingResponse(
+        _ask_events(req),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,70 @@
+"""
+Password hashing and user lookups for /login and /register.
+
+bcrypt runs on its own bounded thread pool (bcrypt releases the GIL), so a
+login storm queues up there instead of starving the threads and event loop
+that /ask relies on.
+  BCRYPT_ROUNDS        cost factor for new hashes; older hashes are upgraded on login
+  AUTH_HASH_WORKERS    bcrypt threads (default: CPU count, at most 4)
+  AUTH_USER_CACHE_TTL  seconds a user looked up by email stays cached
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from db import async_users_collection
+from ttl_cache import TTLCache
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", "30"))
+
+USER_PROJECTION = {"_id": 0, "userId": 1, "email": 1, "password": 1}
+
+_hash_pool = ThreadPoolExecutor(max_workers=AUTH_HASH_WORKERS, thread_name_prefix="bcrypt")
+user_cache = TTLCache(AUTH_USER_CACHE_SIZE, AUTH_USER_CACHE_TTL)
+
+
+async def _run(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, fn, *args)
+
+
+async def hash_password(password: str) -> str:
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    hashed = await _run(bcrypt.hashpw, password.encode(), salt)
+    return hashed.decode()
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await _run(bcrypt.checkpw, password.encode(), hashed.encode())
+
+
+def needs_rehash(hashed: str) -> bool:
+    """True for hashes made with a lower cost than BCRYPT_ROUNDS."""
+    try:
+        return int(hashed.split("$")[2]) < BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+async def find_user(email: str):
+    user = user_cache.get(email)
+    if user is None:
+        user = await async_users_collection.find_one({"email": email}, USER_PROJECTION)
+        if user is not None:
+            user_cache.put(email, user)
+    return user
+
+
+async def rehash(user: dict, password: str):
+    """Store a hash at the current cost, unless the password changed meanwhile."""
+    new_hash = await hash_password(password)
+    result = await async_users_collection.update_one(
+        {"userId": user["userId"], "password": user["password"]},
+        {"$set": {"password": new_hash}},
+    )
+    if result.modified_count:
+        user_cache.put(user["email"], {**user, "password": new_hash})
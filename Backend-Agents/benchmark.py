@@ -0,0 +1,289 @@
+"""
+Load test and benchmark for the FastAPI app.
+
+    python benchmark.py --concurrency 16 --requests 200 --users 20 --chats-per-user 500
+
+By default the app runs in-process on the offline stand-ins
+(AI_BACKEND=fake, MONGO_URI=mongomock://), so no Gemini, Serper or MongoDB is
+needed and the upstream latencies come from the FAKE_* settings in fakes.py.
+Pass --url to drive an already running server instead (no seeding, no
+per-stage breakdown).
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Benchmark /ask, RAG, store_chat and auth routes")
+    p.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    p.add_argument("--users", type=int, default=10)
+    p.add_argument("--chats-per-user", type=int, default=200, help="seeded RAG history per user")
+    p.add_argument("--history", type=int, default=4, help="chat turns sent with each /ask")
+    p.add_argument("--followup-ratio", type=float, default=0.3)
+    p.add_argument("--repeat-ratio", type=float, default=0.3, help="share of /ask topics reused")
+    p.add_argument("--scenarios", default="auth,history,rag,store,ask",
+                   help="comma separated subset of auth,history,rag,store,ask")
+    p.add_argument("--seed", type=int, default=7)
+    return p.parse_args()
+
+
+TOPICS = [
+    "how does a mutex differ from a semaphore",
+    "explain kafka consumer groups and partition rebalancing",
+    "what is the difference between processes and threads in linux",
+    "how does python garbage collection handle reference cycles",
+    "explain the raft consensus algorithm leader election",
+    "what are docker layers and how does build caching work",
+    "how do database indexes speed up range queries",
+    "explain eventual consistency in distributed key value stores",
+]
+FOLLOWUPS = ["tell me more", "give example", "why is that", "elaborate on the second point"]
+
+
+def percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(name: str, latencies, wall: float, errors: int) -> dict:
+    return {
+        "scenario": name,
+        "count": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": (statistics.fmean(latencies) * 1000) if latencies else 0.0,
+    }
+
+
+def print_table(rows, title: str):
+    if not rows:
+        return
+    print(f"\n{title}")
+    cols = list(rows[0].keys())
+    widths = {c: max(len(c), *(len(_fmt(r[c])) for r in rows)) for c in cols}
+    print("  ".join(c.ljust(widths[c]) for c in cols))
+    for r in rows:
+        print("  ".join(_fmt(r[c]).ljust(widths[c]) for c in cols))
+
+
+def _fmt(v) -> str:
+    return f"{v:.1f}" if isinstance(v, float) else str(v)
+
+
+async def run_load(name, make_call, total: int, concurrency: int) -> dict:
+    """Fire `total` calls of make_call(i) with at most `concurrency` in flight."""
+    sem = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i):
+        nonlocal errors
+        async with sem:
+            start = time.perf_counter()
+            try:
+                ok = await make_call(i)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return summarize(name, latencies, time.perf_counter() - start, errors)
+
+
+async def register_users(client, n: int):
+    users = []
+    for i in range(n):
+        email = f"bench{i}-{random.randrange(10**9)}@example.com"
+        await client.post("/register", json={"email": email, "password": "bench-password"})
+        res = await client.post("/login", json={"email": email, "password": "bench-password"})
+        users.append({"email": email, "userId": res.json()["userId"]})
+    return users
+
+
+def seed_chats(users, per_user: int):
+    """Insert synthetic ALLOWED chats with embeddings straight into the store."""
+    from agents import embed_model
+    from chat_store import store_chat
+
+    for u in users:
+        for j in range(per_user):
+            topic = f"{random.choice(TOPICS)} variant {j}"
+            answer = f"answer about {topic}"
+            store_chat(
+                user_id=u["userId"],
+                query=topic,
+                verdict="ALLOWED",
+                response=answer,
+                confidence=random.randint(40, 100),
+                embedding=embed_model.encode(answer).tolist(),
+            )
+
+
+def ask_payload(rng, user, args) -> dict:
+    history = []
+    for t in range(args.history):
+        role = "user" if t % 2 == 0 else "ai"
+        history.append({"role": role, "content": f"{role} turn {t} about {rng.choice(TOPICS)}"})
+
+    if history and rng.random() < args.followup_ratio:
+        topic = rng.choice(FOLLOWUPS)
+    elif rng.random() < args.repeat_ratio:
+        topic = rng.choice(TOPICS)
+    else:
+        topic = f"{rng.choice(TOPICS)} in context {rng.randrange(10**6)}"
+    return {"topic": topic, "userId": user["userId"], "history": history}
+
+
+async def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    scenarios = set(args.scenarios.split(","))
+    in_process = not args.url
+
+    if in_process:
+        os.environ.setdefault("AI_BACKEND", "fake")
+        os.environ.setdefault("MONGO_URI", "mongomock://localhost")
+        # A handful of synthetic users would trip the per-user rate limit
+        os.environ.setdefault("ASK_USER_RATE", "1000")
+        os.environ.setdefault("ASK_USER_BURST", "1000")
+
+    import httpx
+
+    if in_process:
+        from main import app
+        from db import ensure_indexes
+        await ensure_indexes()
+        transport = httpx.ASGITransport(app=app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120)
+    else:
+        client = httpx.AsyncClient(base_url=args.url, timeout=120)
+
+    results = []
+    async with client:
+        users = await register_users(client, args.users)
+        if in_process and args.chats_per_user:
+            start = time.perf_counter()
+            seed_chats(users, args.chats_per_user)
+            print(f"seeded {args.users * args.chats_per_user} chats in {time.perf_counter() - start:.1f}s")
+
+        if in_process:
+            import fakes
+            fakes.stage_timings(reset=True)
+
+        if "auth" in scenarios:
+            async def login(i):
+                u = users[i % len(users)]
+                res = await client.post("/login", json={"email": u["email"], "password": "bench-password"})
+                return res.status_code == 200
+            results.append(await run_load("login", login, args.requests, args.concurrency))
+
+        if "history" in scenarios:
+            async def history(i):
+                res = await client.get(f"/chats/{users[i % len(users)]['userId']}")
+                return res.status_code == 200
+            results.append(await run_load("chats", history, args.requests, args.concurrency))
+
+        if in_process and "rag" in scenarios:
+            from agents import RAG_CANDIDATES, _embed, _load_index
+            from semantic_cache import normalize_topic
+            import vector_index
+
+            # The same embed -> index fetch -> search steps /ask runs
+            async def rag(i):
+                user_id = users[i % len(users)]["userId"]
+                q, index = await asyncio.gather(
+                    _embed(normalize_topic(rng.choice(TOPICS)), "embed_query"),
+                    _load_index(user_id),
+                )
+                vector_index.search(user_id, q, k=RAG_CANDIDATES, index=index, with_scores=True)
+                return True
+            results.append(await run_load("rag_search", rag, args.requests, args.concurrency))
+
+        if in_process and "store" in scenarios:
+            from chat_store import store_chat_async
+
+            async def store(i):
+                await store_chat_async(
+                    user_id=users[i % len(users)]["userId"],
+                    query="bench store",
+                    verdict="ALLOWED",
+                    response="bench answer",
+                    embedding=[0.1] * 384,
+                )
+                return True
+            results.append(await run_load("store_chat", store, args.requests, args.concurrency))
+
+            from agents import chat_writer
+
+            async def store_queued(i):
+                await chat_writer.submit(
+                    user_id=users[i % len(users)]["userId"],
+                    query="bench store",
+                    verdict="ALLOWED",
+                    response="bench answer",
+                    embed_text="bench answer",
+                )
+                return True
+            start = time.perf_counter()
+            results.append(await run_load("store_queued", store_queued, args.requests, args.concurrency))
+            await chat_writer.flush()
+            print(f"write-behind drained {args.requests} chats in {time.perf_counter() - start:.2f}s "
+                  f"({chat_writer.stats()['batches']} batches)")
+
+        if "ask" in scenarios:
+            async def ask(i):
+                payload = ask_payload(rng, users[i % len(users)], args)
+                res = await client.post("/ask", json=payload)
+                return res.status_code == 200 and "error" not in res.json()
+            results.append(await run_load("ask", ask, args.requests, args.concurrency))
+            if in_process:
+                from agents import chat_writer
+                await chat_writer.flush()
+
+    print_table(results, "Latency / throughput")
+
+    if in_process:
+        import fakes
+        stages = [
+            {
+                "stage": stage,
+                "calls": len(v),
+                "mean_ms": statistics.fmean(v) * 1000,
+                "p95_ms": percentile(v, 95) * 1000,
+                "total_s": sum(v),
+            }
+            for stage, v in sorted(fakes.stage_timings().items())
+        ]
+        print_table(stages, "Per-stage upstream time (offline stand-ins)")
+
+        from metrics import stage_totals
+        pipeline = [
+            {
+                "stage": name,
+                "count": t.get("count", 0),
+                "mean_ms": (t["sum_s"] / t["count"] * 1000) if t.get("count") else 0.0,
+                "total_s": t.get("sum_s", 0.0),
+            }
+            for name, t in sorted(stage_totals().items())
+        ]
+        print_table(pipeline, "Per-stage pipeline time (app_stage_seconds)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""
+Incrementally maintained chat rollups for the admin dashboard.
+
+Every stored chat bumps two documents in `chat_rollups`:
+  {kind: "day", day}              -> counts per verdict + confidence buckets
+  {kind: "user_day", day, userId} -> counts per verdict
+so dashboard queries read a handful of rollups instead of scanning `chats`.
+
+    python chat_stats.py --rebuild   # recompute rollups from existing chats
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from pymongo import UpdateOne
+from db import chats_collection, chat_rollups_collection
+
+VERDICTS = ("ALLOWED", "BLOCKED", "ERROR")
+
+
+def day_key(ts: datetime) -> str:
+    return ts.strftime("%Y-%m-%d")
+
+
+def confidence_bucket(confidence) -> str:
+    """0-9 -> "0", 10-19 -> "10", ... 90-100 -> "90"."""
+    return str(min(int(confidence) // 10 * 10, 90))
+
+
+def rollup_ops(doc) -> list:
+    """UpdateOne upserts that account for one stored chat document."""
+    day = day_key(doc["createdAt"])
+    verdict = doc["verdict"]
+
+    day_inc = {f"counts.{verdict}": 1, "total": 1}
+    if doc.get("confidence") is not None:
+        day_inc[f"confidence.{confidence_bucket(doc['confidence'])}"] = 1
+
+    return [
+        UpdateOne(
+            {"_id": f"day:{day}"},
+            {"$inc": day_inc, "$setOnInsert": {"kind": "day", "day": day}},
+            upsert=True,
+        ),
+        UpdateOne(
+            {"_id": f"user_day:{doc['userId']}:{day}"},
+            {
+                "$inc": {f"counts.{verdict}": 1, "total": 1},
+                "$setOnInsert": {"kind": "user_day", "day": day, "userId": doc["userId"]},
+            },
+            upsert=True,
+        ),
+    ]
+
+
+def day_range(start: datetime = None, end: datetime = None) -> dict:
+    days = {}
+    if start:
+        days["$gte"] = day_key(start)
+    if end:
+        days["$lte"] = day_key(end)
+    return {"day": days} if days else {}
+
+
+def rebuild():
+    """Recompute every rollup from the raw chats collection."""
+    days = defaultdict(lambda: {"counts": defaultdict(int), "confidence": defaultdict(int), "total": 0})
+    user_days = defaultdict(lambda: {"counts": defaultdict(int), "total": 0})
+
+    cursor = chats_collection.find(
+        {},
+        {"_id": 0, "userId": 1, "verdict": 1, "confidence": 1, "createdAt": 1}
+    ).batch_size(1000)
+
+    for chat in cursor:
+        if not chat.get("createdAt"):
+            continue
+        day = day_key(chat["createdAt"])
+        d = days[day]
+        d["counts"][chat["verdict"]] += 1
+        d["total"] += 1
+        if chat.get("confidence") is not None:
+            d["confidence"][confidence_bucket(chat["confidence"])] += 1
+
+        u = user_days[(chat["userId"], day)]
+        u["counts"][chat["verdict"]] += 1
+        u["total"] += 1
+
+    docs = [
+        {"_id": f"day:{day}", "kind": "day", "day": day, "total": d["total"],
+         "counts": dict(d["counts"]), "confidence": dict(d["confidence"])}
+        for day, d in days.items()
+    ] + [
+        {"_id": f"user_day:{user_id}:{day}", "kind": "user_day", "day": day,
+         "userId": user_id, "total": u["total"], "counts": dict(u["counts"])}
+        for (user_id, day), u in user_days.items()
+    ]
+
+    chat_rollups_collection.delete_many({})
+    if docs:
+        chat_rollups_collection.insert_many(docs)
+    return len(docs)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintain chat rollup documents")
+    parser.add_argument("--rebuild", action="store_true", help="recompute all rollups from chats")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        print(f"wrote {rebuild()} rollup documents")
+    else:
+        parser.print_help()
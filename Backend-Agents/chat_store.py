@@ -1,14 +1,18 @@
-from datetime import datetime
-from db import chats_collection
+from datetime import datetime, timedelta
+from db import (
+    CHAT_RETENTION_DAYS,
+    chats_collection,
+    async_chats_collection,
+    chat_rollups_collection,
+    async_chat_rollups_collection,
+)
+import vector_index
+from chat_stats import rollup_ops
+from metrics import stage
+from embedding_codec import encode_embedding
 
-def store_chat(
-    user_id,
-    query,
-    verdict,
-    response=None,
-    confidence=None,
-    embedding=None
-):
+
+def _chat_doc(user_id, query, verdict, response, confidence, embedding):
     doc = {
         "userId": str(user_id),
         "query": query,
@@ -19,6 +23,39 @@ def store_chat(
     }
 
     if embedding is not None and len(embedding) > 0:
-        doc["embedding"] = embedding
+        doc["embedding"] = encode_embedding(embedding)
+
+    retention_days = CHAT_RETENTION_DAYS.get(verdict)
+    if retention_days:
+        doc["expireAt"] = doc["createdAt"] + timedelta(days=retention_days)
+    return doc
+
+
+def store_chat(
+    user_id,
+    query,
+    verdict,
+    response=None,
+    confidence=None,
+    embedding=None
+):
+    doc = _chat_doc(user_id, query, verdict, response, confidence, embedding)
+    with stage("store_chat"):
+        chats_collection.insert_one(doc)
+        chat_rollups_collection.bulk_write(rollup_ops(doc), ordered=False)
+    vector_index.add_chat(user_id, doc)
+
 
-    chats_collection.insert_one(doc)
+async def store_chat_async(
+    user_id,
+    query,
+    verdict,
+    response=None,
+    confidence=None,
+    embedding=None
+):
+    doc = _chat_doc(user_id, query, verdict, response, confidence, embedding)
+    with stage("store_chat"):
+        await async_chats_collection.insert_one(doc)
+        await async_chat_rollups_collection.bulk_write(rollup_ops(doc), ordered=False)
+    vector_index.add_chat(user_id, doc)
@@ -0,0 +1,193 @@
+"""
+Write-behind persistence for chats.
+
+/ask hands the finished answer to ChatWriter.submit() and returns; a single
+background worker drains the queue in batches of up to CHAT_WRITE_BATCH:
+  1. answers that still need an embedding are encoded in one encode() call
+  2. the chat documents go out in one insert_many
+  3. their dashboard rollups go out in one bulk_write
+Transient Mongo failures of the insert are retried with jittered backoff,
+and close() flushes whatever is queued when the app shuts down. The rollup
+$inc batch is not idempotent, so it is never retried: a failed one is
+logged and dropped (`python chat_stats.py --rebuild` recomputes rollups),
+and it does not fail the chats that were stored.
+"""
+import asyncio
+import os
+import random
+
+from pymongo.errors import BulkWriteError, ConnectionFailure
+
+from db import async_chats_collection, async_chat_rollups_collection
+import vector_index
+from chat_stats import rollup_ops
+from chat_store import _chat_doc
+from embedding_codec import encode_embedding
+from metrics import stage
+
+CHAT_WRITE_BATCH = int(os.getenv("CHAT_WRITE_BATCH", "64"))
+CHAT_WRITE_LINGER = float(os.getenv("CHAT_WRITE_LINGER_MS", "20")) / 1000
+CHAT_WRITE_QUEUE_MAX = int(os.getenv("CHAT_WRITE_QUEUE_MAX", "10000"))
+CHAT_WRITE_RETRIES = int(os.getenv("CHAT_WRITE_RETRIES", "5"))
+CHAT_WRITE_BACKOFF = float(os.getenv("CHAT_WRITE_BACKOFF_MS", "100")) / 1000
+CHAT_WRITE_SHUTDOWN_TIMEOUT = float(os.getenv("CHAT_WRITE_SHUTDOWN_TIMEOUT", "30"))
+
+DUPLICATE_KEY = 11000
+
+
+class _Pending:
+    __slots__ = ("doc", "embedding", "embed_text", "on_stored")
+
+    def __init__(self, doc, embedding, embed_text, on_stored):
+        self.doc = doc
+        self.embedding = embedding
+        self.embed_text = embed_text
+        self.on_stored = on_stored
+
+
+class ChatWriter:
+    def __init__(self, embedder=None, batch_size: int = CHAT_WRITE_BATCH):
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self._queue = None
+        self._worker = None
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.retries = 0
+        self.rollups_failed = 0
+
+    async def submit(
+        self,
+        user_id,
+        query,
+        verdict,
+        response=None,
+        confidence=None,
+        embedding=None,
+        embed_text=None,
+        on_stored=None,
+    ):
+        """
+        Queue one chat for storage. createdAt is taken now, not at flush time.
+
+        embed_text is encoded in the worker when no embedding is given;
+        on_stored(embedding) runs once the chat has been written.
+        """
+        doc = _chat_doc(user_id, query, verdict, response, confidence, embedding)
+        pending = _Pending(doc, embedding, embed_text if embedding is None else None, on_stored)
+
+        if self._worker is None or self._worker.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue(CHAT_WRITE_QUEUE_MAX)
+            self._worker = asyncio.create_task(self._run())
+        # Only blocks when the queue is full, which pushes back on /ask
+        await self._queue.put(pending)
+
+    async def flush(self):
+        """Wait until everything queued so far has been written (or given up on)."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self):
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self.flush(), CHAT_WRITE_SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"❌ CHAT WRITER: {self._queue.qsize()} chats not written at shutdown")
+        self._worker.cancel()
+        await asyncio.gather(self._worker, return_exceptions=True)
+        self._worker = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            # Linger briefly so a burst of requests shares one round trip
+            deadline = loop.time() + CHAT_WRITE_LINGER
+            while len(batch) < self.batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._write(batch)
+                self.written += len(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                print("❌ CHAT WRITE FAILED:", e)
+            finally:
+                self.batches += 1
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write(self, batch):
+        to_embed = [p for p in batch if p.embed_text]
+        if to_embed:
+            with stage("embed_answer"):
+                vectors = await asyncio.to_thread(
+                    self.embedder.encode, [p.embed_text for p in to_embed]
+                )
+            for p, vec in zip(to_embed, vectors):
+                p.embedding = vec.tolist()
+                p.doc["embedding"] = encode_embedding(p.embedding)
+
+        docs = [p.doc for p in batch]
+        with stage("store_chat"):
+            await self._retry(self._insert, docs)
+
+        # Stored from here on, whatever happens to the rollups
+        for p in batch:
+            vector_index.add_chat(p.doc["userId"], p.doc)
+            if p.on_stored is not None:
+                try:
+                    p.on_stored(p.embedding)
+                except Exception as e:
+                    print("❌ CHAT WRITER CALLBACK:", e)
+
+        ops = [op for doc in docs for op in rollup_ops(doc)]
+        try:
+            with stage("store_rollups"):
+                await async_chat_rollups_collection.bulk_write(ops, ordered=False)
+        except Exception as e:
+            # A retry could count an applied but unacknowledged $inc twice
+            self.rollups_failed += len(batch)
+            print("❌ CHAT ROLLUP WRITE FAILED:", e)
+
+    async def _insert(self, docs):
+        try:
+            await async_chats_collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # insert_many assigns _ids client side, so on a retry the
+            # documents that made it the first time come back as duplicates
+            errors = e.details.get("writeErrors", [])
+            if not errors or any(err.get("code") != DUPLICATE_KEY for err in errors):
+                raise
+
+    async def _retry(self, op, *args, **kwargs):
+        for attempt in range(CHAT_WRITE_RETRIES + 1):
+            try:
+                return await op(*args, **kwargs)
+            except ConnectionFailure:
+                if attempt == CHAT_WRITE_RETRIES:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(CHAT_WRITE_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "retries": self.retries,
+            "rollups_failed": self.rollups_failed,
+        }
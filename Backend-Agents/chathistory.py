@@ -1,16 +1,90 @@
-from fastapi import HTTPException
-import uuid
+from fastapi import HTTPException, Query, Response
+import json
 from datetime import datetime
-from db import users_collection, chats_collection
+from bson import ObjectId
+from bson.errors import InvalidId
+from db import chats_collection
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 
 history_router = APIRouter()
 
+MAX_PAGE_SIZE = 100
+
+# Embeddings are internal to RAG and never leave the server
+HISTORY_PROJECTION = {
+    "userId": 1,
+    "query": 1,
+    "verdict": 1,
+    "response": 1,
+    "confidence": 1,
+    "createdAt": 1,
+}
+
+
+def _make_cursor(chat) -> str:
+    return f"{chat['createdAt'].isoformat()}_{chat['_id']}"
+
+
+def _cursor_filter(before: str) -> dict:
+    """Chats strictly older than the cursor; _id breaks createdAt ties."""
+    try:
+        ts, oid = before.rsplit("_", 1)
+        created_at, last_id = datetime.fromisoformat(ts), ObjectId(oid)
+    except (ValueError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"$or": [
+        {"createdAt": {"$lt": created_at}},
+        {"createdAt": created_at, "_id": {"$lt": last_id}},
+    ]}
+
+
 @history_router.get("/chats/{user_id}")
-def get_chats(user_id: str):
-    chats = chats_collection.find(
+def get_chats(
+    user_id: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    before: str = None,
+):
+    """
+    Newest-first page of a user's chats.
+    Pass the X-Next-Cursor response header back as ?before= for the next page.
+    """
+    query = {"userId": user_id}
+    if before:
+        query.update(_cursor_filter(before))
+
+    chats = list(
+        chats_collection.find(query, HISTORY_PROJECTION)
+        .sort([("createdAt", -1), ("_id", -1)])
+        .limit(limit)
+    )
+
+    if len(chats) == limit and chats[-1].get("createdAt"):
+        response.headers["X-Next-Cursor"] = _make_cursor(chats[-1])
+
+    for chat in chats:
+        chat.pop("_id", None)
+    return chats
+
+
+def _export_lines(user_id: str):
+    cursor = chats_collection.find(
         {"userId": user_id},
-        {"_id": 0}
-    ).sort("createdAt", -1)
+        {**HISTORY_PROJECTION, "_id": 0}
+    ).sort("createdAt", -1).batch_size(200)
+
+    try:
+        for chat in cursor:
+            yield json.dumps(chat, default=str) + "\n"
+    finally:
+        cursor.close()
+
 
-    return list(chats)
+@history_router.get("/chats/{user_id}/export")
+def export_chats(user_id: str):
+    return StreamingResponse(
+        _export_lines(user_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="chats-{user_id}.ndjson"'},
+    )
@@ -0,0 +1,186 @@
+"""
+Token-budgeted prompt context: RAG memory + chat history.
+
+Both sections share CONTEXT_TOKEN_BUDGET (estimated at ~4 chars/token):
+  - RAG hits are ranked by similarity decayed with age, deduped against
+    the history the client already sent, and trimmed per snippet.
+  - The newest KEEP_RECENT_TURNS turns are always kept; older turns are
+    ranked by topic overlap and recency and kept verbatim while they fit.
+    Everything left out is folded into a rolling extractive summary whose
+    per-turn lines are cached per conversation, so each turn is compressed
+    only once however long the session runs.
+"""
+import hashlib
+import math
+import os
+import re
+from datetime import datetime
+
+from ttl_cache import TTLCache
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1800"))
+RAG_SHARE = float(os.getenv("CONTEXT_RAG_SHARE", "0.4"))
+KEEP_RECENT_TURNS = int(os.getenv("CONTEXT_KEEP_RECENT_TURNS", "2"))
+MAX_TURN_TOKENS = int(os.getenv("CONTEXT_MAX_TURN_TOKENS", "300"))
+MAX_SNIPPET_TOKENS = int(os.getenv("CONTEXT_MAX_SNIPPET_TOKENS", "200"))
+SUMMARY_TOKENS = int(os.getenv("CONTEXT_SUMMARY_TOKENS", "250"))
+RAG_HALF_LIFE_DAYS = float(os.getenv("CONTEXT_RAG_HALF_LIFE_DAYS", "30"))
+
+_WORD = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+_summaries = TTLCache(max_entries=5000, ttl=6 * 3600)
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def truncate(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    return text[:max_tokens * 4].rsplit(" ", 1)[0] + " …"
+
+
+def _words(text: str) -> set:
+    return {w for w in _WORD.findall(text.lower()) if len(w) > 2}
+
+
+def _overlap(a: set, b: set) -> float:
+    return len(a & b) / len(a) if a else 0.0
+
+
+def _turn_line(turn) -> str:
+    role = (getattr(turn, "role", "") or "").upper()
+    return f"{role}: {(getattr(turn, 'content', '') or '').strip()}"
+
+
+def _compress(turn) -> str:
+    """One short extractive line per turn for the rolling summary."""
+    content = " ".join((getattr(turn, "content", "") or "").split())
+    first = _SENTENCE_END.split(content, 1)[0]
+    words = first.split()
+    if len(words) > 20:
+        first = " ".join(words[:20]) + " …"
+    who = "User asked" if getattr(turn, "role", "") == "user" else "AI said"
+    return f"- {who}: {first}"
+
+
+def _conversation_key(user_id, turns) -> str:
+    first = (getattr(turns[0], "content", "") or "") if turns else ""
+    return hashlib.sha1(f"{user_id}\x00{first}".encode()).hexdigest()
+
+
+def _summary_lines(user_id, turns) -> list:
+    """Compressed line per turn, reusing the lines cached for this conversation."""
+    key = _conversation_key(user_id, turns)
+    cached = _summaries.get(key) or []
+    digests = [hash((getattr(t, "role", ""), getattr(t, "content", ""))) for t in turns]
+
+    reused = 0
+    while reused < min(len(cached), len(turns)) and cached[reused][0] == digests[reused]:
+        reused += 1
+
+    entries = cached[:reused] + [(digests[i], _compress(turns[i])) for i in range(reused, len(turns))]
+    if reused < len(turns) or reused < len(cached):
+        _summaries.put(key, entries)
+    return [line for _, line in entries]
+
+
+def _recency(created_at) -> float:
+    if not isinstance(created_at, datetime):
+        return 1.0
+    age_days = max((datetime.utcnow() - created_at).total_seconds() / 86400.0, 0.0)
+    return math.pow(0.5, age_days / RAG_HALF_LIFE_DAYS)
+
+
+def _norm(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+
+def build_rag_text(scored_docs, history, budget: int) -> str:
+    history_norm = _norm("\n".join(_turn_line(t) for t in (history or [])))
+    asked = {_norm(getattr(t, "content", "")) for t in (history or []) if getattr(t, "role", "") == "user"}
+    ranked = sorted(
+        scored_docs,
+        key=lambda sd: sd[0] * (0.5 + 0.5 * _recency(sd[1].get("createdAt"))),
+        reverse=True,
+    )
+
+    blocks, used = [], 0
+    for _, d in ranked:
+        query = (d.get("query") or "").strip()
+        response = (d.get("response") or "").strip()
+        # Skip memories the client already sent back as part of this session
+        if query and _norm(query) in asked:
+            continue
+        if response and _norm(response)[:200] in history_norm:
+            continue
+
+        block = f"Past Q: {query}\nPast A: {truncate(response, MAX_SNIPPET_TOKENS)}"
+        cost = estimate_tokens(block)
+        if used + cost > budget:
+            continue
+        blocks.append(block)
+        used += cost
+    return "\n\n".join(blocks)
+
+
+def build_history_text(user_id, topic: str, history, budget: int) -> str:
+    turns = [t for t in (history or []) if (getattr(t, "content", "") or "").strip()]
+    if not turns:
+        return ""
+
+    lines = [truncate(_turn_line(t), MAX_TURN_TOKENS) for t in turns]
+    costs = [estimate_tokens(l) for l in lines]
+
+    keep = set()
+    used = 0
+    for i in range(len(turns) - 1, max(len(turns) - 1 - KEEP_RECENT_TURNS, -1), -1):
+        keep.add(i)
+        used += costs[i]
+
+    older = [i for i in range(len(turns)) if i not in keep]
+    if older:
+        topic_words = _words(topic)
+        n = len(turns)
+        ranked = sorted(
+            older,
+            key=lambda i: 0.6 * _overlap(topic_words, _words(lines[i])) + 0.4 * (i + 1) / n,
+            reverse=True,
+        )
+        room = budget - used - min(SUMMARY_TOKENS, budget // 4)
+        for i in ranked:
+            if costs[i] <= room:
+                keep.add(i)
+                room -= costs[i]
+                used += costs[i]
+
+    parts = []
+    dropped = [i for i in range(len(turns)) if i not in keep]
+    if dropped:
+        summary_lines = _summary_lines(user_id, turns)
+        picked, spent = [], 0
+        for i in reversed(dropped):
+            cost = estimate_tokens(summary_lines[i])
+            if spent + cost > min(SUMMARY_TOKENS, max(budget - used, 0)):
+                break
+            picked.append(summary_lines[i])
+            spent += cost
+        if picked:
+            parts.append("SUMMARY OF EARLIER TURNS:\n" + "\n".join(reversed(picked)))
+
+    parts.extend(lines[i] for i in sorted(keep))
+    return "\n".join(parts)
+
+
+def build_context(user_id, topic: str, history, scored_docs, budget: int = CONTEXT_TOKEN_BUDGET):
+    """Return (rag_text, history_text) that together fit in `budget` tokens."""
+    rag_budget = int(budget * RAG_SHARE)
+
+    rag_text = build_rag_text(scored_docs, history, rag_budget)
+
+    # Whatever RAG did not use is available to the history
+    history_budget = budget - estimate_tokens(rag_text)
+    history_text = build_history_text(user_id, topic, history, history_budget)
+    return rag_text, history_text
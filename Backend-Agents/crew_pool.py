@@ -0,0 +1,32 @@
+import os
+import queue
+
+CREW_POOL_SIZE = int(os.getenv("CREW_POOL_SIZE", "8"))
+
+
+class CrewPool:
+    """
+    Prebuilt crews of one shape, reused across requests.
+
+    Task descriptions are templates filled by kickoff(inputs=...), so a crew
+    can serve any request; each one is checked out by a single request at a
+    time. The pool never blocks: when every crew is busy a new one is built,
+    and at most `size` idle crews are kept.
+    """
+
+    def __init__(self, build, size: int = CREW_POOL_SIZE):
+        self.build = build
+        self.size = size
+        self._idle = queue.SimpleQueue()
+        self.built = 0
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            self.built += 1
+            return self.build()
+
+    def release(self, crew):
+        if self._idle.qsize() < self.size:
+            self._idle.put(crew)
@@ -1,10 +1,104 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, IndexModel, ASCENDING, DESCENDING
+from motor.motor_asyncio import AsyncIOMotorClient
 import os
 MONGO_URI = os.getenv("MONGO_URI")
-client = MongoClient(MONGO_URI)
+
+# MONGO_URI=mongomock:// runs against an in-memory database (offline/bench)
+IN_MEMORY = bool(MONGO_URI) and MONGO_URI.startswith("mongomock://")
+
+if IN_MEMORY:
+    import mongomock
+    from mongomock_motor import AsyncMongoMockClient
+    client = mongomock.MongoClient()
+else:
+    client = MongoClient(MONGO_URI)
 
 db = client["ai_assistant"]
 
 users_collection = db["users"]
 chats_collection = db["chats"]
-print("DATBASE CREATED SUCCESSFULLY")
+chat_rollups_collection = db["chat_rollups"]
+# Read and written from CrewAI tool threads, hence the sync handle
+search_results_collection = db["search_results"]
+
+# Async handles on the same database for the asyncio request path
+if IN_MEMORY:
+    # Wrap the same mock client so sync and async handles share data
+    async_client = AsyncMongoMockClient(mock_mongo_client=client)
+else:
+    async_client = AsyncIOMotorClient(MONGO_URI)
+async_db = async_client["ai_assistant"]
+
+async_users_collection = async_db["users"]
+async_chats_collection = async_db["chats"]
+async_chat_rollups_collection = async_db["chat_rollups"]
+async_guard_verdicts_collection = async_db["guard_verdicts"]
+async_user_memory_collection = async_db["user_memory"]
+
+# Days ERROR / BLOCKED chats are kept (0 keeps them forever). Rollups are
+# written when a chat is stored, so dashboard counts outlive the chats.
+CHAT_RETENTION_DAYS = {
+    "ERROR": int(os.getenv("CHAT_RETENTION_ERROR_DAYS", "30")),
+    "BLOCKED": int(os.getenv("CHAT_RETENTION_BLOCKED_DAYS", "180")),
+}
+
+# Every hot query has an index here; verify_indexes.py checks the plans
+INDEXES = {
+    "users": [
+        # login / register by email, $lookup and admin joins by userId
+        IndexModel([("email", ASCENDING)], unique=True, name="uniq_email"),
+        IndexModel([("userId", ASCENDING)], unique=True, name="uniq_userId"),
+    ],
+    "chats": [
+        # /chats/{user_id} and its export: newest first, _id breaks ties
+        IndexModel(
+            [("userId", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)],
+            name="userId_createdAt",
+        ),
+        # RAG index loads only read embedded ALLOWED chats
+        IndexModel(
+            [("userId", ASCENDING)],
+            name="userId_rag",
+            partialFilterExpression={"verdict": "ALLOWED", "embedding": {"$exists": True}},
+        ),
+        # /admin/blocked: one verdict, newest first
+        IndexModel([("verdict", ASCENDING), ("createdAt", DESCENDING)], name="verdict_createdAt"),
+        # Retention: only chats stored with an expireAt (see CHAT_RETENTION_DAYS) expire
+        IndexModel([("expireAt", ASCENDING)], expireAfterSeconds=0, name="expireAt_ttl"),
+    ],
+    "chat_rollups": [
+        # /admin/stats: rollups of one kind over a day range
+        IndexModel([("kind", ASCENDING), ("day", ASCENDING)], name="kind_day"),
+    ],
+    "search_results": [
+        # Cached web searches (search_cache.py) expire per query
+        IndexModel([("expireAt", ASCENDING)], expireAfterSeconds=0, name="expireAt_ttl"),
+    ],
+}
+
+
+async def ensure_indexes():
+    """Create the declared indexes; run once at start-up (existing ones are a no-op)."""
+    for name, indexes in INDEXES.items():
+        await async_db[name].create_indexes(indexes)
+
+
+_unique_email_confirmed = False
+
+
+async def unique_email_index_ready() -> bool:
+    """
+    Whether the unique email index exists. /register relies on it to reject
+    duplicates, so it checks for one itself until this is confirmed.
+    """
+    global _unique_email_confirmed
+    if not _unique_email_confirmed:
+        try:
+            info = await async_users_collection.index_information()
+        except Exception as e:
+            print("❌ INDEX CHECK FAILED:", e)
+            return False
+        _unique_email_confirmed = any(
+            ix.get("unique") and list(ix["key"]) == [("email", 1)] for ix in info.values()
+        )
+    return _unique_email_confirmed
@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+from bson.binary import Binary
+
+# "float32" keeps full precision at 4 bytes/dim; "int8" quantizes to
+# 1 byte/dim plus a per-vector float32 scale.
+EMBEDDING_FORMAT = os.getenv("EMBEDDING_FORMAT", "float32")
+
+# User-defined BSON binary subtypes (0x80-0xFF are reserved for applications)
+FLOAT32_SUBTYPE = 0x80
+INT8_SUBTYPE = 0x81
+
+
+def encode_embedding(vec, fmt: str = None) -> Binary:
+    """Pack an embedding into a compact little-endian BSON Binary."""
+    fmt = fmt or EMBEDDING_FORMAT
+    v = np.asarray(vec, dtype="<f4").ravel()
+
+    if fmt == "float32":
+        return Binary(v.tobytes(), FLOAT32_SUBTYPE)
+
+    if fmt == "int8":
+        peak = float(np.abs(v).max()) if v.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        q = np.clip(np.rint(v / scale), -127, 127).astype(np.int8)
+        return Binary(np.float32(scale).astype("<f4").tobytes() + q.tobytes(), INT8_SUBTYPE)
+
+    raise ValueError(f"Unknown embedding format: {fmt}")
+
+
+def decode_embedding(value) -> np.ndarray:
+    """
+    Turn a stored embedding back into a float32 vector.
+    float32 Binaries are decoded zero-copy; legacy float lists still work.
+    """
+    if isinstance(value, Binary):
+        if value.subtype == FLOAT32_SUBTYPE:
+            return np.frombuffer(value, dtype="<f4")
+        if value.subtype == INT8_SUBTYPE:
+            scale = np.frombuffer(value, dtype="<f4", count=1)[0]
+            return np.frombuffer(value, dtype=np.int8, offset=4).astype(np.float32) * scale
+        raise ValueError(f"Unknown embedding subtype: {value.subtype}")
+    return np.asarray(value, dtype=np.float32)
+
+
+def is_packed(value) -> bool:
+    return isinstance(value, Binary) and value.subtype in (FLOAT32_SUBTYPE, INT8_SUBTYPE)
@@ -0,0 +1,237 @@
+"""
+One embedding model per host, shared by every API worker.
+
+    python embedding_service.py --socket /tmp/embedder.sock
+
+loads the model once and serves encode requests on a Unix socket.
+Concurrent requests from all workers are merged into one encode() call of
+up to EMBED_MAX_BATCH texts, waiting at most EMBED_BATCH_WINDOW_MS for
+company. Workers run with EMBEDDING_MODE=service and get an
+EmbeddingClient from providers.make_embedder. That client falls back to an
+in-process model while the service is unreachable (EMBEDDING_FALLBACK=local,
+the default) or raises instead (EMBEDDING_FALLBACK=none).
+
+Wire format, all integers big-endian:
+  request   u32 length + JSON {"texts": [...]}
+  response  u8 status + u32 rows + u32 dim + rows*dim float32
+            (status 1: u32 length + UTF-8 error message instead)
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from metrics import observe
+
+EMBEDDING_SOCKET = os.getenv("EMBEDDING_SOCKET", "/tmp/embedder.sock")
+EMBEDDING_FALLBACK = os.getenv("EMBEDDING_FALLBACK", "local")
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "128"))
+EMBED_BATCH_WINDOW = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5")) / 1000
+EMBED_CLIENT_TIMEOUT = float(os.getenv("EMBED_CLIENT_TIMEOUT", "10"))
+EMBED_RETRY_AFTER = float(os.getenv("EMBED_RETRY_AFTER", "5"))
+
+_LEN = struct.Struct(">I")
+_HEADER = struct.Struct(">BII")
+
+
+def _recv_exact(sock, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("embedding service closed the connection")
+        buf += chunk
+    return bytes(buf)
+
+
+# ---------- server ----------
+
+class EmbeddingServer:
+    def __init__(self, model):
+        self.model = model
+        self._pending = []
+        self._wakeup = asyncio.Event()
+        self.requests = 0
+        self.batches = 0
+
+    async def embed(self, texts) -> np.ndarray:
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((texts, fut))
+        self._wakeup.set()
+        return await fut
+
+    async def run_batcher(self):
+        while True:
+            await self._wakeup.wait()
+            # Give other workers' requests a moment to join this batch
+            await asyncio.sleep(EMBED_BATCH_WINDOW)
+
+            batch, size = [], 0
+            while self._pending and (not batch or size + len(self._pending[0][0]) <= EMBED_MAX_BATCH):
+                texts, fut = self._pending.pop(0)
+                batch.append((texts, fut))
+                size += len(texts)
+            if not self._pending:
+                self._wakeup.clear()
+
+            flat = [t for texts, _ in batch for t in texts]
+            try:
+                vectors = await asyncio.to_thread(self.model.encode, flat)
+                vectors = np.asarray(vectors, dtype=np.float32).reshape(len(flat), -1)
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+
+            self.batches += 1
+            offset = 0
+            for texts, fut in batch:
+                if not fut.done():
+                    fut.set_result(vectors[offset:offset + len(texts)])
+                offset += len(texts)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    (length,) = _LEN.unpack(await reader.readexactly(_LEN.size))
+                except asyncio.IncompleteReadError:
+                    break
+                request = json.loads(await reader.readexactly(length))
+                self.requests += 1
+                try:
+                    vectors = await self.embed(list(request["texts"]))
+                    rows, dim = vectors.shape
+                    writer.write(_HEADER.pack(0, rows, dim) + vectors.tobytes())
+                except Exception as e:
+                    message = str(e).encode()
+                    writer.write(_HEADER.pack(1, 0, 0) + _LEN.pack(len(message)) + message)
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+async def serve(socket_path: str, model_name: str):
+    from providers import make_local_embedder
+
+    start = time.perf_counter()
+    server = EmbeddingServer(make_local_embedder(model_name))
+    print(f"✅ {model_name} loaded in {time.perf_counter() - start:.1f}s")
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    unix_server = await asyncio.start_unix_server(server.handle, path=socket_path)
+    os.chmod(socket_path, 0o660)
+    print(f"✅ Embedding service listening on {socket_path}")
+
+    batcher = asyncio.create_task(server.run_batcher())
+    try:
+        async with unix_server:
+            await unix_server.serve_forever()
+    finally:
+        batcher.cancel()
+
+
+# ---------- client ----------
+
+class EmbeddingClient:
+    """
+    SentenceTransformer-compatible encode() backed by the shared service.
+
+    Each thread keeps its own connection. When the service cannot be
+    reached, calls go to `fallback()` (built on first use) and the socket is
+    retried every EMBED_RETRY_AFTER seconds.
+    """
+
+    def __init__(self, socket_path: str = EMBEDDING_SOCKET, fallback=None):
+        self.socket_path = socket_path
+        self.fallback = fallback
+        self._local = threading.local()
+        self._fallback_model = None
+        self._fallback_lock = threading.Lock()
+        self._down_until = 0.0
+        self.remote_calls = 0
+        self.fallback_calls = 0
+
+    def encode(self, sentences, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        if time.monotonic() >= self._down_until:
+            try:
+                start = time.perf_counter()
+                vectors = self._request(texts)
+                observe("embed.remote", time.perf_counter() - start)
+                self.remote_calls += 1
+                return vectors[0] if single else vectors
+            except (OSError, ConnectionError) as e:
+                self._disconnect()
+                if self.fallback is None or EMBEDDING_FALLBACK != "local":
+                    raise
+                print("❌ EMBEDDING SERVICE UNAVAILABLE, encoding in-process:", e)
+                self._down_until = time.monotonic() + EMBED_RETRY_AFTER
+        elif self.fallback is None or EMBEDDING_FALLBACK != "local":
+            raise ConnectionError("embedding service unavailable")
+
+        self.fallback_calls += 1
+        return self._fallback().encode(sentences, **kwargs)
+
+    def _fallback(self):
+        if self._fallback_model is None:
+            with self._fallback_lock:
+                if self._fallback_model is None:
+                    self._fallback_model = self.fallback()
+        return self._fallback_model
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(EMBED_CLIENT_TIMEOUT)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _disconnect(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _request(self, texts) -> np.ndarray:
+        sock = self._connection()
+        payload = json.dumps({"texts": texts}).encode()
+        sock.sendall(_LEN.pack(len(payload)) + payload)
+
+        status, rows, dim = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+        if status != 0:
+            (length,) = _LEN.unpack(_recv_exact(sock, _LEN.size))
+            raise RuntimeError(_recv_exact(sock, length).decode())
+        data = _recv_exact(sock, rows * dim * 4)
+        return np.frombuffer(data, dtype=np.float32).reshape(rows, dim)
+
+    def stats(self) -> dict:
+        return {
+            "remote_calls": self.remote_calls,
+            "fallback_calls": self.fallback_calls,
+            "fallback_loaded": self._fallback_model is not None,
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description="Serve one shared embedding model over a Unix socket")
+    p.add_argument("--socket", default=EMBEDDING_SOCKET)
+    p.add_argument("--model", default="all-MiniLM-L6-v2")
+    args = p.parse_args()
+    asyncio.run(serve(args.socket, args.model))
+
+
+if __name__ == "__main__":
+    main()
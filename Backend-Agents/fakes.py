@@ -0,0 +1,260 @@
+"""
+Deterministic offline stand-ins for Gemini, Serper and the embedding model.
+
+Selected with AI_BACKEND=fake (see providers.py). Latencies are configurable
+so the benchmark can model upstream behaviour:
+  FAKE_LLM_LATENCY_MS     base latency per LLM call        (default 300)
+  FAKE_LLM_JITTER_MS      uniform extra latency            (default 100)
+  FAKE_TOKEN_DELAY_MS     delay between streamed tokens    (default 5)
+  FAKE_SEARCH_LATENCY_MS  latency per web search           (default 400)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Any, List, Optional
+
+import numpy as np
+from crewai import BaseLLM
+from crewai.events.types.llm_events import LLMCallType
+from crewai.llms.base_llm import llm_call_context
+from crewai.tools import BaseTool
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "300"))
+FAKE_LLM_JITTER_MS = float(os.getenv("FAKE_LLM_JITTER_MS", "100"))
+FAKE_TOKEN_DELAY_MS = float(os.getenv("FAKE_TOKEN_DELAY_MS", "5"))
+FAKE_SEARCH_LATENCY_MS = float(os.getenv("FAKE_SEARCH_LATENCY_MS", "400"))
+
+SEARCH_TOOL_NAME = "Search the internet"
+
+_timings = defaultdict(list)
+_timings_lock = threading.Lock()
+
+
+def record(stage: str, seconds: float):
+    with _timings_lock:
+        _timings[stage].append(seconds)
+
+
+def stage_timings(reset: bool = False) -> dict:
+    """Durations (seconds) of every fake upstream call, grouped by stage."""
+    with _timings_lock:
+        snapshot = {k: list(v) for k, v in _timings.items()}
+        if reset:
+            _timings.clear()
+    return snapshot
+
+
+def _words(seed: str, n: int) -> List[str]:
+    vocab = [
+        "latency", "thread", "queue", "cache", "index", "service", "request",
+        "memory", "lock", "process", "network", "schema", "retry", "shard",
+        "buffer", "scheduler", "replica", "stream", "batch", "token",
+    ]
+    rng = random.Random(seed)
+    return [rng.choice(vocab) for _ in range(n)]
+
+
+def _topic_of(prompt: str) -> str:
+    for pattern in (r"Research '([^']*)'", r"User now asks: (.*)", r"latest question:\n(.*)", r"Request: (.*)"):
+        m = re.search(pattern, prompt)
+        if m:
+            return m.group(1).strip()
+    return "the topic"
+
+
+def respond(prompt: str, max_tokens: int) -> str:
+    """Canned answer shaped like what each pipeline stage expects to parse."""
+    topic = _topic_of(prompt)
+
+    if "numbered user request" in prompt:
+        n = len(re.findall(r"^\d+\. ", prompt, re.MULTILINE))
+        return "\n".join(f"{i}: SAFE" for i in range(1, n + 1))
+    if "SAFE or UNSAFE" in prompt:
+        return "SAFE"
+
+    if "=== Fact Check ===" in prompt:
+        body = "=== Explanation ===\n" + " ".join(_words(topic, 40))
+        checks = "\n".join(
+            f"{i}) Claim: {topic} claim {i}\n   Verdict: Supported\n   Evidence Used: evidence {i}"
+            for i in range(1, 4)
+        )
+        return f"{body}\n\n=== Fact Check ===\n{checks}\n\n=== Confidence ===\n85\nReason (1 line): offline stand-in"
+
+    if "Research '" in prompt:
+        return "\n".join(
+            f"- Fact: {topic} fact {i}\n  Evidence: {' '.join(_words(topic + str(i), 8))}\n"
+            f"  Source: https://example.com/{i}"
+            for i in range(1, 4)
+        )
+
+    return " ".join(_words(topic + prompt[-64:], min(max_tokens, 200)))
+
+
+def _crew_wrap(prompt: str, text: str, topic: str) -> str:
+    """Answer in the ReAct format CrewAI parses when it drives the model."""
+    if "Final Answer" not in prompt:
+        return text
+    if SEARCH_TOOL_NAME in prompt and "Observation" not in prompt.split("Begin!")[-1]:
+        return (
+            "Thought: I should search the web first.\n"
+            f"Action: {SEARCH_TOOL_NAME}\n"
+            f"Action Input: {json.dumps({'search_query': topic})}"
+        )
+    return f"Thought: I now know the final answer\nFinal Answer: {text}"
+
+
+def _prompt_text(messages) -> str:
+    return "\n".join(str(getattr(m, "content", m)) for m in messages)
+
+
+class FakeChatLLM(BaseChatModel):
+    """Chat model with Gemini-like latency that never leaves the process."""
+
+    stage: str = "llm"
+    model: str = "fake"
+    temperature: float = 0.0
+    max_output_tokens: int = 350
+    latency_ms: float = FAKE_LLM_LATENCY_MS
+    jitter_ms: float = FAKE_LLM_JITTER_MS
+    token_delay_ms: float = FAKE_TOKEN_DELAY_MS
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _delay(self) -> float:
+        return (self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000.0
+
+    def _answer(self, messages) -> str:
+        return respond(_prompt_text(messages), self.max_output_tokens)
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        start = time.perf_counter()
+        time.sleep(self._delay())
+        text = self._answer(messages)
+        record(self.stage, time.perf_counter() - start)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        start = time.perf_counter()
+        await asyncio.sleep(self._delay())
+        text = self._answer(messages)
+        record(self.stage, time.perf_counter() - start)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs):
+        start = time.perf_counter()
+        time.sleep(self._delay())
+        for word in self._answer(messages).split(" "):
+            time.sleep(self.token_delay_ms / 1000.0)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+        record(self.stage, time.perf_counter() - start)
+
+    async def _astream(self, messages, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs):
+        start = time.perf_counter()
+        await asyncio.sleep(self._delay())
+        for word in self._answer(messages).split(" "):
+            await asyncio.sleep(self.token_delay_ms / 1000.0)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+        record(self.stage, time.perf_counter() - start)
+
+
+class FakeCrewLLM(BaseLLM):
+    """
+    CrewAI-native counterpart of FakeChatLLM for the crew agents: CrewAI only
+    drives its own BaseLLM clients, not LangChain chat models. Emits the same
+    call events as CrewAI's real providers, token usage included.
+    """
+
+    stage: str = "llm"
+    latency_ms: float = FAKE_LLM_LATENCY_MS
+    jitter_ms: float = FAKE_LLM_JITTER_MS
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None,
+             from_task=None, from_agent=None, response_model=None):
+        with llm_call_context():
+            return self._call(messages, tools, callbacks, available_functions, from_task, from_agent)
+
+    def _call(self, messages, tools, callbacks, available_functions, from_task, from_agent):
+        self._emit_call_started_event(
+            messages=messages, tools=tools, callbacks=callbacks,
+            available_functions=available_functions, from_task=from_task, from_agent=from_agent,
+        )
+        start = time.perf_counter()
+        time.sleep((self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000.0)
+        prompt = messages if isinstance(messages, str) else "\n".join(
+            str(m.get("content", "")) for m in messages
+        )
+        text = _crew_wrap(prompt, respond(prompt, int(self.max_tokens or 350)), _topic_of(prompt))
+        text = self._apply_stop_words(text)
+        record(self.stage, time.perf_counter() - start)
+
+        usage = {"prompt_tokens": len(prompt.split()), "completion_tokens": len(text.split())}
+        self._track_token_usage_internal(usage)
+        self._emit_call_completed_event(
+            response=text, call_type=LLMCallType.LLM_CALL, from_task=from_task,
+            from_agent=from_agent, messages=messages, usage=usage,
+        )
+        return text
+
+    def get_context_window_size(self) -> int:
+        return 32768
+
+
+class FakeSearchTool(BaseTool):
+    name: str = SEARCH_TOOL_NAME
+    description: str = "Search the internet for a query and return the top results."
+    latency_ms: float = FAKE_SEARCH_LATENCY_MS
+
+    def _run(self, search_query: str = "", **kwargs) -> str:
+        start = time.perf_counter()
+        time.sleep(self.latency_ms / 1000.0)
+        results = [
+            {
+                "title": f"{search_query} result {i}",
+                "link": f"https://example.com/{hashlib.md5(search_query.encode()).hexdigest()[:8]}/{i}",
+                "snippet": " ".join(_words(search_query + str(i), 20)),
+            }
+            for i in range(1, 6)
+        ]
+        record("search", time.perf_counter() - start)
+        return json.dumps({"organic": results})
+
+
+class FakeEmbedder:
+    """
+    Hashed bag-of-words embeddings: deterministic, 384-dim like all-MiniLM-L6-v2,
+    and texts sharing words land close together, so semantic caches still hit.
+    """
+
+    dim = 384
+
+    def _token_vec(self, token: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+        return np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+
+    def _encode_one(self, text: str) -> np.ndarray:
+        tokens = re.findall(r"\w+", (text or "").lower())
+        v = np.zeros(self.dim, dtype=np.float32)
+        for t in tokens:
+            v += self._token_vec(t)
+        norm = np.linalg.norm(v)
+        return v / norm if norm > 0 else v
+
+    def encode(self, sentences, **kwargs):
+        start = time.perf_counter()
+        if isinstance(sentences, str):
+            out = self._encode_one(sentences)
+        else:
+            out = np.stack([self._encode_one(s) for s in sentences])
+        record("embed", time.perf_counter() - start)
+        return out
@@ -0,0 +1,318 @@
+"""
+Resilient invocation layer for the direct Gemini calls in agents.py and guard.py.
+
+ResilientLLM wraps one stage's client (and an optional fallback tier):
+  - every attempt has a timeout and the whole call an overall deadline
+    (LLM_TIMEOUT_<STAGE> / LLM_DEADLINE_<STAGE>, seconds)
+  - retryable errors (timeouts, rate limits, 5xx, connection drops) are
+    retried with full-jitter backoff, but only while the process-wide retry
+    budget lasts: each call earns LLM_RETRY_BUDGET_RATIO of a retry token,
+    so retries stay a bounded fraction of traffic when Gemini is struggling
+  - once a stage has LLM_HEDGE_MIN_SAMPLES latencies, an attempt still
+    running after that stage's p95 gets a duplicate request; the first
+    reply wins and the other is cancelled
+  - LLM_BREAKER_FAILURES consecutive failures open a circuit breaker and
+    calls go to the fallback model (LLM_FALLBACK_MODEL) for
+    LLM_BREAKER_COOLDOWN seconds before the primary gets a trial call
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from metrics import LLM_EVENTS
+
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "gemini-2.0-flash-lite")
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF = float(os.getenv("LLM_BACKOFF_MS", "250")) / 1000
+LLM_RETRY_BUDGET_RATIO = float(os.getenv("LLM_RETRY_BUDGET_RATIO", "0.1"))
+LLM_RETRY_BUDGET_MAX = float(os.getenv("LLM_RETRY_BUDGET_MAX", "10"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1") == "1"
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+# (attempt timeout, overall deadline) per stage
+_DEFAULT_LIMITS = {
+    "guard": (3, 6),
+    "explain": (20, 35),
+    "fact": (15, 25),
+    "research": (30, 50),
+}
+
+
+def _limits(stage: str):
+    timeout, deadline = _DEFAULT_LIMITS.get(stage, (20, 35))
+    return (
+        float(os.getenv(f"LLM_TIMEOUT_{stage.upper()}", timeout)),
+        float(os.getenv(f"LLM_DEADLINE_{stage.upper()}", deadline)),
+    )
+
+
+RETRYABLE_STATUS = (408, 429, 500, 502, 503, 504)
+
+# Provider exception classes (google.api_core, google.genai) that mean "try again"
+_RETRYABLE_NAMES = (
+    "ServiceUnavailable", "InternalServerError", "DeadlineExceeded", "ServerError",
+    "ResourceExhausted", "TooManyRequests",
+)
+_TRANSIENT = (asyncio.TimeoutError, ConnectionError)
+try:
+    import httpx
+    _TRANSIENT += (httpx.TransportError,)
+except ImportError:
+    pass
+
+
+def status_code(error: Exception):
+    """HTTP status of a provider error or the error it wraps, if it carries one."""
+    for e in (error, error.__cause__, error.__context__):
+        if e is None:
+            continue
+        for code in (
+            getattr(e, "status_code", None),
+            getattr(e, "code", None),
+            getattr(getattr(e, "response", None), "status_code", None),
+        ):
+            if isinstance(code, int):
+                return code
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """By exception type or HTTP status; the message text is never matched."""
+    if isinstance(error, _TRANSIENT):
+        return True
+    if any(type(e).__name__ in _RETRYABLE_NAMES for e in (error, error.__cause__) if e is not None):
+        return True
+    return status_code(error) in RETRYABLE_STATUS
+
+
+class RetryBudget:
+    """Token bucket of retries shared by every stage in the process."""
+
+    def __init__(self, ratio: float = LLM_RETRY_BUDGET_RATIO, cap: float = LLM_RETRY_BUDGET_MAX):
+        self.ratio = ratio
+        self.cap = cap
+        self.tokens = cap
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self.tokens = min(self.cap, self.tokens + self.ratio)
+
+    def spend(self) -> bool:
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+retry_budget = RetryBudget()
+
+
+class CircuitBreaker:
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._trial = False
+
+    def allow(self) -> bool:
+        """May the primary be called? In half-open state only one trial call may."""
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+            self.state = "half_open"
+            self._trial = False
+        if self.state == "half_open" and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def success(self):
+        self.state = "closed"
+        self._consecutive = 0
+
+    def failure(self):
+        self._consecutive += 1
+        if self.state == "half_open" or self._consecutive >= self.failures:
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+
+class ResilientLLM:
+    def __init__(self, stage: str, primary, fallback=None):
+        self.stage = stage
+        self.primary = primary
+        self.fallback = fallback
+        self.timeout, self.deadline = _limits(stage)
+        self.breaker = CircuitBreaker()
+        self._latencies = deque(maxlen=500)
+
+    # ---------- helpers ----------
+
+    def _event(self, name: str):
+        LLM_EVENTS.labels(self.stage, name).inc()
+
+    def _pick(self):
+        if self.fallback is None or self.breaker.allow():
+            return self.primary, True
+        self._event("fallback")
+        return self.fallback, False
+
+    def _record(self, is_primary: bool, ok: bool, seconds: float = None):
+        if not is_primary:
+            return
+        if ok:
+            self.breaker.success()
+            self._latencies.append(seconds)
+        else:
+            was_open = self.breaker.state == "open"
+            self.breaker.failure()
+            if self.breaker.state == "open" and not was_open:
+                self._event("breaker_open")
+
+    def hedge_delay(self):
+        """p95 of recent primary latencies, once there are enough of them."""
+        if not LLM_HEDGE or len(self._latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    async def _attempt(self, model, prompt, timeout: float, hedge: bool):
+        """One call, duplicated after the p95 delay; the first success wins."""
+        loop = asyncio.get_running_loop()
+        until = loop.time() + timeout
+        tasks = {asyncio.create_task(model.ainvoke(prompt))}
+        hedge_at = self.hedge_delay() if hedge else None
+        error = None
+        try:
+            while tasks:
+                remaining = until - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError(f"{self.stage} LLM call exceeded {timeout:.1f}s")
+                wait = remaining if hedge_at is None else min(remaining, hedge_at)
+                done, tasks = await asyncio.wait(tasks, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None:
+                        return t.result()
+                    error = t.exception()
+                if not done and hedge_at is not None:
+                    self._event("hedge")
+                    tasks.add(asyncio.create_task(model.ainvoke(prompt)))
+                    hedge_at = None
+            raise error
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    # ---------- public API, shaped like a LangChain chat model ----------
+
+    async def ainvoke(self, prompt):
+        loop = asyncio.get_running_loop()
+        until = loop.time() + self.deadline
+        retry_budget.earn()
+        attempt = 0
+        while True:
+            model, is_primary = self._pick()
+            start = loop.time()
+            try:
+                result = await self._attempt(
+                    model, prompt, min(self.timeout, until - loop.time()), hedge=is_primary
+                )
+                self._record(is_primary, True, loop.time() - start)
+                return result
+            except Exception as e:
+                self._record(is_primary, False)
+                if isinstance(e, asyncio.TimeoutError):
+                    self._event("timeout")
+                backoff = random.uniform(0, LLM_BACKOFF * 2 ** attempt)
+                if (
+                    not is_retryable(e)
+                    or attempt >= LLM_MAX_RETRIES
+                    or until - loop.time() <= backoff
+                    or not retry_budget.spend()
+                ):
+                    raise
+                attempt += 1
+                self._event("retry")
+                await asyncio.sleep(backoff)
+
+    async def astream(self, prompt):
+        """
+        Stream from the primary (or the fallback while the breaker is open).
+        A failure before the first chunk is retried like ainvoke; once text
+        has been sent it cannot be taken back, so later errors propagate.
+        """
+        loop = asyncio.get_running_loop()
+        until = loop.time() + self.deadline
+        retry_budget.earn()
+        attempt = 0
+        while True:
+            model, is_primary = self._pick()
+            start = loop.time()
+            stream = model.astream(prompt).__aiter__()
+            try:
+                first = await asyncio.wait_for(
+                    stream.__anext__(), min(self.timeout, until - loop.time())
+                )
+            except StopAsyncIteration:
+                self._record(is_primary, True, loop.time() - start)
+                return
+            except Exception as e:
+                self._record(is_primary, False)
+                await _close(stream)
+                backoff = random.uniform(0, LLM_BACKOFF * 2 ** attempt)
+                if (
+                    not is_retryable(e)
+                    or attempt >= LLM_MAX_RETRIES
+                    or until - loop.time() <= backoff
+                    or not retry_budget.spend()
+                ):
+                    raise
+                attempt += 1
+                self._event("retry")
+                await asyncio.sleep(backoff)
+                continue
+
+            self._record(is_primary, True, loop.time() - start)
+            yield first
+            try:
+                while True:
+                    remaining = until - loop.time()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError(f"{self.stage} LLM stream exceeded {self.deadline:.1f}s")
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), remaining)
+                    except StopAsyncIteration:
+                        return
+                    yield chunk
+            finally:
+                await _close(stream)
+
+    def invoke(self, prompt):
+        return self.primary.invoke(prompt)
+
+    def stats(self) -> dict:
+        return {
+            "breaker": self.breaker.state,
+            "hedge_after_s": self.hedge_delay(),
+            "timeout_s": self.timeout,
+            "deadline_s": self.deadline,
+            "retry_budget": round(retry_budget.tokens, 2),
+        }
+
+
+async def _close(stream):
+    aclose = getattr(stream, "aclose", None)
+    if aclose is not None:
+        try:
+            await aclose()
+        except Exception:
+            pass
@@ -0,0 +1,134 @@
+"""
+LLM latency and token usage for metrics.py, from two sources:
+  - LLMMetricsHandler, a LangChain callback on the models agents.py and
+    guard.py call directly (explain follow-ups and streams, fact check,
+    guard)
+  - track_crew_llm_calls(), a CrewAI event listener for the crew agents,
+    whose CrewAI clients never see LangChain callbacks
+
+Kept apart from metrics.py so importing the metrics (and with them the
+auth and history routes) does not pull in langchain or crewai.
+"""
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from metrics import LLM_SECONDS, LLM_TOKENS, STAGE_ERRORS, observe
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """Per-stage latency and token usage of one LangChain model's calls."""
+
+    def __init__(self, stage_name: str):
+        self.stage = stage_name
+        self._starts = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            elapsed = time.perf_counter() - start
+            LLM_SECONDS.labels(self.stage).observe(elapsed)
+            observe(f"llm.{self.stage}", elapsed)
+
+        usage = _usage(response)
+        if usage:
+            LLM_TOKENS.labels(self.stage, "input").inc(usage.get("input_tokens", 0))
+            LLM_TOKENS.labels(self.stage, "output").inc(usage.get("output_tokens", 0))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._starts.pop(run_id, None)
+        STAGE_ERRORS.labels(f"llm.{self.stage}").inc()
+
+
+def _usage(response) -> dict:
+    try:
+        message = response.generations[0][0].message
+        if getattr(message, "usage_metadata", None):
+            return message.usage_metadata
+    except (AttributeError, IndexError):
+        pass
+    usage = (response.llm_output or {}).get("usage_metadata") or {}
+    return {
+        "input_tokens": usage.get("prompt_token_count", 0),
+        "output_tokens": usage.get("candidates_token_count", 0),
+    }
+
+
+_crew_calls = {}
+_PENDING = object()
+_FAILED = object()
+_crew_lock = threading.Lock()
+_crew_tracking = False
+
+
+def track_crew_llm_calls(stages_by_role: dict):
+    """
+    Record every CrewAI agent LLM call under the stage of the agent's role
+    (unknown roles count as "crew"). Safe to call more than once.
+
+    CrewAI runs sync event handlers on a thread pool, so a call's start and
+    end events may be handled in either order; they are paired by call_id
+    and timed by the events' own timestamps.
+    """
+    global _crew_tracking
+    from crewai.events import (
+        LLMCallCompletedEvent, LLMCallFailedEvent, LLMCallStartedEvent, crewai_event_bus,
+    )
+    with _crew_lock:
+        if _crew_tracking:
+            return
+        _crew_tracking = True
+
+    def stage_of(event) -> str:
+        return stages_by_role.get(event.agent_role, "crew")
+
+    def pair(event, is_start: bool):
+        """(start, end) once both events of a call are in, else None."""
+        with _crew_lock:
+            other = _crew_calls.pop(event.call_id, _PENDING)
+            if other is _PENDING:
+                _crew_calls[event.call_id] = event
+                return None
+        if other is _FAILED:
+            return None
+        return (event, other) if is_start else (other, event)
+
+    @crewai_event_bus.on(LLMCallStartedEvent)
+    def on_start(source, event):
+        _finish(pair(event, True), stage_of(event))
+
+    @crewai_event_bus.on(LLMCallCompletedEvent)
+    def on_end(source, event):
+        stage_name = stage_of(event)
+        usage = event.usage or {}
+        LLM_TOKENS.labels(stage_name, "input").inc(
+            usage.get("prompt_tokens") or usage.get("prompt_token_count") or 0
+        )
+        LLM_TOKENS.labels(stage_name, "output").inc(
+            usage.get("completion_tokens") or usage.get("candidates_token_count") or 0
+        )
+        _finish(pair(event, False), stage_name)
+
+    @crewai_event_bus.on(LLMCallFailedEvent)
+    def on_error(source, event):
+        STAGE_ERRORS.labels(f"llm.{stage_of(event)}").inc()
+        with _crew_lock:
+            # Leave a marker if the start event has not been handled yet
+            if _crew_calls.pop(event.call_id, _PENDING) is _PENDING:
+                _crew_calls[event.call_id] = _FAILED
+
+
+def _finish(paired, stage_name: str):
+    if paired is None:
+        return
+    start, end = paired
+    elapsed = (end.timestamp - start.timestamp).total_seconds()
+    LLM_SECONDS.labels(stage_name).observe(elapsed)
+    observe(f"llm.{stage_name}", elapsed)
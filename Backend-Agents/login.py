@@ -1,22 +1,24 @@
 from fastapi import HTTPException
-import uuid
-from datetime import datetime
-from db import users_collection, chats_collection
-import bcrypt
 from fastapi import APIRouter
 from models import LoginRequest
+from metrics import stage
+from auth import find_user, verify_password, needs_rehash, rehash
 login_router = APIRouter()
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode(), hashed.encode())
-
 @login_router.post("/login")
 
-def login(req : LoginRequest):
-    user = users_collection.find_one({"email": req.email})
-    if not user or not verify_password(req.password, user["password"]):
+async def login(req : LoginRequest):
+    with stage("auth.user_lookup"):
+        user = await find_user(req.email)
+    with stage("auth.bcrypt"):
+        valid = bool(user) and await verify_password(req.password, user["password"])
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    if needs_rehash(user["password"]):
+        with stage("auth.rehash"):
+            await rehash(user, req.password)
+
     return {
         "userId": user["userId"],
         "email": user["email"]
@@ -1,10 +1,14 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from agents import ask_router
+from agents import ask_router, chat_writer, close_crews
 from login import login_router
 from signup import signup_router
 from chathistory import history_router
 from admin import admin_router
+from metrics import metrics_router, MetricsMiddleware
+from warmup import health_router, start_warmup
+from memory import user_memory
+from db import ensure_indexes
 app = FastAPI()
 
 app.add_middleware(
@@ -13,10 +17,40 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(ask_router)
 app.include_router(login_router)
 app.include_router(signup_router)
 app.include_router(history_router)
 app.include_router(admin_router)
+app.include_router(metrics_router)
+app.include_router(health_router)
+
+
+@app.on_event("startup")
+async def prepare_database():
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        # e.g. existing duplicate emails; the app still serves, /register
+        # checks for duplicates itself and /readyz reports the missing index
+        print("❌ INDEX SETUP FAILED:", e)
+
+
+@app.on_event("startup")
+async def warm_ai_stack():
+    await start_warmup()
+
+
+@app.on_event("shutdown")
+async def flush_pending_writes():
+    await chat_writer.close()
+    await user_memory.close()
+
+
+@app.on_event("shutdown")
+async def finish_crew_runs():
+    await close_crews()
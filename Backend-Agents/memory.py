@@ -1,29 +1,134 @@
-import json
+"""
+Per-user preferences and recent topics, stored in Mongo `user_memory`.
+
+    {_id: userId, preferences: {audience, explanation_style}, recent_topics: [newest, ...]}
+
+Reads go through an in-process LRU+TTL cache, so /ask does no I/O for a
+warm user. New topics show up in the cache at once and are written
+behind: every MEMORY_FLUSH_MS the topics queued for all users go out in
+one bulk_write of atomic $push/$position/$slice updates. Other workers
+see them once their cached copy expires (MEMORY_CACHE_TTL).
+"""
+import asyncio
 import os
 
-MEMORY_FILE = "user_memory.json"
+from pymongo import UpdateOne
+
+from db import async_user_memory_collection
+from ttl_cache import TTLCache
 
-DEFAULT_MEMORY = {
-    "preferences": {
-        "audience": "software engineer",
-        "explanation_style": "simple and practical"
-    },
-    "recent_topics": []
+RECENT_TOPICS_MAX = int(os.getenv("MEMORY_RECENT_TOPICS", "5"))
+MEMORY_CACHE_USERS = int(os.getenv("MEMORY_CACHE_USERS", "10000"))
+MEMORY_CACHE_TTL = float(os.getenv("MEMORY_CACHE_TTL", "60"))
+MEMORY_FLUSH_INTERVAL = float(os.getenv("MEMORY_FLUSH_MS", "200")) / 1000
+
+DEFAULT_PREFERENCES = {
+    "audience": "software engineer",
+    "explanation_style": "simple and practical"
 }
 
-def load_memory():
-    if not os.path.exists(MEMORY_FILE):
-        save_memory(DEFAULT_MEMORY)
-        return DEFAULT_MEMORY
-    with open(MEMORY_FILE, "r") as f:
-        return json.load(f)
-
-def save_memory(memory):
-    with open(MEMORY_FILE, "w") as f:
-        json.dump(memory, f, indent=2)
-
-def update_topic(topic):
-    memory = load_memory()
-    memory["recent_topics"].insert(0, topic)
-    memory["recent_topics"] = memory["recent_topics"][:5]
-    save_memory(memory)
+
+def _default_memory() -> dict:
+    return {"preferences": dict(DEFAULT_PREFERENCES), "recent_topics": []}
+
+
+class UserMemoryStore:
+    def __init__(self, collection):
+        self.collection = collection
+        self.cache = TTLCache(MEMORY_CACHE_USERS, MEMORY_CACHE_TTL)
+        self._pending = {}
+        self._flushing = None
+        self.flushes = 0
+
+    async def get(self, user_id) -> dict:
+        """{"preferences", "recent_topics"} for a user; treat it as read-only."""
+        user_id = str(user_id)
+        memory = self.cache.get(user_id)
+        if memory is not None:
+            return memory
+
+        doc = await self.collection.find_one(
+            {"_id": user_id}, {"preferences": 1, "recent_topics": 1}
+        ) or {}
+        memory = _default_memory()
+        memory["preferences"].update(doc.get("preferences") or {})
+        # Topics queued here but not flushed yet are newer than what Mongo has
+        queued = list(reversed(self._pending.get(user_id, [])))
+        memory["recent_topics"] = (queued + (doc.get("recent_topics") or []))[:RECENT_TOPICS_MAX]
+        self.cache.put(user_id, memory)
+        return memory
+
+    def record_topic(self, user_id, topic: str):
+        topic = " ".join((topic or "").split())
+        if not topic:
+            return
+        user_id = str(user_id)
+
+        memory = self.cache.get(user_id)
+        if memory is not None:
+            topics = [topic] + memory["recent_topics"]
+            self.cache.put(user_id, {**memory, "recent_topics": topics[:RECENT_TOPICS_MAX]})
+
+        self._pending.setdefault(user_id, []).append(topic)
+        if self._flushing is None or self._flushing.done():
+            self._flushing = asyncio.create_task(self._flush_later())
+
+    async def set_preferences(self, user_id, **preferences):
+        user_id = str(user_id)
+        preferences = {k: v for k, v in preferences.items() if k in DEFAULT_PREFERENCES}
+        if not preferences:
+            return
+        await self.collection.update_one(
+            {"_id": user_id},
+            {"$set": {f"preferences.{k}": v for k, v in preferences.items()}},
+            upsert=True,
+        )
+        self.cache.pop(user_id)
+
+    async def _flush_later(self):
+        await asyncio.sleep(MEMORY_FLUSH_INTERVAL)
+        await self.flush()
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        ops = [
+            UpdateOne(
+                {"_id": user_id},
+                {
+                    "$push": {"recent_topics": {
+                        "$each": list(reversed(topics)),
+                        "$position": 0,
+                        "$slice": RECENT_TOPICS_MAX,
+                    }},
+                    "$setOnInsert": {"preferences": dict(DEFAULT_PREFERENCES)},
+                },
+                upsert=True,
+            )
+            for user_id, topics in pending.items()
+        ]
+        try:
+            await self.collection.bulk_write(ops, ordered=False)
+            self.flushes += 1
+        except Exception as e:
+            # Put the topics back in front of anything queued meanwhile
+            for user_id, topics in pending.items():
+                self._pending[user_id] = (topics + self._pending.get(user_id, []))[-RECENT_TOPICS_MAX:]
+            print("❌ MEMORY FLUSH FAILED:", e)
+
+    async def close(self):
+        if self._flushing is not None:
+            self._flushing.cancel()
+            await asyncio.gather(self._flushing, return_exceptions=True)
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            **self.cache.stats(),
+            "pending_users": len(self._pending),
+            "flushes": self.flushes,
+        }
+
+
+user_memory = UserMemoryStore(async_user_memory_collection)
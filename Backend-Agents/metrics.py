@@ -0,0 +1,208 @@
+"""
+Per-stage timers, LLM token counters, cache ratios and sampled request traces.
+
+Everything is exported in Prometheus text format on GET /metrics.
+  TRACE_SAMPLE_RATE  fraction of requests whose per-stage trace is dumped (default 0)
+  TRACE_DUMP_PATH    NDJSON file sampled traces are appended to (default traces.ndjson)
+"""
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_DUMP_PATH = os.getenv("TRACE_DUMP_PATH", "traces.ndjson")
+
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40)
+
+STAGE_SECONDS = Histogram(
+    "app_stage_seconds", "Time spent in one pipeline stage", ["stage"], buckets=_BUCKETS
+)
+STAGE_ERRORS = Counter(
+    "app_stage_errors_total", "Stages that ended with an exception", ["stage"]
+)
+HTTP_SECONDS = Histogram(
+    "http_request_seconds", "HTTP request latency until the last body byte",
+    ["method", "route", "status"], buckets=_BUCKETS,
+)
+LLM_SECONDS = Histogram(
+    "llm_call_seconds", "Latency of one LLM call", ["stage"], buckets=_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "Tokens reported by the LLM provider", ["stage", "kind"]
+)
+LLM_EVENTS = Counter(
+    "llm_resilience_events_total", "Retries, hedges, timeouts and fallbacks of direct LLM calls",
+    ["stage", "event"],
+)
+SEARCH_RESULT_BYTES = Histogram(
+    "search_result_bytes", "Size of one live web search result",
+    buckets=(256, 1024, 4096, 16384, 65536, 262144),
+)
+
+metrics_router = APIRouter()
+
+
+# ---------- traces ----------
+
+class Trace:
+    def __init__(self, name: str, sampled: bool):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.sampled = sampled
+        self.start = time.perf_counter()
+        self.spans = []
+        self.attrs = {}
+
+
+_current_trace = ContextVar("current_trace", default=None)
+_dump_lock = threading.Lock()
+
+
+def start_trace(name: str) -> Trace:
+    trace = Trace(name, random.random() < TRACE_SAMPLE_RATE)
+    _current_trace.set(trace)
+    return trace
+
+
+def annotate(**attrs):
+    """Attach request attributes (user, cache hit, route taken) to the trace."""
+    trace = _current_trace.get()
+    if trace is not None and trace.sampled:
+        trace.attrs.update(attrs)
+
+
+def finish_trace(trace: Trace, status):
+    if trace is None or not trace.sampled:
+        return
+    record = {
+        "trace_id": trace.id,
+        "name": trace.name,
+        "status": status,
+        "total_ms": (time.perf_counter() - trace.start) * 1000,
+        "attrs": trace.attrs,
+        "spans": trace.spans,
+    }
+    with _dump_lock, open(TRACE_DUMP_PATH, "a") as f:
+        f.write(json.dumps(record, default=str) + "\n")
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block; works the same inside sync and async code."""
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        STAGE_ERRORS.labels(name).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        trace = _current_trace.get()
+        if trace is not None and trace.sampled:
+            trace.spans.append({
+                "stage": name,
+                "start_ms": (start - trace.start) * 1000,
+                "ms": elapsed * 1000,
+                "error": error,
+            })
+
+
+def observe(name: str, seconds: float):
+    """Record a stage whose duration was measured elsewhere."""
+    STAGE_SECONDS.labels(name).observe(seconds)
+    trace = _current_trace.get()
+    if trace is not None and trace.sampled:
+        trace.spans.append({
+            "stage": name,
+            "start_ms": (time.perf_counter() - seconds - trace.start) * 1000,
+            "ms": seconds * 1000,
+            "error": None,
+        })
+
+
+def stage_totals() -> dict:
+    """{stage: {"count", "sum_s"}} from the stage histogram, for the benchmark."""
+    totals = {}
+    for metric in STAGE_SECONDS.collect():
+        for sample in metric.samples:
+            name = sample.labels.get("stage")
+            if sample.name.endswith("_count"):
+                totals.setdefault(name, {})["count"] = int(sample.value)
+            elif sample.name.endswith("_sum"):
+                totals.setdefault(name, {})["sum_s"] = sample.value
+    return totals
+
+
+# ---------- caches ----------
+
+_caches = {}
+
+
+def register_cache(name: str, stats_fn):
+    """Expose a cache's stats() dict (hits, misses, hit_ratio, entries) as gauges."""
+    _caches[name] = stats_fn
+
+
+class _CacheCollector:
+    def collect(self):
+        fields = ("hits", "misses", "hit_ratio", "entries", "evictions")
+        families = {
+            f: GaugeMetricFamily(f"cache_{f}", f"Cache {f.replace('_', ' ')}", labels=["cache"])
+            for f in fields
+        }
+        for name, stats_fn in _caches.items():
+            stats = stats_fn()
+            for f in fields:
+                if f in stats:
+                    families[f].add_metric([name], stats[f])
+        yield from families.values()
+
+
+REGISTRY.register(_CacheCollector())
+
+
+# ---------- HTTP ----------
+
+class MetricsMiddleware:
+    """ASGI middleware: request latency per route template and a trace per request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        trace = start_trace(f"{scope['method']} {scope['path']}")
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                route = getattr(scope.get("route"), "path", "unmatched")
+                HTTP_SECONDS.labels(scope["method"], route, str(status["code"])).observe(
+                    time.perf_counter() - start
+                )
+                finish_trace(trace, status["code"])
+
+        await self.app(scope, receive, send_wrapper)
+
+
+@metrics_router.get("/metrics")
+def prometheus_metrics():
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
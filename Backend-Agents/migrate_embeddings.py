@@ -0,0 +1,52 @@
+"""
+Convert chat embeddings stored as BSON float lists into packed Binaries.
+
+    python migrate_embeddings.py [--format float32|int8] [--batch-size 500] [--dry-run]
+
+Safe to re-run: only documents whose embedding is still an array are touched.
+"""
+import argparse
+
+from pymongo import UpdateOne
+from db import chats_collection
+from embedding_codec import EMBEDDING_FORMAT, encode_embedding
+
+
+def migrate(fmt: str, batch_size: int, dry_run: bool = False) -> int:
+    cursor = chats_collection.find(
+        {"embedding": {"$type": "array"}},
+        {"embedding": 1}
+    ).batch_size(batch_size)
+
+    converted = 0
+    ops = []
+    for doc in cursor:
+        ops.append(UpdateOne(
+            {"_id": doc["_id"], "embedding": {"$type": "array"}},
+            {"$set": {"embedding": encode_embedding(doc["embedding"], fmt)}}
+        ))
+        if len(ops) >= batch_size:
+            converted += _flush(ops, dry_run)
+            ops = []
+    if ops:
+        converted += _flush(ops, dry_run)
+    return converted
+
+
+def _flush(ops, dry_run: bool) -> int:
+    if dry_run:
+        return len(ops)
+    result = chats_collection.bulk_write(ops, ordered=False)
+    return result.modified_count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--format", choices=["float32", "int8"], default=EMBEDDING_FORMAT)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    count = migrate(args.format, args.batch_size, args.dry_run)
+    action = "would convert" if args.dry_run else "converted"
+    print(f"{action} {count} chat embeddings to {args.format}")
@@ -0,0 +1,180 @@
+"""
+Speculative answers to the follow-ups users most often send next.
+
+With PREFETCH=1, after a new-topic answer agents.py schedules background
+jobs that answer the first PREFETCH_MAX_FOLLOWUPS of INTENTS ("give an
+example", "elaborate", "why") with the same RAG, history and preferences
+the answer was built from. Results are kept per user for PREFETCH_TTL
+seconds and only served while the follow-up's history still ends with
+the answer they were computed for.
+
+Prefetching never competes with real traffic:
+  - jobs wait PREFETCH_DELAY_MS so the answer goes out first
+  - at most PREFETCH_MAX_CONCURRENCY jobs run at once, and at most
+    PREFETCH_PER_MINUTE LLM calls are spent per minute
+  - jobs only start while admission is in the "full" tier with nobody
+    queued, and shed() cancels the running ones when load rises
+  - a user's next new-topic answer cancels their outstanding jobs
+"""
+import asyncio
+import hashlib
+import os
+import re
+import time
+
+from admission import admission
+from metrics import stage
+from ttl_cache import TTLCache
+
+PREFETCH = os.getenv("PREFETCH", "0") == "1"
+PREFETCH_TTL = float(os.getenv("PREFETCH_TTL", "90"))
+PREFETCH_USERS = int(os.getenv("PREFETCH_USERS", "10000"))
+PREFETCH_MAX_FOLLOWUPS = int(os.getenv("PREFETCH_MAX_FOLLOWUPS", "2"))
+PREFETCH_MAX_CONCURRENCY = int(os.getenv("PREFETCH_MAX_CONCURRENCY", "2"))
+PREFETCH_PER_MINUTE = float(os.getenv("PREFETCH_PER_MINUTE", "30"))
+PREFETCH_DELAY = float(os.getenv("PREFETCH_DELAY_MS", "250")) / 1000
+
+# Most frequent first: (intent, question the model is asked, user wordings it answers)
+INTENTS = (
+    ("example", "Give an example.", re.compile(
+        r"^\s*(?:(?:can\s+you\s+|please\s+)?(?:give|show)\s+(?:me\s+)?(?:an?\s+)?examples?"
+        r"|examples?|for\s+example)(?:\s+please)?\s*[?.!]*\s*$",
+        re.IGNORECASE,
+    )),
+    ("elaborate", "Elaborate on that.", re.compile(
+        r"^\s*(?:(?:can\s+you\s+|please\s+)?(?:elaborate|expand(?:\s+on\s+(?:that|it))?)"
+        r"|tell\s+me\s+more|explain\s+more|more\s+details?|go\s+on|continue|more)"
+        r"(?:\s+please)?\s*[?.!]*\s*$",
+        re.IGNORECASE,
+    )),
+    ("why", "Why?", re.compile(
+        r"^\s*(?:why|why\s+(?:is\s+that|so)|how\s+so|how\s+come)\s*[?.!]*\s*$",
+        re.IGNORECASE,
+    )),
+)
+
+
+def intent_of(query: str):
+    for intent, _, pattern in INTENTS:
+        if pattern.match(query or ""):
+            return intent
+    return None
+
+
+def _fingerprint(answer: str) -> str:
+    return hashlib.sha1(" ".join((answer or "").split()).encode()).hexdigest()
+
+
+def _last_answer(history):
+    for turn in reversed(history or []):
+        if getattr(turn, "role", "") == "ai":
+            return turn.content
+    return None
+
+
+class Prefetcher:
+    def __init__(self, generate):
+        """`generate(prompt)` is the coroutine that answers follow-ups."""
+        self.generate = generate
+        self._entries = TTLCache(PREFETCH_USERS, PREFETCH_TTL)
+        self._slots = asyncio.Semaphore(PREFETCH_MAX_CONCURRENCY)
+        self._running = set()
+        self._budget = PREFETCH_PER_MINUTE
+        self._budget_at = time.monotonic()
+        self.scheduled = 0
+        self.completed = 0
+        self.skipped = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _idle(self) -> bool:
+        return admission.tier() == "full" and admission.waiting == 0
+
+    def _spend(self) -> bool:
+        now = time.monotonic()
+        rate = PREFETCH_PER_MINUTE / 60
+        self._budget = min(PREFETCH_PER_MINUTE, self._budget + (now - self._budget_at) * rate)
+        self._budget_at = now
+        if self._budget < 1:
+            return False
+        self._budget -= 1
+        return True
+
+    def schedule(self, user_id, answer: str, build_prompt):
+        """Start jobs for the likely follow-ups to `answer`; build_prompt(question) -> prompt."""
+        if not PREFETCH or not answer:
+            return
+        self.cancel(user_id)
+        entry = {"answer": _fingerprint(answer), "answers": {}, "tasks": set()}
+        self._entries.put(str(user_id), entry)
+        for intent, question, _ in INTENTS[:PREFETCH_MAX_FOLLOWUPS]:
+            task = asyncio.create_task(self._job(entry, intent, build_prompt(question)))
+            entry["tasks"].add(task)
+            task.add_done_callback(entry["tasks"].discard)
+            self.scheduled += 1
+
+    async def _job(self, entry, intent: str, prompt: str):
+        await asyncio.sleep(PREFETCH_DELAY)
+        if not self._idle():
+            self.skipped += 1
+            return
+        async with self._slots:
+            # Load may have risen, or the budget run out, while this job waited
+            if not self._idle() or not self._spend():
+                self.skipped += 1
+                return
+            task = asyncio.current_task()
+            self._running.add(task)
+            try:
+                with stage("prefetch"):
+                    entry["answers"][intent] = await self.generate(prompt)
+                self.completed += 1
+            except asyncio.CancelledError:
+                self.cancelled += 1
+            except Exception as e:
+                self.failed += 1
+                print("❌ prefetch failed:", e)
+            finally:
+                self._running.discard(task)
+
+    def take(self, user_id, query: str, history):
+        """Prefetched answer for this follow-up, or None."""
+        intent = intent_of(query)
+        if intent is None:
+            return None
+        entry = self._entries.get(str(user_id))
+        answer = None
+        if entry is not None and entry["answer"] == _fingerprint(_last_answer(history)):
+            answer = entry["answers"].get(intent)
+        if answer is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return answer
+
+    def cancel(self, user_id):
+        entry = self._entries.pop(str(user_id))
+        if entry is not None:
+            for task in list(entry["tasks"]):
+                task.cancel()
+
+    def shed(self):
+        """Cancel the running jobs; real requests need the capacity."""
+        for task in list(self._running):
+            task.cancel()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            "scheduled": self.scheduled,
+            "completed": self.completed,
+            "skipped": self.skipped,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+        }
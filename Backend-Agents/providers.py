@@ -0,0 +1,91 @@
+"""
+Factories for the external AI dependencies used by agents.py.
+
+AI_BACKEND=live (default) builds the real Gemini / Serper / SentenceTransformer
+clients; AI_BACKEND=fake swaps in the deterministic offline stand-ins from
+fakes.py so the pipeline can run and be benchmarked without network access.
+"""
+import os
+
+AI_BACKEND = os.getenv("AI_BACKEND", "live")
+EMBEDDING_MODE = os.getenv("EMBEDDING_MODE", "local")
+SEARCH_CACHE = os.getenv("SEARCH_CACHE", "1") == "1"
+
+
+def make_llm(stage: str, **kwargs):
+    """Chat model for one pipeline stage (guard, research, explain, fact)."""
+    from llm_metrics import LLMMetricsHandler
+    kwargs.setdefault("callbacks", [LLMMetricsHandler(stage)])
+    if AI_BACKEND == "fake":
+        from fakes import FakeChatLLM
+        return FakeChatLLM(stage=stage, **kwargs)
+
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(**kwargs)
+
+
+def make_crew_llm(stage: str, model: str, temperature: float, max_output_tokens: int):
+    """
+    Model for a CrewAI agent. CrewAI runs its own BaseLLM clients and will
+    not drive the LangChain models from make_llm, so crews get these instead.
+
+    Live clients get the stage's LLM_TIMEOUT_<STAGE> per request and retry
+    retryable statuses LLM_MAX_RETRIES times, like llm_client.ResilientLLM.
+    """
+    if AI_BACKEND == "fake":
+        from fakes import FakeCrewLLM
+        return FakeCrewLLM(
+            stage=stage, model=f"fake/{model}", temperature=temperature, max_tokens=max_output_tokens
+        )
+
+    from crewai import LLM
+    from google.genai import types
+    from llm_client import LLM_MAX_RETRIES, RETRYABLE_STATUS, _limits
+    timeout, _ = _limits(stage)
+    http_options = types.HttpOptions(
+        timeout=int(timeout * 1000),
+        retry_options=types.HttpRetryOptions(
+            attempts=LLM_MAX_RETRIES + 1, http_status_codes=list(RETRYABLE_STATUS)
+        ),
+    )
+    return LLM(
+        model=f"gemini/{model}",
+        temperature=temperature,
+        max_tokens=max_output_tokens,
+        client_params={"http_options": http_options},
+    )
+
+
+def make_search_tool():
+    """Web search for the researcher, behind search_cache.py unless SEARCH_CACHE=0."""
+    if AI_BACKEND == "fake":
+        from fakes import FakeSearchTool
+        tool = FakeSearchTool()
+    else:
+        from crewai_tools import SerperDevTool
+        tool = SerperDevTool()
+
+    if SEARCH_CACHE:
+        from search_cache import cached_search_tool
+        return cached_search_tool(tool)
+    return tool
+
+
+def make_embedder(model_name: str):
+    """
+    EMBEDDING_MODE=local (default) loads the model in this process;
+    EMBEDDING_MODE=service talks to the per-host embedding_service.py.
+    """
+    if EMBEDDING_MODE == "service":
+        from embedding_service import EmbeddingClient
+        return EmbeddingClient(fallback=lambda: make_local_embedder(model_name))
+    return make_local_embedder(model_name)
+
+
+def make_local_embedder(model_name: str):
+    if AI_BACKEND == "fake":
+        from fakes import FakeEmbedder
+        return FakeEmbedder()
+
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
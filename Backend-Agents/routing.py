@@ -0,0 +1,256 @@
+"""
+Request routing heuristics for /ask: follow-up detection, fact-check
+triggers and confidence extraction.
+
+Everything matches whole words, so "it" does not match inside "git" or
+"digital" and "law" does not match "lawn". Follow-up detection splits the
+query into words once and only runs a pattern when a cue word makes a
+match possible; command and ordinal wording ("continue", "expand on",
+"the second point") only counts as a whole request or a reference, so
+"how do continue statements work" stays a new topic.
+Queries that are short but carry no follow-up wording are "ambiguous";
+with ROUTING_TIEBREAK=1 agents.py settles those by embedding similarity
+to the previous turn.
+
+    python routing_benchmark.py   # accuracy and throughput on a labeled set
+"""
+import os
+import re
+import string
+
+import numpy as np
+
+ROUTING_TIEBREAK = os.getenv("ROUTING_TIEBREAK", "1") == "1"
+FOLLOWUP_SIMILARITY = float(os.getenv("ROUTING_FOLLOWUP_SIMILARITY", "0.55"))
+SHORT_QUERY_WORDS = 4
+ANAPHORA_MAX_CONTENT_WORDS = 2
+
+FOLLOWUP, NEW_TOPIC, AMBIGUOUS = "followup", "new", "ambiguous"
+
+# Follow-up detection works on whole words: ASCII letters are lowercased
+# and punctuation becomes a separator, except "+" and "#" so "c++" and "c#"
+# stay one word. It runs on UTF-8 bytes, where translate() is a plain table
+# lookup; str.lower() plus str.translate cost more than the rest of it.
+_SEPARATORS = bytes(
+    32 if chr(b) in string.punctuation and chr(b) not in "+#" else ord(chr(b).lower()) if b < 128 else b
+    for b in range(256)
+)
+
+
+def _bytes_set(words: str) -> frozenset:
+    return frozenset(w.encode() for w in words.split())
+
+
+# Wording that only makes sense as a reaction to the previous answer,
+# keyed by its least common word. A query is only searched for the phrases
+# of the cue words it contains, which most new topics have none of.
+def _phrases(*texts):
+    """One pattern matching any of the phrases as whole words of the joined query."""
+    return re.compile(b" (?:%s) " % b"|".join(t.encode() for t in texts))
+
+
+def _give(noun: str):
+    return _phrases(f"give (?:me )?(?:an? )?{noun}", f"{noun} please")
+
+
+_FOLLOWUP_PHRASES = {
+    b"elaborate": _phrases("elaborate"),
+    b"further": _phrases("explain further"),
+    b"again": _phrases("explain again"),
+    b"more": _phrases("explain more", "tell me more"),
+    b"detail": _phrases("more detail"),
+    b"details": _phrases("more details"),
+    b"mean": _phrases("what do you mean"),
+    b"so": _phrases("how so", "why so"),
+    b"why": _phrases("why not", "why is that"),
+    b"example": _give("example"),
+    b"examples": _give("examples"),
+    b"sample": _give("sample"),
+    b"samples": _give("samples"),
+    b"simpler": _phrases("in simpler terms"),
+    b"simplify": _phrases("simplify"),
+    b"summarize": _phrases("summarize that", "summarize it", "summarize this"),
+    b"summarise": _phrases("summarise that", "summarise it", "summarise this"),
+}
+
+# "the second point", but not "the first step of the tls handshake"
+_ORDINAL = re.compile(
+    rb" the (?:first|second|third|last) (?:point|one|step|part) (?!(?:of|in|for|to|when|during) )"
+)
+_FOLLOWUP_PHRASES.update(dict.fromkeys(_bytes_set("first second third last"), _ORDINAL))
+_PHRASE_CUES = frozenset(_FOLLOWUP_PHRASES)
+
+# Openers: "and redis?", "what about lag", a lone "why?"
+_CONJUNCTIONS = _bytes_set("and but so also then")
+_ABOUT_OPENERS = _bytes_set("what how")
+_ONE_WORD = _bytes_set("why how really example examples more")
+
+# Bare commands, only as the whole request: "expand on the second point",
+# "please continue", but not "continue statements in python"
+_ASKING = _bytes_set("can could would")
+# command word -> the word that must follow it, if any
+_COMMANDS = {b"continue": None, b"expand": None, b"go": b"on", b"keep": b"going"}
+_COMMAND_TAILS = _bytes_set("on with from")
+_COMMAND_OPENERS = _ASKING | _bytes_set("please") | frozenset(_COMMANDS)
+
+_OPENERS = _CONJUNCTIONS | _ABOUT_OPENERS | _ONE_WORD | _COMMAND_OPENERS
+
+# Pronouns pointing back at the conversation
+_ANAPHORA = _bytes_set("it its that this these those they them their above previous earlier same")
+
+# Everything above that a one-word query can match
+_ONE_WORD_FOLLOWUPS = (
+    _ONE_WORD | _ANAPHORA
+    | frozenset(cue for cue, pattern in _FOLLOWUP_PHRASES.items() if pattern.fullmatch(b" %s " % cue))
+    | frozenset(word for word, second in _COMMANDS.items() if second is None)
+)
+
+_STOPWORDS = _bytes_set("""
+a an the is are was were be been being do does did can could should would will
+what which who whom whose when where why how of to in on for with about from by
+as at or and but if then so than too very just me my i you your we our us please
+explain tell show describe give more some any there here it its that this these
+those they them their above previous earlier same work works working use used
+""")
+
+# Topics whose answers get fact checked, as whole words
+_FACT_CHECK_WORDS = _bytes_set("""
+medical medicine medicines medication medications
+diagnose diagnosed diagnoses diagnosing diagnosis diagnostic diagnostics
+treat treats treated treating treatment treatments symptom symptoms
+dose doses dosage dosages dosing
+legal legally legality illegal illegally lawsuit lawsuits contract contracts
+invest invests invested investing investment investments investor investors
+stock stocks crypto cryptocurrency cryptocurrencies
+politics political politically politician politicians election elections
+hack hacks hacked hacking hacker hackers exploit exploits exploited exploiting exploitation
+bypass bypasses bypassed bypassing malware ddos
+""")
+# word -> (words it may not follow, words it may not precede): "the law of
+# large numbers", "moore's law" and "trading cards" are not legal or financial
+_FACT_CHECK_UNLESS = {
+    b"law": (_bytes_set("s"), _bytes_set("of")),
+    b"laws": (_bytes_set("s"), _bytes_set("of")),
+    b"trading": (frozenset(), _bytes_set("card cards")),
+}
+_FACT_CHECK_CUES = _FACT_CHECK_WORDS | frozenset(_FACT_CHECK_UNLESS)
+
+# Most to least specific; the first in-range match wins
+_CONFIDENCE = tuple(re.compile(p, re.IGNORECASE) for p in (
+    r"===\s*confidence\s*===\s*(\d{1,3})",
+    r"confidence(?:\s*score)?\s*[:\-]?\s*(\d{1,3})",
+    r"(\d{1,3})\s*/\s*100",
+    r"(\d{1,3})\s*%",
+))
+
+
+def _is_command(words: list) -> bool:
+    i = 0
+    if words[0] in _ASKING:
+        if words[1:2] != [b"you"]:
+            return False
+        i = 2
+    if words[i:i + 1] == [b"please"]:
+        i += 1
+    if i >= len(words) or words[i] not in _COMMANDS:
+        return False
+    second = _COMMANDS[words[i]]
+    if second is not None:
+        if words[i + 1:i + 2] != [second]:
+            return False
+        i += 1
+    tail = words[i + 1:]
+    return not tail or tail == [b"please"] or tail[0] in _COMMAND_TAILS
+
+
+def classify_followup(query: str) -> str:
+    """FOLLOWUP, NEW_TOPIC, or AMBIGUOUS (short query without follow-up wording)."""
+    # Inlined rather than split into helpers: this runs on every /ask with
+    # history, and call overhead was most of its cost.
+    if not query:
+        return NEW_TOPIC
+    try:
+        raw = query.encode()
+    except UnicodeEncodeError:  # lone surrogates
+        raw = query.encode("utf-8", "replace")
+    words = raw.translate(_SEPARATORS).split()
+    if len(words) < 2:
+        if not words:
+            return NEW_TOPIC
+        return FOLLOWUP if words[0] in _ONE_WORD_FOLLOWUPS else AMBIGUOUS
+
+    first = words[0]
+    if first in _OPENERS:
+        if first in _CONJUNCTIONS:
+            return FOLLOWUP
+        if first in _ABOUT_OPENERS:
+            if words[1] == b"about":
+                return FOLLOWUP
+        if first in _COMMAND_OPENERS and _is_command(words):
+            return FOLLOWUP
+
+    if not _PHRASE_CUES.isdisjoint(words):
+        text = b" " + b" ".join(words) + b" "
+        for cue in _PHRASE_CUES.intersection(words):
+            if _FOLLOWUP_PHRASES[cue].search(text):
+                return FOLLOWUP
+
+    if not _ANAPHORA.isdisjoint(words):
+        content = 0
+        for w in words:
+            if w not in _STOPWORDS:
+                content += 1
+                if content > ANAPHORA_MAX_CONTENT_WORDS:
+                    break
+        else:
+            return FOLLOWUP
+    if len(words) <= SHORT_QUERY_WORDS:
+        return AMBIGUOUS
+    return NEW_TOPIC
+
+
+def is_followup(query: str, similarity: float = None) -> bool:
+    """
+    `similarity` is the cosine similarity between the query and the previous
+    turn; it only decides ambiguous queries, which otherwise count as new topics.
+    """
+    route = classify_followup(query)
+    if route == AMBIGUOUS:
+        return similarity is not None and similarity >= FOLLOWUP_SIMILARITY
+    return route == FOLLOWUP
+
+
+def cosine(a, b) -> float:
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    denom = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(np.dot(a, b)) / denom if denom else 0.0
+
+
+def needs_fact_check(topic: str) -> bool:
+    if not topic:
+        return False
+    words = topic.encode("utf-8", "replace").translate(_SEPARATORS).split()
+    if _FACT_CHECK_CUES.isdisjoint(words):
+        return False
+    if not _FACT_CHECK_WORDS.isdisjoint(words):
+        return True
+    for i, w in enumerate(words):
+        unless = _FACT_CHECK_UNLESS.get(w)
+        if unless is not None:
+            not_after, not_before = unless
+            after = words[i + 1] if i + 1 < len(words) else None
+            if (i == 0 or words[i - 1] not in not_after) and after not in not_before:
+                return True
+    return False
+
+
+def extract_confidence(text: str):
+    if not text:
+        return None
+    for pattern in _CONFIDENCE:
+        for m in pattern.finditer(text):
+            val = int(m.group(1))
+            if 0 <= val <= 100:
+                return val
+    return None
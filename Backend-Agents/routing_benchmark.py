@@ -0,0 +1,190 @@
+"""
+Accuracy and throughput of the /ask routing heuristics in routing.py,
+next to the substring-scan versions they replaced.
+
+    python routing_benchmark.py --iterations 20000
+
+Follow-up labels assume the query arrives with chat history; ambiguous
+queries are scored as new topics (what /ask does without the embedding
+tiebreaker).
+"""
+import argparse
+import re
+import time
+
+import routing
+
+# (query, is a follow-up to the previous answer)
+FOLLOWUP_CASES = [
+    ("how do continue statements work in python loops", False),
+    ("what is the first step of the tls handshake", False),
+    ("tell me more", True),
+    ("elaborate", True),
+    ("give an example", True),
+    ("why?", True),
+    ("what do you mean by that", True),
+    ("can you expand on the second point", True),
+    ("how does it handle retries", True),
+    ("why is that slower", True),
+    ("and redis?", True),
+    ("what about consumer lag", True),
+    ("explain it in simpler terms", True),
+    ("is this safe in production", True),
+    ("how do they compare", True),
+    ("continue", True),
+    ("summarize that", True),
+    ("explain kafka consumer groups and partition rebalancing", False),
+    ("how does git handle merge conflicts between branches", False),
+    ("what is the difference between processes and threads in linux", False),
+    ("how do digital signatures work in tls handshakes", False),
+    ("explain the raft consensus algorithm leader election", False),
+    ("what are docker layers and how does build caching work", False),
+    ("how do database indexes speed up range queries", False),
+    ("write a python function to merge sorted lists", False),
+    ("what is a bloom filter used for in databases", False),
+    ("compare postgres mvcc with mysql innodb locking", False),
+    ("how does python garbage collection handle reference cycles", False),
+    ("explain eventual consistency in distributed key value stores", False),
+    ("what is kubernetes", False),
+    ("explain oauth", False),
+    ("what is a mutex", False),
+]
+
+# (topic, should be fact checked)
+FACT_CHECK_CASES = [
+    ("what is the recommended ibuprofen dose for adults", True),
+    ("can my landlord break the lease contract early", True),
+    ("should i invest in index funds or individual stocks", True),
+    ("how do sql injection exploits work", True),
+    ("symptoms of vitamin d deficiency", True),
+    ("is crypto trading taxed", True),
+    ("how was the 2020 election audited", True),
+    ("how does malware persist after reboot", True),
+    ("what treatment options exist for migraines", True),
+    ("is web scraping legal", True),
+    ("how do i water my lawn efficiently", False),
+    ("explain the treaty of westphalia", False),
+    ("what is a stockade fence", False),
+    ("how do react hooks work", False),
+    ("explain docker layers", False),
+    ("how does garbage collection work in go", False),
+    ("what is the law of large numbers", False),
+    ("what does a trading card game store sell", False),
+    ("how to bypass a proxy for local addresses", True),
+    ("describe the raft consensus protocol", False),
+    ("what does employment law say about overtime", True),
+    ("is it illegal to record a phone call", True),
+    ("explain moore's law", False),
+    ("how do the laws of thermodynamics apply to engines", False),
+    ("how does algorithmic trading work", True),
+]
+
+# (fact-check output, expected confidence)
+CONFIDENCE_CASES = [
+    ("=== Explanation ===\nAbout 50% of users ...\n=== Confidence ===\n82\nReason: solid", 82),
+    ("Claims verified.\nConfidence: 70", 70),
+    ("Confidence score - 91", 91),
+    ("overall 65/100", 65),
+    ("I am 75% sure", 75),
+    ("=== Explanation ===\nuptime is 99.9% and 40/100 nodes\n=== Confidence ===\n60", 60),
+    ("No score given", None),
+    ("Confidence: 250", None),
+]
+
+
+# ---------- previous implementations ----------
+
+def legacy_is_followup(q: str) -> bool:
+    q = (q or "").lower().strip()
+    if len(q.split()) <= 4:
+        return True
+    follow_markers = [
+        "elaborate", "explain more", "more details", "tell me more",
+        "what do you mean", "expand", "continue",
+        "why", "how so", "give example", "examples",
+        "it", "that", "this", "above"
+    ]
+    return any(m in q for m in follow_markers)
+
+
+def legacy_needs_fact_check(topic: str) -> bool:
+    t = (topic or "").lower()
+    risky = [
+        "medical", "medicine", "diagnos", "treat", "symptom", "dose",
+        "legal", "law", "contract", "lawsuit",
+        "invest", "stock", "crypto", "trading",
+        "politic", "election",
+        "hack", "exploit", "bypass", "malware", "ddos"
+    ]
+    return any(k in t for k in risky)
+
+
+def legacy_extract_confidence(text: str):
+    if not text:
+        return None
+    patterns = [
+        r'(\d{1,3})\s*/\s*100',
+        r'(\d{1,3})\s*%',
+        r'confidence\s*score\s*[:\-]?\s*(\d{1,3})',
+        r'confidence\s*[:\-]?\s*(\d{1,3})',
+        r'===\s*confidence\s*===\s*(\d{1,3})',
+    ]
+    for p in patterns:
+        m = re.search(p, text, re.IGNORECASE)
+        if m:
+            val = int(m.group(1))
+            if 0 <= val <= 100:
+                return val
+    return None
+
+
+# ---------- harness ----------
+
+def accuracy(fn, cases):
+    wrong = [(x, want, fn(x)) for x, want in cases if fn(x) != want]
+    return 1 - len(wrong) / len(cases), wrong
+
+
+def throughput(fn, inputs, iterations: int, repeat: int) -> float:
+    """Best of `repeat` runs, so a noisy machine does not decide the comparison."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(iterations):
+            fn(inputs[i % len(inputs)])
+        best = min(best, time.perf_counter() - start)
+    return iterations / best
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark /ask routing heuristics")
+    p.add_argument("--iterations", type=int, default=20000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--show-errors", action="store_true")
+    args = p.parse_args()
+
+    suites = [
+        ("is_followup", FOLLOWUP_CASES, legacy_is_followup, routing.is_followup),
+        ("needs_fact_check", FACT_CHECK_CASES, legacy_needs_fact_check, routing.needs_fact_check),
+        ("extract_confidence", CONFIDENCE_CASES, legacy_extract_confidence, routing.extract_confidence),
+    ]
+
+    print(f"{'function':<20} {'impl':<8} {'accuracy':>9} {'calls/s':>12}")
+    for name, cases, legacy, current in suites:
+        inputs = [x for x, _ in cases]
+        for impl, fn in (("legacy", legacy), ("routing", current)):
+            acc, wrong = accuracy(fn, cases)
+            rate = throughput(fn, inputs, args.iterations, args.repeat)
+            print(f"{name:<20} {impl:<8} {acc:>8.1%} {rate:>12,.0f}")
+            if args.show_errors:
+                for x, want, got in wrong:
+                    print(f"    expected {want!r:<6} got {got!r:<6} {x!r}")
+
+    ambiguous = [q for q, _ in FOLLOWUP_CASES if routing.classify_followup(q) == routing.AMBIGUOUS]
+    print(f"\n{len(ambiguous)} follow-up cases are ambiguous and go to the embedding tiebreaker:")
+    for q in ambiguous:
+        print(f"    {q!r}")
+
+
+if __name__ == "__main__":
+    main()
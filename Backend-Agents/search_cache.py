@@ -0,0 +1,195 @@
+"""
+Cache in front of the researcher's web search tool.
+
+A search is resolved by the first of:
+  1. the in-process LRU (SEARCH_CACHE_SIZE entries)
+  2. a search with the same arguments already running in another thread,
+     whose result is shared instead of issuing a second request
+  3. the Mongo "search_results" collection (SEARCH_CACHE_PERSIST=1), so
+     results survive restarts and are shared between workers
+  4. the wrapped tool (Serper, or the fake in AI_BACKEND=fake)
+
+Results expire after SEARCH_CACHE_TTL seconds, or SEARCH_CACHE_FRESH_TTL
+for queries about things that change quickly (news, prices, "latest", a
+year). Failed searches are never cached. CrewAI's own tool cache is kept
+off for this tool: it lives as long as a pooled crew and knows no TTL.
+
+CrewAI runs tools in its worker threads, so this module is synchronous.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+from db import search_results_collection
+from metrics import SEARCH_RESULT_BYTES, observe
+from ttl_cache import TTLCache
+
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "5000"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "86400"))
+SEARCH_CACHE_FRESH_TTL = float(os.getenv("SEARCH_CACHE_FRESH_TTL", "1800"))
+SEARCH_CACHE_PERSIST = os.getenv("SEARCH_CACHE_PERSIST", "1") == "1"
+
+_FRESH = re.compile(
+    r"\b(?:latest|newest|recent|today|tonight|yesterday|tomorrow"
+    r"|this\s+(?:week|month|year)|news|breaking|price|prices|weather|scores?"
+    r"|(?:19|20)\d\d)\b",
+    re.IGNORECASE,
+)
+
+
+def ttl_for(query: str) -> float:
+    return SEARCH_CACHE_FRESH_TTL if _FRESH.search(query or "") else SEARCH_CACHE_TTL
+
+
+def search_key(arguments: dict) -> str:
+    """Same query (case and spacing aside) and options -> same key."""
+    args = dict(arguments)
+    args["search_query"] = " ".join(str(args.get("search_query", "")).lower().split())
+    raw = json.dumps(args, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _size(result) -> int:
+    text = result if isinstance(result, str) else json.dumps(result, default=str)
+    return len(text.encode())
+
+
+class SearchCache:
+    def __init__(self, max_entries: int = SEARCH_CACHE_SIZE, persist: bool = SEARCH_CACHE_PERSIST):
+        self.memory = TTLCache(max_entries, SEARCH_CACHE_TTL)
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.persisted_hits = 0
+        self.joined = 0
+        self.searches = 0
+        self.errors = 0
+
+    def get(self, arguments: dict, search):
+        """Cached result for these tool arguments, calling search() on a miss."""
+        key = search_key(arguments)
+        start = time.perf_counter()
+        result = self.memory.get(key)
+        if result is not None:
+            observe("search.memory", time.perf_counter() - start)
+            return result
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+        if not leader:
+            self.joined += 1
+            result = future.result()
+            observe("search.joined", time.perf_counter() - start)
+            return result
+
+        try:
+            result = self._load(key)
+            if result is None:
+                result = self._search(key, arguments, search)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def _load(self, key: str):
+        if not self.persist:
+            return None
+        start = time.perf_counter()
+        try:
+            doc = search_results_collection.find_one({"_id": key}, {"result": 1, "expireAt": 1})
+        except Exception as e:
+            print("❌ search cache read failed:", e)
+            return None
+        observe("search.mongo", time.perf_counter() - start)
+        # The TTL monitor only runs once a minute, so check expiry here too
+        if not doc or doc["expireAt"] <= datetime.utcnow():
+            return None
+        self.persisted_hits += 1
+        remaining = (doc["expireAt"] - datetime.utcnow()).total_seconds()
+        self.memory.put(key, doc["result"], ttl=remaining)
+        return doc["result"]
+
+    def _search(self, key: str, arguments: dict, search):
+        self.searches += 1
+        start = time.perf_counter()
+        try:
+            result = search()
+        except Exception:
+            self.errors += 1
+            raise
+        observe("search.live", time.perf_counter() - start)
+        SEARCH_RESULT_BYTES.observe(_size(result))
+
+        ttl = ttl_for(str(arguments.get("search_query", "")))
+        self.memory.put(key, result, ttl=ttl)
+        if self.persist:
+            now = datetime.utcnow()
+            try:
+                search_results_collection.replace_one(
+                    {"_id": key},
+                    {
+                        "query": arguments.get("search_query"),
+                        "result": result,
+                        "createdAt": now,
+                        "expireAt": now + timedelta(seconds=ttl),
+                    },
+                    upsert=True,
+                )
+            except Exception as e:
+                # The answer does not depend on the cache write
+                print("❌ search cache write failed:", e)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            **self.memory.stats(),
+            "persisted_hits": self.persisted_hits,
+            "joined": self.joined,
+            "searches": self.searches,
+            "errors": self.errors,
+        }
+
+
+search_cache = SearchCache()
+
+
+def _never_cache(_args=None, _result=None) -> bool:
+    return False
+
+
+def cached_search_tool(tool):
+    """
+    CrewAI tool that answers from search_cache and presents the wrapped
+    tool's name, description and arguments, so agent prompts are unchanged.
+    """
+    # Imported here so agents.py can read the stats without loading CrewAI
+    try:
+        from crewai.tools import BaseTool
+    except ImportError:
+        from crewai_tools import BaseTool
+
+    class CachedSearchTool(BaseTool):
+        name: str
+        description: str
+
+        def _run(self, **kwargs):
+            return search_cache.get(kwargs, lambda: tool.run(**kwargs))
+
+    return CachedSearchTool(
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        cache_function=_never_cache,
+    )
@@ -0,0 +1,144 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2000"))
+# "user" keeps answers per userId. "global" shares them between all users,
+# but only answers built without RAG, history or non-default preferences
+# are published there (see agents._finish).
+ANSWER_CACHE_SCOPE = os.getenv("ANSWER_CACHE_SCOPE", "user")
+
+# Researcher (task1) output is shared across users; it only holds web facts
+RESEARCH_CACHE_THRESHOLD = float(os.getenv("RESEARCH_CACHE_THRESHOLD", "0.90"))
+RESEARCH_CACHE_TTL = float(os.getenv("RESEARCH_CACHE_TTL", "21600"))
+RESEARCH_CACHE_SIZE = int(os.getenv("RESEARCH_CACHE_SIZE", "5000"))
+
+GLOBAL_SCOPE = "*"
+
+
+def normalize_topic(topic: str) -> str:
+    t = re.sub(r"\s+", " ", (topic or "").lower()).strip()
+    return t.rstrip("?!. ")
+
+
+class SemanticCache:
+    """LRU + TTL cache looked up by embedding similarity instead of exact keys."""
+
+    def __init__(self, threshold, ttl, max_entries, scope="global"):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.scope = scope
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._scopes = {}
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _scope_key(self, user_id):
+        return str(user_id) if self.scope == "user" else GLOBAL_SCOPE
+
+    def _drop(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        bucket = self._scopes[entry["scope"]]
+        bucket["ids"].remove(entry_id)
+        bucket["matrix"] = None
+        if not bucket["ids"]:
+            del self._scopes[entry["scope"]]
+
+    def get(self, user_id, embedding):
+        """Return the best cached value above the threshold, or None."""
+        q = np.asarray(embedding, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self._scopes.get(self._scope_key(user_id))
+            if bucket is None:
+                self.misses += 1
+                return None
+
+            if bucket["matrix"] is None:
+                bucket["matrix"] = np.stack([self._entries[i]["vec"] for i in bucket["ids"]])
+            scores = bucket["matrix"] @ q
+            order = np.argsort(scores)[::-1]
+
+            ids = list(bucket["ids"])
+            for pos in order:
+                if scores[pos] < self.threshold:
+                    break
+                entry_id = ids[pos]
+                entry = self._entries[entry_id]
+                if entry["expires"] <= now:
+                    self._drop(entry_id)
+                    self.expirations += 1
+                    continue
+                self._entries.move_to_end(entry_id)
+                self.hits += 1
+                return entry["value"]
+
+            self.misses += 1
+            return None
+
+    def put(self, user_id, embedding, value):
+        v = np.asarray(embedding, dtype=np.float32)
+        v = v / (np.linalg.norm(v) or 1.0)
+        scope = self._scope_key(user_id)
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "scope": scope,
+                "vec": v,
+                "value": value,
+                "expires": time.monotonic() + self.ttl,
+            }
+            bucket = self._scopes.setdefault(scope, {"ids": [], "matrix": None})
+            bucket["ids"].append(entry_id)
+            bucket["matrix"] = None
+
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+answer_cache = SemanticCache(
+    threshold=ANSWER_CACHE_THRESHOLD,
+    ttl=ANSWER_CACHE_TTL,
+    max_entries=ANSWER_CACHE_SIZE,
+    scope=ANSWER_CACHE_SCOPE,
+)
+
+research_cache = SemanticCache(
+    threshold=RESEARCH_CACHE_THRESHOLD,
+    ttl=RESEARCH_CACHE_TTL,
+    max_entries=RESEARCH_CACHE_SIZE,
+    scope="global",
+)
@@ -1,27 +1,39 @@
 from fastapi import HTTPException
 import uuid
 from datetime import datetime
-from db import users_collection, chats_collection
-import bcrypt
+from pymongo.errors import DuplicateKeyError
+from db import async_users_collection, unique_email_index_ready
 from fastapi import APIRouter
 from models import SignupRequest
+from metrics import stage
+from auth import hash_password, user_cache
 signup_router  = APIRouter()
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-
 
 @signup_router.post("/register")
-def register(req : SignupRequest):
-    if users_collection.find_one({"email": req.email}):
-        raise HTTPException(status_code=400, detail="Email already exists")
+async def register(req : SignupRequest):
+    with stage("auth.bcrypt"):
+        hashed = await hash_password(req.password)
 
     user = {
         "userId": str(uuid.uuid4()),
         "email": req.email,
-        "password": hash_password(req.password),
+        "password": hashed,
         "createdAt": datetime.utcnow()
     }
 
-    users_collection.insert_one(user)
+    # The unique index on email (db.ensure_indexes) rejects duplicates without
+    # a racy existence check; until it is confirmed to exist, check anyway
+    if not await unique_email_index_ready():
+        with stage("auth.user_lookup"):
+            if await async_users_collection.find_one({"email": req.email}, {"_id": 1}):
+                raise HTTPException(status_code=400, detail="Email already exists")
+
+    try:
+        with stage("auth.user_insert"):
+            await async_users_collection.insert_one(user)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already exists")
+
+    user_cache.pop(req.email)
     return {"message": "User registered successfully"}
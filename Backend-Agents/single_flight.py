@@ -0,0 +1,105 @@
+"""
+Single-flight coalescing of concurrent identical work.
+
+The first caller for a topic leads and runs the work. Callers that arrive
+while it is in flight, with the same normalized topic or one whose
+embedding is within COALESCE_THRESHOLD cosine similarity, await the
+leader's result instead of starting their own run. Nothing is kept after
+the run ends; finished results belong to the semantic caches.
+"""
+import asyncio
+import os
+
+import numpy as np
+
+from metrics import annotate
+
+COALESCE_THRESHOLD = float(os.getenv("COALESCE_THRESHOLD", "0.95"))
+
+
+class _Flight:
+    __slots__ = ("key", "vec", "future")
+
+    def __init__(self, key, vec, future):
+        self.key = key
+        self.vec = vec
+        self.future = future
+
+
+def _unit(embedding):
+    v = np.asarray(embedding, dtype=np.float32)
+    return v / (np.linalg.norm(v) or 1.0)
+
+
+def _consume(future):
+    # Mark a leader failure as seen when nobody was waiting on it
+    if not future.cancelled():
+        future.exception()
+
+
+class SingleFlight:
+    def __init__(self, name: str, threshold: float = COALESCE_THRESHOLD):
+        self.name = name
+        self.threshold = threshold
+        self._flights = {}
+        self.led = 0
+        self.joined = 0
+
+    def _find(self, group, key, vec):
+        flights = self._flights.get(group, ())
+        for f in flights:
+            if f.key == key:
+                return f
+        best, best_score = None, self.threshold
+        for f in flights:
+            score = float(np.dot(f.vec, vec))
+            if score >= best_score:
+                best, best_score = f, score
+        return best
+
+    async def do(self, group, key: str, embedding, fn):
+        """
+        Return fn()'s result, sharing one call among concurrent callers in
+        the same `group` whose key or embedding matches.
+        """
+        vec = _unit(embedding)
+        flight = self._find(group, key, vec)
+        if flight is not None:
+            self.joined += 1
+            annotate(**{f"{self.name}_coalesced": True})
+            try:
+                # shield: a follower going away must not cancel the leader
+                return await asyncio.shield(flight.future)
+            except asyncio.CancelledError:
+                if not flight.future.cancelled():
+                    raise
+                # The leader's request was cancelled; do the work ourselves
+                return await self.do(group, key, embedding, fn)
+
+        flight = _Flight(key, vec, asyncio.get_running_loop().create_future())
+        flight.future.add_done_callback(_consume)
+        self._flights.setdefault(group, []).append(flight)
+        self.led += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            flight.future.cancel()
+            raise
+        except Exception as e:
+            flight.future.set_exception(e)
+            raise
+        else:
+            flight.future.set_result(result)
+            return result
+        finally:
+            flights = self._flights[group]
+            flights.remove(flight)
+            if not flights:
+                del self._flights[group]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": sum(len(f) for f in self._flights.values()),
+            "led": self.led,
+            "joined": self.joined,
+        }
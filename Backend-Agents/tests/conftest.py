@@ -0,0 +1,5 @@
+import os
+
+# Offline stand-ins and the in-memory database, before any app module is imported
+os.environ.setdefault("AI_BACKEND", "fake")
+os.environ.setdefault("MONGO_URI", "mongomock://")
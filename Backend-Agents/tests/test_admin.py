@@ -0,0 +1,50 @@
+from datetime import datetime
+
+import pytest
+
+from admin import get_blocked_queries, get_stats
+from chat_stats import rollup_ops
+from db import chats_collection, chat_rollups_collection, users_collection
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    for collection in (users_collection, chats_collection, chat_rollups_collection):
+        collection.delete_many({})
+    yield
+
+
+def _store(user_id, verdict, query, created_at):
+    doc = {"userId": user_id, "verdict": verdict, "query": query, "createdAt": created_at}
+    chats_collection.insert_one(dict(doc))
+    chat_rollups_collection.bulk_write(rollup_ops(doc))
+
+
+def test_blocked_queries_join_user_emails():
+    users_collection.insert_one({"userId": "u1", "email": "a@example.com", "password": "hash"})
+    _store("u1", "BLOCKED", "first", datetime(2024, 5, 1, 9))
+    _store("ghost", "BLOCKED", "second", datetime(2024, 5, 1, 10))
+    _store("u1", "ALLOWED", "fine", datetime(2024, 5, 1, 11))
+
+    rows = get_blocked_queries(limit=100, skip=0, start=None, end=None)
+
+    assert rows == [
+        {"email": "Unknown", "query": "second", "createdAt": datetime(2024, 5, 1, 10)},
+        {"email": "a@example.com", "query": "first", "createdAt": datetime(2024, 5, 1, 9)},
+    ]
+
+
+def test_stats_read_rollups_and_join_user_emails():
+    users_collection.insert_one({"userId": "u1", "email": "a@example.com", "password": "hash"})
+    _store("u1", "ALLOWED", "a", datetime(2024, 5, 1, 9))
+    _store("u1", "BLOCKED", "b", datetime(2024, 5, 2, 9))
+    _store("u2", "ALLOWED", "c", datetime(2024, 5, 2, 10))
+
+    stats = get_stats(start=None, end=None, top_users=20)
+
+    assert stats["totals"] == {"ALLOWED": 2, "BLOCKED": 1, "ERROR": 0}
+    assert [d["day"] for d in stats["per_day"]] == ["2024-05-01", "2024-05-02"]
+    assert stats["per_user"][0] == {
+        "userId": "u1", "email": "a@example.com", "total": 2, "ALLOWED": 1, "BLOCKED": 1, "ERROR": 0,
+    }
+    assert stats["per_user"][1]["email"] == "Unknown"
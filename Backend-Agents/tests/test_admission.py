@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+import admission as admission_module
+from admission import AdmissionController, Rejected, is_rate_limit
+
+
+def test_user_burst_then_429(monkeypatch):
+    monkeypatch.setattr(admission_module, "ASK_USER_BURST", 2)
+    monkeypatch.setattr(admission_module, "ASK_USER_RATE", 0.001)
+
+    async def main():
+        controller = AdmissionController(max_concurrency=4)
+        for _ in range(2):
+            await controller.acquire("u1")
+            controller.release()
+        with pytest.raises(Rejected) as e:
+            await controller.acquire("u1")
+        assert e.value.status == 429
+        # Other users have their own bucket
+        await controller.acquire("u2")
+        controller.release()
+
+    asyncio.run(main())
+
+
+def test_queue_full_is_503():
+    async def main():
+        controller = AdmissionController(max_concurrency=1, queue_max=0)
+        await controller.acquire("a")
+        with pytest.raises(Rejected) as e:
+            await controller.acquire("b")
+        assert e.value.status == 503
+        controller.release()
+
+    asyncio.run(main())
+
+
+def test_tiers_follow_load():
+    controller = AdmissionController(max_concurrency=4)
+    assert controller.tier() == "full"
+    controller.active = 3
+    assert controller.tier() == "no_fact_check"
+    controller.waiting = 3
+    assert controller.tier() == "lite"
+    controller.active = controller.waiting = 0
+    controller.note_rate_limit()
+    assert controller.tier() == "lite"
+
+
+def test_waiting_request_gets_freed_slot():
+    async def main():
+        controller = AdmissionController(max_concurrency=1, queue_max=4)
+        await controller.acquire("a")
+        waiter = asyncio.create_task(controller.acquire("b"))
+        await asyncio.sleep(0.01)
+        assert controller.waiting == 1
+        controller.release()
+        assert await waiter in ("full", "no_fact_check", "lite")
+        controller.release()
+
+    asyncio.run(main())
+
+
+def test_is_rate_limit():
+    class ResourceExhausted(Exception):
+        pass
+
+    class APIError(Exception):
+        def __init__(self, code):
+            super().__init__(f"{code} error")
+            self.code = code
+
+    assert is_rate_limit(ResourceExhausted("quota"))
+    assert is_rate_limit(APIError(429))
+    wrapped = RuntimeError("generation failed")
+    wrapped.__cause__ = APIError(429)
+    assert is_rate_limit(wrapped)
+
+    assert not is_rate_limit(APIError(400))
+    assert not is_rate_limit(ValueError("bad request"))
+    # Message text alone is never enough
+    assert not is_rate_limit(Exception("429 RESOURCE_EXHAUSTED: quota"))
+    assert not is_rate_limit(ValueError("prompt used 4291 tokens"))
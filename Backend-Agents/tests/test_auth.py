@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import auth
+import db
+from db import ensure_indexes, users_collection
+from login import login_router
+from signup import signup_router
+
+app = FastAPI()
+app.include_router(login_router)
+app.include_router(signup_router)
+client = TestClient(app)
+
+CREDENTIALS = {"email": "ada@example.com", "password": "correct horse"}
+
+
+@pytest.fixture(autouse=True)
+def clean_users(monkeypatch):
+    # The cheapest bcrypt cost keeps the tests fast
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 4)
+    monkeypatch.setattr(db, "_unique_email_confirmed", False)
+    users_collection.drop()
+    auth.user_cache.clear()
+    yield
+    users_collection.drop()
+    auth.user_cache.clear()
+
+
+def _cost(email):
+    return int(users_collection.find_one({"email": email})["password"].split("$")[2])
+
+
+def test_register_then_login():
+    assert client.post("/register", json=CREDENTIALS).status_code == 200
+    r = client.post("/login", json=CREDENTIALS)
+    assert r.status_code == 200 and r.json()["email"] == CREDENTIALS["email"]
+    assert client.post("/login", json={**CREDENTIALS, "password": "wrong"}).status_code == 401
+    assert client.post("/login", json={**CREDENTIALS, "email": "nobody@example.com"}).status_code == 401
+
+
+def test_login_upgrades_hashes_below_the_current_cost(monkeypatch):
+    client.post("/register", json=CREDENTIALS)
+    assert _cost(CREDENTIALS["email"]) == 4
+
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 5)
+    assert client.post("/login", json=CREDENTIALS).status_code == 200
+    assert _cost(CREDENTIALS["email"]) == 5
+    # The cached user carries the new hash, and the password still works
+    assert auth.user_cache.get(CREDENTIALS["email"])["password"].startswith("$2b$05$")
+    assert client.post("/login", json=CREDENTIALS).status_code == 200
+
+
+def test_rehash_does_not_overwrite_a_changed_password(monkeypatch):
+    client.post("/register", json=CREDENTIALS)
+    user = users_collection.find_one({"email": CREDENTIALS["email"]}, auth.USER_PROJECTION)
+    users_collection.update_one({"userId": user["userId"]}, {"$set": {"password": "changed"}})
+
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 5)
+    asyncio.run(auth.rehash(user, CREDENTIALS["password"]))
+    assert users_collection.find_one({"userId": user["userId"]})["password"] == "changed"
+
+
+def test_duplicate_email_without_the_unique_index():
+    assert client.post("/register", json=CREDENTIALS).status_code == 200
+    r = client.post("/register", json=CREDENTIALS)
+    assert r.status_code == 400 and r.json()["detail"] == "Email already exists"
+    assert users_collection.count_documents({"email": CREDENTIALS["email"]}) == 1
+    assert db._unique_email_confirmed is False
+
+
+def test_duplicate_email_rejected_by_the_unique_index():
+    asyncio.run(ensure_indexes())
+    assert client.post("/register", json=CREDENTIALS).status_code == 200
+    r = client.post("/register", json=CREDENTIALS)
+    assert r.status_code == 400 and r.json()["detail"] == "Email already exists"
+    assert users_collection.count_documents({"email": CREDENTIALS["email"]}) == 1
+    assert db._unique_email_confirmed is True
@@ -0,0 +1,109 @@
+import asyncio
+
+import numpy as np
+
+import chat_writer as chat_writer_module
+from chat_writer import ChatWriter
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts):
+        self.calls.append(list(texts))
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+class RecordingCollection:
+    def __init__(self):
+        self.inserts = []
+        self.bulk_writes = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.inserts.append(list(docs))
+
+    async def bulk_write(self, ops, ordered=True):
+        self.bulk_writes.append(list(ops))
+
+
+def test_queued_chats_share_one_embed_and_insert(monkeypatch):
+    chats, rollups = RecordingCollection(), RecordingCollection()
+    monkeypatch.setattr(chat_writer_module, "async_chats_collection", chats)
+    monkeypatch.setattr(chat_writer_module, "async_chat_rollups_collection", rollups)
+    monkeypatch.setattr(chat_writer_module.vector_index, "add_chat", lambda user_id, doc: None)
+
+    embedder = CountingEmbedder()
+    stored = []
+
+    async def main():
+        writer = ChatWriter(embedder, batch_size=16)
+        for i in range(5):
+            await writer.submit(
+                user_id="u", query=f"q{i}", verdict="ALLOWED", response=f"a{i}",
+                embed_text=f"a{i}", on_stored=stored.append,
+            )
+        await writer.submit(user_id="u", query="bad", verdict="ERROR")
+        await writer.flush()
+        await writer.close()
+        return writer.stats()
+
+    stats = asyncio.run(main())
+    assert len(chats.inserts) == 1 and len(chats.inserts[0]) == 6
+    assert embedder.calls == [[f"a{i}" for i in range(5)]]
+    assert len(rollups.bulk_writes) == 1
+    assert stored == [[1.0] * 4] * 5
+    assert stats["written"] == 6 and stats["batches"] == 1
+    # createdAt is fixed at submit time and ERROR chats expire
+    assert "expireAt" in chats.inserts[0][-1]
+
+
+def test_failed_batch_is_counted_not_raised(monkeypatch):
+    class Broken(RecordingCollection):
+        async def insert_many(self, docs, ordered=True):
+            raise RuntimeError("down")
+
+    monkeypatch.setattr(chat_writer_module, "async_chats_collection", Broken())
+    monkeypatch.setattr(chat_writer_module, "async_chat_rollups_collection", RecordingCollection())
+
+    async def main():
+        writer = ChatWriter(None)
+        await writer.submit(user_id="u", query="q", verdict="BLOCKED")
+        await writer.flush()
+        await writer.close()
+        return writer.stats()
+
+    assert asyncio.run(main())["failed"] == 1
+
+
+def test_failed_rollups_are_not_retried_and_keep_the_chats(monkeypatch):
+    from pymongo.errors import AutoReconnect
+
+    class Flaky(RecordingCollection):
+        async def bulk_write(self, ops, ordered=True):
+            await super().bulk_write(ops, ordered)
+            raise AutoReconnect("lost the acknowledgement")
+
+    chats, rollups = RecordingCollection(), Flaky()
+    monkeypatch.setattr(chat_writer_module, "async_chats_collection", chats)
+    monkeypatch.setattr(chat_writer_module, "async_chat_rollups_collection", rollups)
+    added = []
+    monkeypatch.setattr(chat_writer_module.vector_index, "add_chat", lambda user_id, doc: added.append(doc))
+
+    stored = []
+
+    async def main():
+        writer = ChatWriter(None)
+        await writer.submit(
+            user_id="u", query="q", verdict="ALLOWED", response="a",
+            embedding=[0.5] * 4, on_stored=stored.append,
+        )
+        await writer.flush()
+        await writer.close()
+        return writer.stats()
+
+    stats = asyncio.run(main())
+    assert len(rollups.bulk_writes) == 1
+    assert stats["written"] == 1 and stats["failed"] == 0 and stats["rollups_failed"] == 1
+    assert stats["retries"] == 0
+    assert len(added) == 1 and stored == [[0.5] * 4]
@@ -0,0 +1,79 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from chathistory import history_router
+from db import chats_collection
+
+app = FastAPI()
+app.include_router(history_router)
+client = TestClient(app)
+
+T0 = datetime(2024, 5, 1, 12)
+
+
+@pytest.fixture(autouse=True)
+def chats():
+    """Chats q0..q6 of user u1, newest last; q3, q4 and q5 share a timestamp."""
+    chats_collection.delete_many({})
+    times = [T0, T0 + timedelta(seconds=1), T0 + timedelta(seconds=2)] + [T0 + timedelta(seconds=3)] * 3
+    times.append(T0 + timedelta(seconds=4))
+    chats_collection.insert_many([
+        {"_id": ObjectId(), "userId": "u1", "query": f"q{i}", "verdict": "ALLOWED",
+         "response": f"a{i}", "createdAt": t, "embedding": [0.1, 0.2]}
+        for i, t in enumerate(times)
+    ])
+    chats_collection.insert_one({"userId": "u2", "query": "other", "verdict": "ALLOWED", "createdAt": T0})
+    yield
+    chats_collection.delete_many({})
+
+
+def _pages(limit):
+    pages, before = [], None
+    while True:
+        params = {"limit": limit}
+        if before:
+            params["before"] = before
+        r = client.get("/chats/u1", params=params)
+        assert r.status_code == 200
+        pages.append([c["query"] for c in r.json()])
+        before = r.headers.get("X-Next-Cursor")
+        if before is None:
+            return pages
+
+
+def test_pages_walk_every_chat_once_newest_first():
+    # q3-q5 share createdAt and straddle the page boundaries; _id keeps them apart
+    assert _pages(2) == [["q6", "q5"], ["q4", "q3"], ["q2", "q1"], ["q0"]]
+    assert _pages(3) == [["q6", "q5", "q4"], ["q3", "q2", "q1"], ["q0"]]
+
+
+def test_exact_last_page_ends_with_an_empty_page():
+    assert _pages(7) == [[f"q{i}" for i in range(6, -1, -1)], []]
+
+
+def test_pages_hide_ids_and_embeddings():
+    chat = client.get("/chats/u1", params={"limit": 1}).json()[0]
+    assert "_id" not in chat and "embedding" not in chat
+    assert chat["query"] == "q6"
+
+
+@pytest.mark.parametrize("before", ["garbage", "2024-05-01T12:00:00_notanid", f"notadate_{ObjectId()}"])
+def test_malformed_cursor_is_a_400(before):
+    r = client.get("/chats/u1", params={"before": before})
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Invalid cursor"
+
+
+def test_export_streams_all_chats_as_ndjson():
+    r = client.get("/chats/u1/export")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    assert 'filename="chats-u1.ndjson"' in r.headers["content-disposition"]
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert len(rows) == 7 and rows[0]["query"] == "q6"
+    assert all("embedding" not in row and "_id" not in row for row in rows)
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from context_builder import (
+    KEEP_RECENT_TURNS, MAX_TURN_TOKENS, build_context, build_history_text, estimate_tokens,
+)
+
+
+def turn(role, content):
+    return SimpleNamespace(role=role, content=content)
+
+
+def conversation(n, words=40):
+    """n alternating user/ai turns of `words` words each, numbered from 0."""
+    return [
+        turn("user" if i % 2 == 0 else "ai", f"turn {i}. " + " ".join(f"w{i}x{j}" for j in range(words)))
+        for i in range(n)
+    ]
+
+
+def doc(query, response, days_old=0):
+    return {"query": query, "response": response, "createdAt": datetime.utcnow() - timedelta(days=days_old)}
+
+
+@pytest.mark.parametrize("budget", [300, 800, 1800])
+def test_context_stays_within_budget(budget):
+    history = conversation(30)
+    scored = [(0.9 - i / 100, doc(f"past question {i}", "past answer " * 60)) for i in range(10)]
+
+    rag_text, history_text = build_context("u-budget", "w29x1 topic", history, scored, budget=budget)
+
+    assert history_text
+    assert estimate_tokens(rag_text) + estimate_tokens(history_text) <= budget
+
+
+def test_newest_turns_are_kept_verbatim_and_in_order():
+    history = conversation(20)
+    text = build_history_text("u-recent", "unrelated topic", history, budget=400)
+
+    lines = text.splitlines()
+    recent = [f"{t.role.upper()}: {t.content}" for t in history[-KEEP_RECENT_TURNS:]]
+    assert lines[-KEEP_RECENT_TURNS:] == recent
+    # Older turns that did not fit are summarised ahead of the verbatim turns
+    assert lines[0] == "SUMMARY OF EARLIER TURNS:"
+    assert lines[1] == "- User asked: turn 0."
+    assert "USER: turn 0." not in text
+
+
+def test_kept_turns_keep_conversation_order():
+    history = conversation(12, words=10)
+    text = build_history_text("u-order", "w3x1 w3x2 w3x3", history, budget=150)
+
+    verbatim = [
+        int(l.split("turn ", 1)[1].split(".", 1)[0])
+        for l in text.splitlines() if l.startswith(("USER: ", "AI: "))
+    ]
+    assert verbatim == sorted(verbatim)
+    assert verbatim[-KEEP_RECENT_TURNS:] == list(range(12 - KEEP_RECENT_TURNS, 12))
+    # The turn matching the topic is kept verbatim ahead of more recent ones
+    assert 3 in verbatim and 4 not in verbatim
+
+
+def test_long_turns_are_truncated():
+    history = [turn("user", "word " * 2000), turn("ai", "short answer")]
+    text = build_history_text("u-long", "topic", history, budget=1800)
+    first = text.splitlines()[0]
+    assert first.endswith(" …")
+    assert estimate_tokens(first) <= MAX_TURN_TOKENS + 1
+
+
+def test_rag_skips_memories_already_in_the_history():
+    history = [turn("user", "What is Raft?"), turn("ai", "Raft is a consensus algorithm.")]
+    scored = [
+        (0.95, doc("what is raft?", "Raft is a consensus algorithm.")),
+        (0.80, doc("what is paxos", "Paxos is another consensus algorithm.")),
+    ]
+    rag_text, _ = build_context("u-rag", "raft vs paxos", history, scored)
+    assert "paxos" in rag_text and "Past Q: what is raft?" not in rag_text
+
+
+def test_rag_prefers_recent_memories_at_equal_similarity():
+    scored = [
+        (0.8, doc("old question", "old answer", days_old=120)),
+        (0.8, doc("new question", "new answer", days_old=0)),
+    ]
+    rag_text, _ = build_context("u-age", "question", [], scored)
+    assert rag_text.index("new question") < rag_text.index("old question")
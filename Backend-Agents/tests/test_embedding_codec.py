@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from bson import BSON
+
+from db import chats_collection
+from embedding_codec import decode_embedding, encode_embedding, is_packed
+from migrate_embeddings import migrate
+
+
+def _vector(dim=384, seed=0):
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+
+
+def test_float32_round_trip_is_exact():
+    v = _vector()
+    packed = encode_embedding(v, "float32")
+    assert is_packed(packed) and len(packed) == 4 * v.size
+    assert np.array_equal(decode_embedding(packed), v)
+
+
+def test_int8_round_trip_stays_within_half_a_step():
+    v = _vector()
+    packed = encode_embedding(v, "int8")
+    assert is_packed(packed) and len(packed) == 4 + v.size
+
+    decoded = decode_embedding(packed)
+    step = np.abs(v).max() / 127
+    assert decoded.dtype == np.float32
+    assert np.abs(decoded - v).max() <= step / 2 + 1e-6
+    cos = decoded @ v / (np.linalg.norm(decoded) * np.linalg.norm(v))
+    assert cos > 0.999
+
+
+def test_int8_zero_vector():
+    assert np.array_equal(decode_embedding(encode_embedding([0.0] * 8, "int8")), np.zeros(8))
+
+
+def test_packed_embeddings_survive_bson():
+    v = _vector(16)
+    for fmt in ("float32", "int8"):
+        doc = BSON.encode({"embedding": encode_embedding(v, fmt)}).decode()
+        assert is_packed(doc["embedding"])
+        assert np.allclose(decode_embedding(doc["embedding"]), v, atol=np.abs(v).max() / 127)
+
+
+def test_legacy_float_lists_decode_and_migrate():
+    legacy = [0.25, -0.5, 1.0]
+    assert not is_packed(legacy)
+    assert decode_embedding(legacy).tolist() == legacy
+    # migrate_embeddings.py packs the stored list as it is
+    assert decode_embedding(encode_embedding(legacy, "float32")).tolist() == legacy
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        encode_embedding([1.0], "float16")
+
+
+def test_migrate_packs_only_legacy_lists():
+    chats_collection.delete_many({})
+    chats_collection.insert_many([
+        {"_id": "legacy", "embedding": [0.25, -0.5, 1.0]},
+        {"_id": "packed", "embedding": encode_embedding([1.0, 2.0], "float32")},
+    ])
+
+    assert migrate("int8", batch_size=1, dry_run=True) == 1
+    assert migrate("int8", batch_size=1) == 1
+    assert migrate("int8", batch_size=1) == 0
+
+    migrated = chats_collection.find_one({"_id": "legacy"})["embedding"]
+    assert is_packed(migrated)
+    assert np.allclose(decode_embedding(migrated), [0.25, -0.5, 1.0], atol=1 / 127)
+    assert decode_embedding(chats_collection.find_one({"_id": "packed"})["embedding"]).tolist() == [1.0, 2.0]
+    chats_collection.delete_many({})
@@ -0,0 +1,38 @@
+import asyncio
+
+from llm_client import is_retryable
+
+
+class APIError(Exception):
+    def __init__(self, code, message=""):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class ServiceUnavailable(Exception):
+    pass
+
+
+def test_retryable_by_status_code():
+    assert is_retryable(APIError(503))
+    assert is_retryable(APIError(429))
+    assert not is_retryable(APIError(400, "prompt contains 500 words"))
+
+
+def test_message_text_is_not_matched():
+    assert not is_retryable(ValueError("max_output_tokens must be below 5000"))
+    assert not is_retryable(ValueError("UNAVAILABLE"))
+
+
+def test_retryable_by_type_or_wrapped_cause():
+    assert is_retryable(asyncio.TimeoutError())
+    assert is_retryable(ConnectionResetError())
+    assert is_retryable(ServiceUnavailable("try later"))
+
+    try:
+        try:
+            raise APIError(502)
+        except APIError as e:
+            raise RuntimeError("generation failed") from e
+    except RuntimeError as wrapped:
+        assert is_retryable(wrapped)
@@ -0,0 +1,67 @@
+import pytest
+
+from routing import (
+    AMBIGUOUS, FOLLOWUP, NEW_TOPIC,
+    classify_followup, extract_confidence, is_followup, needs_fact_check,
+)
+
+
+@pytest.mark.parametrize("query", [
+    "tell me more", "elaborate", "give an example", "why?", "what do you mean by that",
+    "and redis?", "explain it in simpler terms",
+])
+def test_followup_wording(query):
+    assert classify_followup(query) == FOLLOWUP
+
+
+@pytest.mark.parametrize("query", [
+    "how does git handle merge conflicts between branches",
+    "how do digital signatures work in tls handshakes",
+    "explain kafka consumer groups and partition rebalancing",
+    "how do continue statements work in python loops",
+    "what is the first step of the tls handshake",
+    "expand the hash map section of the docs please",
+])
+def test_new_topics(query):
+    assert classify_followup(query) == NEW_TOPIC
+
+
+@pytest.mark.parametrize("query", [
+    "continue", "please continue", "can you expand on the second point",
+    "keep going with the example", "what is the second part", "Tell me MORE!",
+])
+def test_commands_and_references_to_the_answer(query):
+    assert classify_followup(query) == FOLLOWUP
+
+
+def test_short_queries_without_followup_wording_are_ambiguous():
+    assert classify_followup("what is kubernetes") == AMBIGUOUS
+    assert not is_followup("what is kubernetes")
+    assert is_followup("what is kubernetes", similarity=0.9)
+
+
+def test_fact_check_uses_word_boundaries():
+    assert needs_fact_check("can my landlord break the lease contract early")
+    assert needs_fact_check("symptoms of vitamin d deficiency")
+    assert not needs_fact_check("how do i water my lawn efficiently")
+    assert not needs_fact_check("what is a stockade fence")
+
+
+def test_fact_check_skips_non_legal_laws_and_trading_cards():
+    assert needs_fact_check("what does employment law say about overtime")
+    assert needs_fact_check("is crypto trading taxed")
+    assert not needs_fact_check("what is the law of large numbers")
+    assert not needs_fact_check("explain Moore's law")
+    assert not needs_fact_check("what does a trading card game store sell")
+    assert not needs_fact_check("")
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("=== Explanation ===\nuptime is 99.9% and 40/100 nodes\n=== Confidence ===\n60", 60),
+    ("Claims verified.\nConfidence: 70", 70),
+    ("I am 75% sure", 75),
+    ("Confidence: 250", None),
+    ("", None),
+])
+def test_extract_confidence(text, expected):
+    assert extract_confidence(text) == expected
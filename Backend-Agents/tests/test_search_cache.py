@@ -0,0 +1,139 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import search_cache as search_cache_module
+import ttl_cache
+from db import search_results_collection
+from fakes import FakeSearchTool
+from search_cache import SearchCache, cached_search_tool, search_key, ttl_for
+
+
+@pytest.fixture(autouse=True)
+def clean_collection():
+    search_results_collection.delete_many({})
+    yield
+    search_results_collection.delete_many({})
+
+
+class CountingSearch:
+    def __init__(self, delay=0.0):
+        self.calls = 0
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            n = self.calls
+        time.sleep(self.delay)
+        return f"result {n}"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_keys_ignore_case_and_spacing_but_not_options():
+    assert search_key({"search_query": "Raft  Consensus"}) == search_key({"search_query": "raft consensus"})
+    assert search_key({"search_query": "raft", "n": 5}) != search_key({"search_query": "raft", "n": 10})
+
+
+def test_concurrent_identical_searches_share_one_call():
+    cache = SearchCache(persist=False)
+    search = CountingSearch(delay=0.1)
+    results = []
+
+    def worker():
+        results.append(cache.get({"search_query": "raft"}, search))
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert search.calls == 1
+    assert results == ["result 1"] * 5
+    assert cache.searches == 1 and cache.joined >= 1
+
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ttl_cache, "time", clock)
+    cache = SearchCache(persist=False)
+    search = CountingSearch()
+
+    assert ttl_for("latest kafka release") < ttl_for("how does kafka work")
+    cache.get({"search_query": "latest kafka release"}, search)
+    cache.get({"search_query": "how does kafka work"}, search)
+    assert search.calls == 2
+
+    clock.now += ttl_for("latest kafka release") + 1
+    cache.get({"search_query": "how does kafka work"}, search)
+    assert search.calls == 2
+    assert cache.get({"search_query": "latest kafka release"}, search) == "result 3"
+
+
+def test_failed_searches_are_not_cached():
+    cache = SearchCache(persist=False)
+
+    def broken():
+        raise RuntimeError("serper down")
+
+    with pytest.raises(RuntimeError):
+        cache.get({"search_query": "raft"}, broken)
+    assert cache.get({"search_query": "raft"}, CountingSearch()) == "result 1"
+    assert cache.errors == 1
+
+
+def test_results_are_shared_through_mongo():
+    search = CountingSearch()
+    SearchCache(persist=True).get({"search_query": "raft"}, search)
+
+    # A fresh process (empty memory) reads the stored result instead of searching
+    other = SearchCache(persist=True)
+    assert other.get({"search_query": "raft"}, search) == "result 1"
+    assert search.calls == 1 and other.persisted_hits == 1
+
+
+def test_expired_mongo_results_fall_through_to_a_search():
+    key = search_key({"search_query": "raft"})
+    search_results_collection.insert_one({
+        "_id": key,
+        "result": "stale",
+        "expireAt": datetime.utcnow() - timedelta(seconds=1),
+    })
+    cache = SearchCache(persist=True)
+    assert cache.get({"search_query": "raft"}, CountingSearch()) == "result 1"
+    assert search_results_collection.find_one({"_id": key})["result"] == "result 1"
+
+
+def test_mongo_read_errors_fall_through_to_a_search(monkeypatch):
+    class Down:
+        def find_one(self, *args, **kwargs):
+            raise ConnectionError("mongo down")
+
+        def replace_one(self, *args, **kwargs):
+            raise ConnectionError("mongo down")
+
+    monkeypatch.setattr(search_cache_module, "search_results_collection", Down())
+    cache = SearchCache(persist=True)
+    assert cache.get({"search_query": "raft"}, CountingSearch()) == "result 1"
+
+
+def test_wrapped_tool_answers_from_the_cache_and_disables_crewai_caching(monkeypatch):
+    monkeypatch.setattr(search_cache_module, "search_cache", SearchCache(persist=False))
+    tool = cached_search_tool(FakeSearchTool(latency_ms=0))
+
+    assert tool.name == FakeSearchTool().name
+    assert tool.run(search_query="raft") == tool.run(search_query="RAFT")
+    assert search_cache_module.search_cache.searches == 1
+    # CrewAI's tool cache has no TTL and would outlive search_cache entries
+    assert tool.cache_function({"search_query": "raft"}, "result") is False
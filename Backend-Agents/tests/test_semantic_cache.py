@@ -0,0 +1,48 @@
+import time
+
+from semantic_cache import SemanticCache, normalize_topic
+
+
+def test_hit_above_threshold_only():
+    cache = SemanticCache(threshold=0.9, ttl=60, max_entries=10)
+    cache.put("u1", [1.0, 0.0], "answer")
+    assert cache.get("u1", [0.99, 0.05]) == "answer"
+    assert cache.get("u1", [0.0, 1.0]) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_user_scope_keeps_users_apart():
+    cache = SemanticCache(threshold=0.9, ttl=60, max_entries=10, scope="user")
+    cache.put("u1", [1.0, 0.0], "mine")
+    assert cache.get("u2", [1.0, 0.0]) is None
+    assert cache.get("u1", [1.0, 0.0]) == "mine"
+
+
+def test_global_scope_shares_between_users():
+    cache = SemanticCache(threshold=0.9, ttl=60, max_entries=10, scope="global")
+    cache.put("u1", [1.0, 0.0], "shared")
+    assert cache.get("u2", [1.0, 0.0]) == "shared"
+
+
+def test_expired_entries_are_dropped():
+    cache = SemanticCache(threshold=0.9, ttl=0.01, max_entries=10)
+    cache.put("u1", [1.0, 0.0], "old")
+    time.sleep(0.02)
+    assert cache.get("u1", [1.0, 0.0]) is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticCache(threshold=0.99, ttl=60, max_entries=2)
+    cache.put("u", [1.0, 0.0, 0.0], "a")
+    cache.put("u", [0.0, 1.0, 0.0], "b")
+    assert cache.get("u", [1.0, 0.0, 0.0]) == "a"
+    cache.put("u", [0.0, 0.0, 1.0], "c")
+    assert cache.get("u", [0.0, 1.0, 0.0]) is None
+    assert cache.get("u", [1.0, 0.0, 0.0]) == "a"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_normalize_topic():
+    assert normalize_topic("  What IS   Raft?? ") == "what is raft"
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_identical_calls_share_one_run():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("g", "topic", [1.0, 0.0], work) for _ in range(5)))
+
+    assert run(main()) == ["result"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "led": 1, "joined": 4}
+
+
+def test_similar_embedding_joins_but_other_group_does_not():
+    flight = SingleFlight("test", threshold=0.95)
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def main():
+        return await asyncio.gather(
+            flight.do("g", "a", [1.0, 0.0], work),
+            flight.do("g", "b", [0.99, 0.01], work),
+            flight.do("other", "a", [1.0, 0.0], work),
+            flight.do("g", "c", [0.0, 1.0], work),
+        )
+
+    results = run(main())
+    assert results[0] == results[1]
+    assert len(calls) == 3
+
+
+def test_leader_failure_reaches_followers():
+    flight = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(
+            *(flight.do("g", "k", [1.0], work) for _ in range(3)), return_exceptions=True
+        )
+
+    results = run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_cancelled_leader_lets_follower_run_the_work():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        leader = asyncio.create_task(flight.do("g", "k", [1.0], work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("g", "k", [1.0], work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert run(main()) == "done"
+    assert len(calls) == 2
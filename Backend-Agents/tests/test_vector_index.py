@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+
+import vector_index
+from db import chats_collection
+
+
+def _chat(user_id, query, vec, created):
+    return {
+        "userId": user_id,
+        "query": query,
+        "response": "r",
+        "verdict": "ALLOWED",
+        "embedding": vec,
+        "createdAt": created,
+    }
+
+
+def test_loaded_index_picks_up_other_workers_chats(monkeypatch):
+    monkeypatch.setattr(vector_index, "REFRESH_INTERVAL", 30)
+    user_id = "vector-index-refresh"
+    now = datetime.utcnow()
+    chats_collection.insert_one(_chat(user_id, "first", [1.0, 0.0], now))
+
+    index = vector_index.get_index(user_id)
+    assert index.size == 1
+
+    # Stored by another worker, slightly out of order: only a refresh sees it
+    chats_collection.insert_one(_chat(user_id, "second", [0.0, 1.0], now - timedelta(seconds=5)))
+    assert vector_index.get_index(user_id).size == 1
+
+    index.refreshed_at -= 31
+    hits = vector_index.search(user_id, [0.0, 1.0], k=1)
+    assert [h["query"] for h in hits] == ["second"]
+    assert index.size == 2
+
+    # Refetching the overlap window does not duplicate rows
+    index.refreshed_at -= 31
+    assert vector_index.get_index(user_id).size == 2
+    vector_index.invalidate(user_id)
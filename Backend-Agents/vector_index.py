@@ -0,0 +1,232 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+from db import chats_collection, async_chats_collection
+from embedding_codec import decode_embedding
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+# Users with at least this many chats get an HNSW graph (if hnswlib is
+# installed); smaller histories stay on the flat matrix. 0 disables HNSW.
+HNSW_MIN_SIZE = int(os.getenv("RAG_HNSW_MIN_SIZE", "5000"))
+HNSW_EF = int(os.getenv("RAG_HNSW_EF", "64"))
+MAX_USERS = int(os.getenv("RAG_INDEX_MAX_USERS", "1000"))
+# Loaded indexes fetch chats stored by other workers at most this often
+# (seconds), re-reading REFRESH_OVERLAP seconds before the newest chat seen
+# so late-inserted batches are not missed. 0 disables refreshing.
+REFRESH_INTERVAL = float(os.getenv("RAG_INDEX_REFRESH", "30"))
+REFRESH_OVERLAP = float(os.getenv("RAG_INDEX_REFRESH_OVERLAP", "120"))
+
+
+def _normalize(vec) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32).ravel()
+    norm = np.linalg.norm(v)
+    return v / norm if norm > 0 else v
+
+
+class UserIndex:
+    """Embeddings of one user's ALLOWED chats, rows pre-normalized."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.vectors = None
+        self.size = 0
+        self.docs = []
+        self.ids = set()
+        self.hnsw = None
+        self.loaded = False
+        self.last_seen = None
+        self.refreshed_at = 0.0
+
+    def add(self, doc_id, vec, doc):
+        if doc_id is not None:
+            if doc_id in self.ids:
+                return
+            self.ids.add(doc_id)
+
+        v = _normalize(decode_embedding(vec))
+        if self.vectors is None:
+            self.vectors = np.empty((16, v.shape[0]), dtype=np.float32)
+        elif self.size == self.vectors.shape[0]:
+            grown = np.empty((self.size * 2, v.shape[0]), dtype=np.float32)
+            grown[:self.size] = self.vectors
+            self.vectors = grown
+
+        self.vectors[self.size] = v
+        self.docs.append(doc)
+        self.size += 1
+
+        if self.hnsw is not None:
+            if self.size > self.hnsw.get_max_elements():
+                self.hnsw.resize_index(self.size * 2)
+            self.hnsw.add_items(v[None, :], [self.size - 1])
+        elif hnswlib is not None and HNSW_MIN_SIZE and self.size >= HNSW_MIN_SIZE:
+            self._build_hnsw()
+
+    def _build_hnsw(self):
+        index = hnswlib.Index(space="ip", dim=self.vectors.shape[1])
+        index.init_index(max_elements=self.size * 2, ef_construction=200, M=16)
+        index.add_items(self.vectors[:self.size], np.arange(self.size))
+        index.set_ef(HNSW_EF)
+        self.hnsw = index
+
+    def search(self, q, k):
+        """[(cosine similarity, doc)] best first."""
+        if self.size == 0:
+            return []
+        k = min(k, self.size)
+
+        if self.hnsw is not None:
+            labels, distances = self.hnsw.knn_query(q[None, :], k=k)
+            return [(1.0 - float(d), self.docs[i]) for i, d in zip(labels[0], distances[0])]
+
+        scores = self.vectors[:self.size] @ q
+        if k < self.size:
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(self.size)
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(float(scores[i]), self.docs[i]) for i in top]
+
+
+_indexes = OrderedDict()
+_registry_lock = threading.Lock()
+
+
+def _rag_doc(d):
+    return {"query": d.get("query"), "response": d.get("response"), "createdAt": d.get("createdAt")}
+
+
+RAG_FILTER = {"embedding": {"$exists": True}, "verdict": "ALLOWED"}
+RAG_PROJECTION = {"query": 1, "response": 1, "embedding": 1, "createdAt": 1}
+
+
+def _query(user_id: str, index: UserIndex) -> dict:
+    """Filter for the chats a load (or refresh of a loaded index) must fetch."""
+    query = {"userId": user_id, **RAG_FILTER}
+    if index.loaded and index.last_seen is not None:
+        query["createdAt"] = {"$gte": index.last_seen - timedelta(seconds=REFRESH_OVERLAP)}
+    return query
+
+
+def _needs_fetch(index: UserIndex) -> bool:
+    if not index.loaded:
+        return True
+    return REFRESH_INTERVAL > 0 and time.monotonic() - index.refreshed_at >= REFRESH_INTERVAL
+
+
+def _merge(index: UserIndex, docs):
+    """Add fetched rows; caller holds index.lock."""
+    for d in docs:
+        index.add(d["_id"], d["embedding"], _rag_doc(d))
+        created = d.get("createdAt")
+        if created is not None and (index.last_seen is None or created > index.last_seen):
+            index.last_seen = created
+    index.loaded = True
+    index.refreshed_at = time.monotonic()
+
+
+def _load(user_id: str, index: UserIndex):
+    _merge(index, chats_collection.find(_query(user_id, index), RAG_PROJECTION))
+
+
+def _register(user_id: str) -> UserIndex:
+    with _registry_lock:
+        index = _indexes.get(user_id)
+        if index is not None:
+            _indexes.move_to_end(user_id)
+        else:
+            index = UserIndex()
+            _indexes[user_id] = index
+            while len(_indexes) > MAX_USERS:
+                _indexes.popitem(last=False)
+    return index
+
+
+def get_index(user_id) -> UserIndex:
+    """Return the user's index, loading it from Mongo on first use and
+    fetching newer chats every REFRESH_INTERVAL seconds after that."""
+    user_id = str(user_id)
+    index = _register(user_id)
+    with index.lock:
+        if _needs_fetch(index):
+            if not index.loaded:
+                _load(user_id, index)
+            else:
+                try:
+                    _load(user_id, index)
+                except Exception as e:
+                    # Serve the rows already loaded; retry on the next interval
+                    index.refreshed_at = time.monotonic()
+                    print("❌ RAG index refresh failed for", user_id, e)
+    return index
+
+
+async def load_async(user_id) -> UserIndex:
+    """Async variant of get_index that fetches through the Motor client.
+
+    The fetch runs without holding the index lock; rows are deduplicated by
+    _id, so racing loads, refreshes or concurrent store_chat calls are harmless.
+    """
+    user_id = str(user_id)
+    index = _register(user_id)
+    if not _needs_fetch(index):
+        return index
+
+    # Claim the refresh so concurrent requests keep using the current rows
+    was_loaded = index.loaded
+    index.refreshed_at = time.monotonic()
+    cursor = async_chats_collection.find(_query(user_id, index), RAG_PROJECTION)
+    try:
+        docs = await cursor.to_list(length=None)
+    except Exception:
+        if not was_loaded:
+            index.refreshed_at = 0.0
+            raise
+        # Serve the rows already loaded; retry on the next interval
+        print("❌ RAG index refresh failed for", user_id)
+        return index
+    with index.lock:
+        _merge(index, docs)
+    return index
+
+
+def add_chat(user_id, doc):
+    """Append a freshly stored chat to the user's index if it is loaded.
+
+    Unloaded users pick the chat up from Mongo on their next lookup. This
+    does not advance last_seen: chats other workers stored before this one
+    must still be fetched by the next refresh.
+    """
+    if doc.get("verdict") != "ALLOWED" or doc.get("embedding") is None:
+        return
+    with _registry_lock:
+        index = _indexes.get(str(user_id))
+    if index is None:
+        return
+    with index.lock:
+        index.add(doc.get("_id"), doc["embedding"], _rag_doc(doc))
+
+
+def search(user_id, query_embedding, k=3, index=None, with_scores=False):
+    if index is None:
+        index = get_index(user_id)
+    q = _normalize(query_embedding)
+    with index.lock:
+        hits = index.search(q, k)
+    return hits if with_scores else [d for _, d in hits]
+
+
+def invalidate(user_id=None):
+    with _registry_lock:
+        if user_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(str(user_id), None)
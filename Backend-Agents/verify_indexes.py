@@ -0,0 +1,148 @@
+"""
+Explain every hot-path query and fail if any of them plans a COLLSCAN.
+
+    python verify_indexes.py                    # check plans, exit 1 on a COLLSCAN
+    python verify_indexes.py --ensure           # create db.INDEXES first
+    python verify_indexes.py --apply-retention  # give old ERROR/BLOCKED chats an expireAt
+
+Needs a real MongoDB (MONGO_URI); mongomock has no query planner.
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+
+from bson import ObjectId
+
+from db import IN_MEMORY, CHAT_RETENTION_DAYS, db, ensure_indexes
+from vector_index import RAG_FILTER, RAG_PROJECTION
+from chathistory import HISTORY_PROJECTION
+
+SAMPLE_USER = "verify-indexes-user"
+SAMPLE_TIME = datetime(2024, 1, 1)
+
+
+def hot_queries():
+    """(name, explain command) for the queries the request path runs."""
+    return [
+        ("rag_load", {
+            "find": "chats",
+            "filter": {"userId": SAMPLE_USER, **RAG_FILTER},
+            "projection": RAG_PROJECTION,
+        }),
+        ("chat_history", {
+            "find": "chats",
+            "filter": {"userId": SAMPLE_USER},
+            "projection": HISTORY_PROJECTION,
+            "sort": {"createdAt": -1, "_id": -1},
+            "limit": 50,
+        }),
+        ("chat_history_page", {
+            "find": "chats",
+            "filter": {"userId": SAMPLE_USER, "$or": [
+                {"createdAt": {"$lt": SAMPLE_TIME}},
+                {"createdAt": SAMPLE_TIME, "_id": {"$lt": ObjectId()}},
+            ]},
+            "projection": HISTORY_PROJECTION,
+            "sort": {"createdAt": -1, "_id": -1},
+            "limit": 50,
+        }),
+        ("chat_export", {
+            "find": "chats",
+            "filter": {"userId": SAMPLE_USER},
+            "sort": {"createdAt": -1},
+        }),
+        ("admin_blocked", {
+            "aggregate": "chats",
+            "pipeline": [
+                {"$match": {"verdict": "BLOCKED", "createdAt": {"$gte": SAMPLE_TIME}}},
+                {"$sort": {"createdAt": -1}},
+                {"$limit": 100},
+            ],
+            "cursor": {},
+        }),
+        ("admin_stats_days", {
+            "find": "chat_rollups",
+            "filter": {"kind": "day", "day": {"$gte": "2024-01-01"}},
+            "sort": {"day": 1},
+        }),
+        ("login_by_email", {
+            "find": "users",
+            "filter": {"email": "verify@example.com"},
+            "limit": 1,
+        }),
+        ("user_by_id", {
+            "find": "users",
+            "filter": {"userId": SAMPLE_USER},
+            "limit": 1,
+        }),
+    ]
+
+
+def _stages(plan):
+    """Every "stage" name anywhere in an explain document."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for v in plan.values():
+            yield from _stages(v)
+    elif isinstance(plan, list):
+        for v in plan:
+            yield from _stages(v)
+
+
+def _winning_plans(explain):
+    """The winning plan(s); aggregations nest them under their $cursor stages."""
+    if "queryPlanner" in explain:
+        yield explain["queryPlanner"].get("winningPlan", {})
+    for stage in explain.get("stages", []):
+        cursor = stage.get("$cursor", {})
+        if "queryPlanner" in cursor:
+            yield cursor["queryPlanner"].get("winningPlan", {})
+    for shard in (explain.get("shards") or {}).values():
+        yield from _winning_plans(shard)
+
+
+def verify() -> bool:
+    ok = True
+    for name, command in hot_queries():
+        explain = db.command("explain", command, verbosity="queryPlanner")
+        stages = [s for plan in _winning_plans(explain) for s in _stages(plan)]
+        scan = "COLLSCAN" in stages
+        ok = ok and not scan
+        print(f"{'❌' if scan else '✅'} {name:<20} {' > '.join(stages) or '?'}")
+    return ok
+
+
+def apply_retention():
+    for verdict, days in CHAT_RETENTION_DAYS.items():
+        if not days:
+            continue
+        result = db["chats"].update_many(
+            {"verdict": verdict, "expireAt": {"$exists": False}},
+            [{"$set": {"expireAt": {"$add": ["$createdAt", days * 86400 * 1000]}}}],
+        )
+        print(f"{verdict}: set expireAt on {result.modified_count} chats")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that hot-path queries use indexes")
+    parser.add_argument("--ensure", action="store_true", help="create the declared indexes first")
+    parser.add_argument("--apply-retention", action="store_true",
+                        help="backfill expireAt on ERROR/BLOCKED chats stored before retention")
+    args = parser.parse_args()
+
+    if IN_MEMORY:
+        sys.exit("verify_indexes.py needs a real MongoDB; mongomock:// cannot explain queries")
+
+    if args.ensure:
+        asyncio.run(ensure_indexes())
+    if args.apply_retention:
+        apply_retention()
+
+    if not verify():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
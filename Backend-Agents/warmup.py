@@ -0,0 +1,147 @@
+"""
+Lazily built heavy dependencies, background warm-up and health probes.
+
+Models, LLM clients, the search tool and crews are wrapped in Lazy, so
+importing the app is cheap and /login, /register and /chats answer right
+after start-up. What happens to the AI stack is set by WARMUP:
+  background  (default) warm every component in a thread after start-up
+  blocking    finish warming before the app accepts requests
+  lazy        build each component on first use only
+
+GET /healthz  liveness: the process is up and its event loop responds
+GET /readyz   readiness: Mongo answers, the users unique email index exists
+              and the AI stack is warm (503 until then, and whenever a
+              component failed to build, also in lazy mode)
+"""
+import asyncio
+import os
+import threading
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+WARMUP = os.getenv("WARMUP", "background")
+READY_DB_TIMEOUT = float(os.getenv("READY_DB_TIMEOUT", "2"))
+
+health_router = APIRouter()
+
+_STARTED = time.time()
+_UNSET = object()
+_components = {}
+
+
+class Lazy:
+    """
+    A component built by `factory` on first use, at most once.
+
+    Attribute access is forwarded to the built object, so a Lazy can stand in
+    wherever the object itself was used; get() returns the object proper.
+    """
+
+    def __init__(self, name: str, factory):
+        self.name = name
+        self.factory = factory
+        self.state = "pending"
+        self.error = None
+        self.seconds = None
+        self._value = _UNSET
+        self._lock = threading.Lock()
+        _components[name] = self
+
+    @property
+    def ready(self) -> bool:
+        return self._value is not _UNSET
+
+    def get(self):
+        if self._value is _UNSET:
+            with self._lock:
+                if self._value is _UNSET:
+                    self.state = "loading"
+                    start = time.perf_counter()
+                    try:
+                        value = self.factory()
+                    except Exception as e:
+                        # Left unset, so the next use tries again
+                        self.state = "failed"
+                        self.error = repr(e)
+                        raise
+                    self.seconds = time.perf_counter() - start
+                    self.error = None
+                    self.state = "ready"
+                    self._value = value
+        return self._value
+
+    def __getattr__(self, attr):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self.get(), attr)
+
+
+async def ensure(*components):
+    """Build whatever is not ready yet off the event loop."""
+    for c in components:
+        if not c.ready:
+            await asyncio.to_thread(c.get)
+
+
+def warm_all():
+    for c in list(_components.values()):
+        try:
+            c.get()
+        except Exception as e:
+            print(f"❌ WARM-UP {c.name} FAILED:", e)
+
+
+async def start_warmup():
+    if WARMUP == "blocking":
+        await asyncio.to_thread(warm_all)
+    elif WARMUP == "background":
+        asyncio.get_running_loop().run_in_executor(None, warm_all)
+
+
+def components() -> dict:
+    return {
+        name: {"state": c.state, "seconds": c.seconds, "error": c.error}
+        for name, c in _components.items()
+    }
+
+
+async def _db_ok() -> bool:
+    from db import IN_MEMORY, async_client
+
+    if IN_MEMORY:
+        return True
+    try:
+        await asyncio.wait_for(async_client.admin.command("ping"), READY_DB_TIMEOUT)
+        return True
+    except Exception:
+        return False
+
+
+@health_router.get("/healthz")
+async def liveness():
+    return {"status": "alive", "uptime_s": round(time.time() - _STARTED, 3)}
+
+
+@health_router.get("/readyz")
+async def readiness():
+    from db import unique_email_index_ready
+
+    db_ok = await _db_ok()
+    indexes_ok = db_ok and await unique_email_index_ready()
+    warm = all(c.ready for c in _components.values())
+    # A failed build is retried on next use, so it clears once a retry succeeds
+    failed = any(c.state == "failed" for c in _components.values())
+    ready = indexes_ok and not failed and (warm or WARMUP == "lazy")
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else ("failed" if failed else "warming"),
+            "database": "ok" if db_ok else "unreachable",
+            "indexes": "ok" if indexes_ok else "missing",
+            "warmup": WARMUP,
+            "components": components(),
+            "uptime_s": round(time.time() - _STARTED, 3),
+        },
+    )
@@ -1,24 +1,46 @@
 import { useEffect, useState } from "react";
 import jsPDF from "jspdf";
 import { FaRegFilePdf, FaReceipt } from "react-icons/fa";
+
+const PAGE_SIZE = 50;
+
 function History() {
   const [chats, setChats] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState("");
 
-  useEffect(() => {
+  // /chats returns one page, newest first; X-Next-Cursor points at the next one
+  const fetchPage = (before) => {
     const userId = localStorage.getItem("userId");
+    const params = new URLSearchParams({ limit: PAGE_SIZE });
+    if (before) params.set("before", before);
 
-    fetch(`http://localhost:8000/chats/${userId}`)
-      .then((res) => res.json())
-      .then((data) => {
-        if (Array.isArray(data)) setChats(data);
-        else setError("Invalid response");
+    return fetch(`http://localhost:8000/chats/${userId}?${params}`)
+      .then((res) => {
+        setNextCursor(res.headers.get("X-Next-Cursor"));
+        return res.json();
       })
+      .then((data) => {
+        if (!Array.isArray(data)) throw new Error("Invalid response");
+        setChats((prev) => (before ? [...prev, ...data] : data));
+      });
+  };
+
+  useEffect(() => {
+    fetchPage(null)
       .catch(() => setError("Unable to fetch chat history"))
       .finally(() => setLoading(false));
   }, []);
 
+  const loadMore = () => {
+    setLoadingMore(true);
+    fetchPage(nextCursor)
+      .catch(() => setError("Unable to fetch chat history"))
+      .finally(() => setLoadingMore(false));
+  };
+
   const downloadAsPDF = (query, response, confidence, index) => {
     const doc = new jsPDF();
 
@@ -60,7 +82,9 @@ function History() {
                 Chat History
               </h2>
 
-              <div className="badge badge-outline">Total: {chats.length}</div>
+              <div className="badge badge-outline">
+                {nextCursor ? `Showing: ${chats.length}` : `Total: ${chats.length}`}
+              </div>
             </div>
 
             {loading && (
@@ -82,7 +106,7 @@ function History() {
               </div>
             )}
 
-            {!loading && !error && chats.length > 0 && (
+            {!loading && chats.length > 0 && (
               <div className="mt-6 space-y-3">
                 {chats.map((chat, index) => {
                   const blocked = chat.verdict === "BLOCKED";
@@ -146,6 +170,20 @@ function History() {
                     </div>
                   );
                 })}
+
+                {nextCursor && (
+                  <div className="flex justify-center pt-2">
+                    <button
+                      type="button"
+                      className="btn btn-sm btn-outline"
+                      onClick={loadMore}
+                      disabled={loadingMore}
+                    >
+                      {loadingMore && <span className="loading loading-spinner loading-xs"></span>}
+                      Load more
+                    </button>
+                  </div>
+                )}
               </div>
             )}
           </div>